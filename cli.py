@@ -4,18 +4,58 @@ import argparse
 import traceback
 import json
 import tarfile
+import time
+import queue
+import resource
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
 
 from training import (
     PreprocessMethodEnum,
     ModelEnum,
     ActionEnum,
     train,
+    train_models,
     predict_package_MLP,
     predict_package_NB,
     predict_package_SVM,
-    predict_package_RF
+    predict_package_RF,
+    predict_packages,
+    select_cascade_thresholds,
+    predict_package_cascade,
+    get_first_stage_profile,
+    predict_packages_first_stage,
+    predict_packages_second_stage,
+    read_feature_positions,
+    ReportFormatEnum,
+    open_report_writer,
+    get_report_path,
+    get_peak_rss,
+    evaluate_models,
+    get_artifact_names,
+    build_extraction_profile,
+    evaluate_extraction_profiles,
+    read_labeled_features,
+    get_profile_names,
+    get_profile_path,
+    FULL_PROFILE_NAME
 )
-from conf import SETTINGS
+from conf import ROOT_PATH, SETTINGS
+from decompress_cache import DecompressCache
+from orchestrator import extract_datasets, DEFAULT_EXTRACT_MEMORY
+from cpu_profile import RunProfiler, profile_stage, profile_process, get_profiler_config, summarize_run, PROFILE_MODES
+from shard import parse_shard, in_shard, get_shard_name, get_bundle_path, load_manifest, save_manifest, load_bundles, merge_bundles
+
+
+FEATURE_EXTRACT_PATH = os.path.join(ROOT_PATH, 'feature-extract')
+
+REPORT_FORMATS = {
+    'csv': ReportFormatEnum.CSV,
+    'jsonl': ReportFormatEnum.JSON_LINES,
+    'parquet': ReportFormatEnum.PARQUET
+}
 
 
 def load_settings():
@@ -56,21 +96,61 @@ def add_mode(dir: str):
             if not os.access(file_path, os.R_OK | os.W_OK):
                 os.chmod(file_path, 0o666)
 
-def decompress_packages(dataset_path: str, use_cache: bool = False) -> str:
+def get_package_name(file_name: str) -> str:
+    """Get the package name of a compressed package.
+
+    Args:
+        file_name: File name of the compressed package.
+
+    Returns:
+        Package name, or None if the file is not a compressed package.
+    """
+    if file_name.endswith('.tar.gz'):
+        return file_name[:-7]
+    if file_name.endswith('.tgz'):
+        return file_name[:-4]
+    return None
+
+def decompress_package(file_path: str, temp_dataset_path: str) -> str:
+    """Decompress a package.
+
+    Args:
+        file_path: Path of the compressed package.
+        temp_dataset_path: Path of the decompressed dataset.
+
+    Returns:
+        Path of decompressed package, or None if the file is not a compressed package.
+    """
+    package_name = get_package_name(os.path.basename(file_path))
+    if package_name is None:
+        return None
+    temp_package_path = f'{temp_dataset_path}/{package_name}'
+    os.makedirs(temp_package_path, exist_ok=True)
+    with tarfile.open(file_path) as tar:
+        tar.extractall(path=temp_package_path)
+    return temp_package_path
+
+def decompress_packages(dataset_path: str, cache: DecompressCache, shard: list = None) -> list:
     """Decompress packages.
+
+    Packages are decompressed into the cache, or reused from it if an identical tarball was decompressed before,
+    and linked into a folder of the dataset. Their cache entries stay pinned until the caller unpins them once
+    the dataset is extracted.
     
     Args:
         dataset_path: Path of dataset.
-        use_cache: Use cache or not.
+        cache: Cache of decompressed packages.
+        shard: Shard index and shard count, only the packages of the shard are decompressed.
 
     Returns:
-        Path of decompressed dataset.
+        Path of decompressed dataset and the hashes of the pinned cache entries.
     """
     temp_base_path = os.path.abspath(f'.decompressed-packages')
-    temp_dataset_path = os.path.abspath(os.path.join(temp_base_path, os.path.basename(dataset_path)))
+    temp_dataset_name = os.path.basename(dataset_path)
+    if shard is not None:
+        temp_dataset_name = f'{temp_dataset_name}-{get_shard_name(shard)}'
+    temp_dataset_path = os.path.abspath(os.path.join(temp_base_path, temp_dataset_name))
 
-    if use_cache and os.path.exists(temp_dataset_path):
-        return temp_dataset_path
     if os.path.exists(temp_dataset_path):
         try:
             shutil.rmtree(temp_dataset_path)
@@ -80,96 +160,202 @@ def decompress_packages(dataset_path: str, use_cache: bool = False) -> str:
             add_mode(temp_dataset_path)
             shutil.rmtree(temp_dataset_path)
     os.makedirs(temp_dataset_path)
-    dataset_names = os.listdir(dataset_path)
-    for counter, file_name in enumerate(dataset_names):
-        print(f'{counter + 1}/{len(dataset_names)}: Decompressing {file_name}...')
-        file_path = os.path.join(dataset_path, file_name)
+    dataset_names = [file_name for file_name in os.listdir(dataset_path) if get_package_name(file_name) is not None]
+    if shard is not None:
+        dataset_names = [file_name for file_name in dataset_names if in_shard(get_package_name(file_name), shard)]
+    reused_number = 0
+    tarball_hashes = []
+    try:
+        for counter, file_name in enumerate(dataset_names):
+            print(f'{counter + 1}/{len(dataset_names)}: Decompressing {file_name}...')
+            file_path = os.path.join(dataset_path, file_name)
+            try:
+                [package_path, tarball_hash, reused] = cache.get_package(file_path)
+                tarball_hashes.append(tarball_hash)
+                os.symlink(package_path, os.path.join(temp_dataset_path, get_package_name(file_name)), target_is_directory=True)
+                reused_number += reused
+            except Exception:
+                print(f'Error: Decompress the package {file_name} failed.')
+                traceback.print_exc()
+        print(f'{reused_number}/{len(dataset_names)} packages reused from the cache.')
+        [evicted_number, evicted_size, cache_size] = cache.evict()
+    except BaseException:
+        cache.unpin(tarball_hashes)
+        raise
+    if evicted_number:
+        print(f'{evicted_number} least recently used packages evicted from the cache, {evicted_size / 1024 / 1024:.1f} MiB freed.')
+    if cache_size > cache.quota * 1024 * 1024:
+        print(f'Warning: Packages in use take {cache_size / 1024 / 1024:.1f} MiB, more than the cache quota of {cache.quota} MiB.')
+    return [temp_dataset_path, tarball_hashes]
+
+def get_dataset_package_names(dataset_path: str, shard: list = None) -> list:
+    """Get the package names of the compressed packages of a dataset.
+
+    Args:
+        dataset_path: Path of dataset.
+        shard: Shard index and shard count, only the packages of the shard are listed.
+
+    Returns:
+        Sorted package names.
+    """
+    package_names = [get_package_name(file_name) for file_name in os.listdir(dataset_path)]
+    return sorted(package_name for package_name in package_names if package_name is not None and (shard is None or in_shard(package_name, shard)))
+
+def reset_dir(dir_path: str):
+    """Delete a folder if it exists and create it empty.
+
+    Args:
+        dir_path: Folder path.
+    """
+    if os.path.exists(dir_path):
         try:
-            # decompress .tar.gz file
-            if file_name.endswith('.tar.gz'):
-                tar = tarfile.open(file_path)
-                temp_package_path = f'{temp_dataset_path}/{file_name[:-7]}'
-                os.makedirs(temp_package_path, exist_ok=True)
-                tar.extractall(path=temp_package_path)
-                tar.close()
-            # decompress .tgz file
-            elif file_name.endswith('.tgz'):
-                tar = tarfile.open(file_path)
-                temp_package_path = f'{temp_dataset_path}/{file_name[:-4]}'
-                os.makedirs(temp_package_path, exist_ok=True)
-                tar.extractall(path=temp_package_path)
-                tar.close()
-        except Exception:
-            print(f'Error: Decompress the package {file_name} failed.')
+            shutil.rmtree(dir_path)
+        except PermissionError:
+            print(f'Error: Delete folder {dir_path} failed.')
             traceback.print_exc()
-    add_mode(temp_dataset_path)
-    return temp_dataset_path
+    os.makedirs(dir_path, exist_ok=True)
+
+def get_extract_paths(dataset_name: str, shard: list = None, profile_name: str = None) -> list:
+    """Get the paths to save the features and feature positions of a dataset.
+
+    Args:
+        dataset_name: Dataset name.
+        shard: Shard index and shard count, the shard is saved into its bundle.
+        profile_name: Extraction profile, the features are saved as dataset <dataset_name>-<profile_name>.
+
+    Returns:
+        Path of features and path of feature positions.
+    """
+    if shard is None:
+        # features of a profile are kept apart from the full features used for training
+        feature_name = dataset_name if profile_name is None else f'{dataset_name}-{profile_name}'
+        return [
+            os.path.abspath(os.path.join(SETTINGS['path']['features'], feature_name)),
+            os.path.abspath(os.path.join(SETTINGS['path']['feature-positions'], feature_name))
+        ]
+    bundle_path = get_bundle_path(SETTINGS['path']['shards'], dataset_name, shard)
+    return [os.path.join(bundle_path, 'features'), os.path.join(bundle_path, 'feature-positions')]
+
+def prepare_extract(dataset_name: str, cache: DecompressCache, shard: list = None, profile_name: str = None) -> list:
+    """Decompress a dataset and reset the folders its features are saved into.
+
+    Args:
+        dataset_name: Dataset name.
+        cache: Cache of decompressed packages.
+        shard: Shard index and shard count, only the packages of the shard are decompressed.
+        profile_name: Extraction profile.
+
+    Returns:
+        Path of the decompressed dataset, path of features, path of feature positions and the hashes of the
+        cache entries of its packages, which are pinned until they are unpinned.
+    """
+    dataset_path = os.path.join(SETTINGS['path']['datasets'], dataset_name)
+    with profile_stage('decompress'):
+        [dataset_path, tarball_hashes] = decompress_packages(dataset_path, cache, shard)
+    try:
+        dataset_path = os.path.abspath(dataset_path)
+        if not os.path.exists(dataset_path):
+            raise Exception(f'Dataset path {dataset_path} not found!')
+        [feature_path, feature_position_path] = get_extract_paths(dataset_name, shard, profile_name)
+        if shard is not None:
+            # each shard writes its own bundle, which is combined by the merge command
+            bundle_path = get_bundle_path(SETTINGS['path']['shards'], dataset_name, shard)
+            reset_dir(bundle_path)
+            os.makedirs(os.path.join(bundle_path, 'reports'))
+        reset_dir(feature_path)
+        reset_dir(feature_position_path)
+    except BaseException:
+        cache.unpin(tarball_hashes)
+        raise
+    return [dataset_path, feature_path, feature_position_path, tarball_hashes]
 
 def extract_cli():
     """Extract features from given dataset."""
     dataset_names = args.dataset
-    use_cache = args.cache
-    for dataset_name in dataset_names:
-        dataset_path = os.path.join(SETTINGS['path']['datasets'], dataset_name)
-        dataset_path = os.path.abspath(decompress_packages(dataset_path, use_cache))
-        if not os.path.exists(dataset_path):
-            print(f'Error: Dataset path {dataset_path} not found!')
-            exit(1)
-        feature_path = os.path.abspath(os.path.join(SETTINGS['path']['features'], dataset_name))
-        feature_position_path = os.path.abspath(os.path.join(SETTINGS['path']['feature-positions'], dataset_name))
+    shard = args.shard
+    profile_name = args.profile
+    if shard is not None and profile_name is not None:
+        print('Error: Shards are extracted with all features, --profile cannot be used with --shard.')
+        exit(1)
+    cache = DecompressCache(SETTINGS['path']['decompress-cache'], args.cache_quota)
 
-        if os.path.exists(feature_path):
-            try:
-                shutil.rmtree(feature_path)
-            except PermissionError:
-                print(f'Error: Delete feature folder {feature_path} failed.')
-                traceback.print_exc()
-        os.makedirs(feature_path)
+    # compile the extractor once instead of before every dataset
+    if subprocess.run(['npm', 'run', 'compile'], cwd=FEATURE_EXTRACT_PATH).returncode != 0:
+        print('Error: Compile the feature extractor failed.')
+        exit(1)
 
-        if os.path.exists(feature_position_path):
-            try:
-                shutil.rmtree(feature_position_path)
-            except PermissionError:
-                print(f'Error: Delete feature position folder {feature_path} failed.')
-                traceback.print_exc()
-        os.makedirs(feature_position_path)
+    # the cache entries of a dataset are unpinned once it is extracted, so long runs can evict them
+    dataset_pins = {}
 
-        try:
-            cwd = os.getcwd()
-            os.chdir('feature-extract')
-            os.system(f'npm run start -- -d {dataset_path} {feature_path} {feature_position_path}')
-            os.chdir(cwd)
-        except Exception:
-            print(f'Error: Extract feature of dataset {dataset_name} failed.')
-            traceback.print_exc()
+    def prepare(dataset_name: str) -> list:
+        [dataset_path, feature_path, feature_position_path, dataset_pins[dataset_name]] = prepare_extract(dataset_name, cache, shard, profile_name)
+        return [dataset_path, feature_path, feature_position_path]
 
-def train_cli():
-    """Train model with given dataset."""
-    malicious_dataset_names = args.malicious
-    benign_dataset_names = args.benign
-    model_name = args.model
-    preprocess_method = args.preprocess
-    action_name = args.action
-    malicous_csv_dir_paths = []
-    benign_csv_dir_paths = []
-    for malicious_dataset_name in malicious_dataset_names:
-        malicous_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], malicious_dataset_name))
-    for benign_dataset_name in benign_dataset_names:
-        benign_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], benign_dataset_name))
-    hyperparameters = {}
+    # each dataset is profiled in a decompress stage while it is prepared and in an extract stage once it is decompressed
+    summaries = extract_datasets(
+        dataset_names,
+        prepare,
+        os.path.join(FEATURE_EXTRACT_PATH, 'dist'),
+        cpus=args.cpus,
+        memory=args.memory,
+        extract_memory=args.extract_memory,
+        profile_path=None if profile_name is None else os.path.abspath(get_profile_path(profile_name)),
+        node_args=get_node_args(),
+        release=lambda dataset_name: cache.unpin(dataset_pins.pop(dataset_name))
+    )
 
-    if preprocess_method == 'none':
-        preprocess = PreprocessMethodEnum.NONE
-    elif preprocess_method == 'standardlize':
-        preprocess = PreprocessMethodEnum.STANDARDLIZE
-    elif preprocess_method == 'min-max-scale':
-        preprocess = PreprocessMethodEnum.MIN_MAX_SCALE
+    for summary in summaries:
+        print(f'{summary["dataset"]}: {summary["status"]}, exit code {summary["exit_code"]}, {summary["extracted"]} packages extracted, decompressed in {summary["decompress_seconds"]}s, extracted in {summary["extract_seconds"]}s.')
+        if summary['status'] != 'done':
+            print(f'Error: Extract feature of dataset {summary["dataset"]} failed.')
+            for line in summary['stderr']:
+                print(f'    {line}')
+        if shard is not None and summary['exit_code'] is not None:
+            [feature_path, _] = get_extract_paths(summary['dataset'], shard)
+            save_manifest(get_bundle_path(SETTINGS['path']['shards'], summary['dataset'], shard), {
+                'dataset': summary['dataset'],
+                'shard': shard,
+                'packages': get_dataset_package_names(os.path.join(SETTINGS['path']['datasets'], summary['dataset']), shard),
+                'extracted': sorted(file_name[:-4] for file_name in os.listdir(feature_path) if file_name.endswith('.csv')),
+                'reports': []
+            })
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summaries, f, indent=4)
+    if any(summary['status'] != 'done' for summary in summaries):
+        exit(1)
 
-    if action_name == 'training':
-        action = ActionEnum.TRAINING
-    elif action_name == 'save':
-        action = ActionEnum.SAVE
+def get_node_args() -> list:
+    """Get the extra arguments of the Node feature extractor, which writes CPU profiles when the run is profiled."""
+    return [] if run_profiler is None else run_profiler.node_args()
 
+def cache_cli():
+    """Show statistics of the cache of decompressed packages or prune it."""
+    cache = DecompressCache(SETTINGS['path']['decompress-cache'], args.quota)
+    if args.action == 'prune':
+        result = cache.prune()
+        print(f'{result["incomplete"]} incomplete packages removed, {result["evicted"]} least recently used packages evicted, {result["evicted_size"] / 1024 / 1024:.1f} MiB freed.')
+    stats = cache.stats()
+    print(f'Path: {cache.cache_path}')
+    print(f'Packages: {stats["entries"]}')
+    print(f'Size: {stats["size"] / 1024 / 1024:.1f} MiB of {stats["quota"] / 1024 / 1024:.1f} MiB quota')
+    print(f'Incomplete packages: {stats["incomplete"]}')
+    if stats['entries']:
+        print(f'Least recently used: {datetime.fromtimestamp(stats["least_recently_used"]).isoformat()}')
+        print(f'Most recently used: {datetime.fromtimestamp(stats["most_recently_used"]).isoformat()}')
+
+def get_train_hyperparameters(model_name: str, action_name: str) -> dict:
+    """Get the hyperparameters of a model from the command line.
+
+    Args:
+        model_name: Model name.
+        action_name: Action name.
+
+    Returns:
+        Hyperparameters.
+    """
+    hyperparameters = {}
+    if action_name == 'save':
         if model_name == 'MLP':
             hyperparameters['learning_rate'] = args.hyper_rate
             hyperparameters['number_of_hidden_units'] = args.hyper_layers
@@ -187,41 +373,232 @@ def train_cli():
         elif model_name == 'RF':
             hyperparameters['number_of_decision_trees'] = args.hyper_trees
             hyperparameters['maxium_depth'] = args.hyper_depth
-    
+    elif action_name == 'update':
+        if model_name == 'RF':
+            hyperparameters['number_of_decision_trees'] = args.hyper_trees
+    return hyperparameters
+
+def train_cli():
+    """Train model with given dataset."""
+    malicious_dataset_names = args.malicious
+    benign_dataset_names = args.benign
+    model_names = args.model
+    preprocess_methods = args.preprocess
+    action_name = args.action
+    malicous_csv_dir_paths = []
+    benign_csv_dir_paths = []
+    for malicious_dataset_name in malicious_dataset_names:
+        malicous_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], malicious_dataset_name))
+    for benign_dataset_name in benign_dataset_names:
+        benign_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], benign_dataset_name))
+
+    if len(set(model_names)) != len(model_names):
+        print('Error: Each model can be trained only once per command!')
+        exit(1)
+    # one preprocess method for all models, or one per model
+    if len(preprocess_methods) == 1:
+        preprocess_methods = preprocess_methods * len(model_names)
+    if len(preprocess_methods) != len(model_names):
+        print('Error: Please specify one preprocess method, or one per model!')
+        exit(1)
+
+    if action_name == 'training':
+        action = ActionEnum.TRAINING
+    elif action_name == 'save':
+        action = ActionEnum.SAVE
+    elif action_name == 'update':
+        action = ActionEnum.UPDATE
+
+    model_configs = []
+    for model_name, preprocess_method in zip(model_names, preprocess_methods):
+        if preprocess_method == 'none':
+            preprocess = PreprocessMethodEnum.NONE
+        elif preprocess_method == 'standardlize':
+            preprocess = PreprocessMethodEnum.STANDARDLIZE
+        elif preprocess_method == 'min-max-scale':
+            preprocess = PreprocessMethodEnum.MIN_MAX_SCALE
+        model_configs.append([ModelEnum[model_name], preprocess, get_train_hyperparameters(model_name, action_name)])
+
+    if len(model_configs) == 1:
+        [model, preprocess, hyperparameters] = model_configs[0]
+        train(malicous_csv_dir_paths, benign_csv_dir_paths, preprocess, model, action, hyperparameters, out_of_core=args.out_of_core, chunk_size=args.chunk_size, profile_stage=profile_stage)
+    else:
+        # the workers write their own profiles into the run of this process
+        errors = train_models(
+            malicous_csv_dir_paths, benign_csv_dir_paths, model_configs, action, out_of_core=args.out_of_core, chunk_size=args.chunk_size, max_workers=args.jobs,
+            profile_stage=profile_stage, profile_process=profile_process, cpu_profile=get_profiler_config()
+        )
+        for model_name, error in errors.items():
+            print(f'Error: Train model {model_name} failed.')
+            print(error)
+        if errors:
+            exit(1)
+    print(f'Peak RSS: {get_peak_rss():.1f} MiB')
+
+def predict_package(model_name: str, feature_file_path: str) -> str:
+    """Predict a package from its feature file.
+
+    Args:
+        model_name: Model name.
+        feature_file_path: Path of the feature file.
+
+    Returns:
+        Predicted label.
+    """
     if model_name == 'MLP':
-        model = ModelEnum.MLP
+        return predict_package_MLP(feature_file_path)
     elif model_name == 'NB':
-        model = ModelEnum.NB
+        return predict_package_NB(feature_file_path)
     elif model_name == 'SVM':
-        model = ModelEnum.SVM
+        return predict_package_SVM(feature_file_path)
     elif model_name == 'RF':
-        model = ModelEnum.RF
-
-    train(malicous_csv_dir_paths, benign_csv_dir_paths, preprocess, model, action, hyperparameters)
+        return predict_package_RF(feature_file_path)
+    elif model_name == 'cascade':
+        return predict_package_cascade(feature_file_path)
 
 def predict_cli():
     """Predict packages."""
     dataset_names = args.dataset
     model_name = args.model
+    report_format = REPORT_FORMATS[args.format]
 
     for dataset_name in dataset_names:
-        report_name = f'{dataset_name}-{model_name}-report.csv'
-        report_content = 'package name, predict\n'
-        csv_dir_path = os.path.join(SETTINGS['path']['features'], dataset_name)
-        for feature_file_name in os.listdir(csv_dir_path):
-            feature_file_path = os.path.join(csv_dir_path, feature_file_name)
-            if model_name == 'MLP':
-                result = predict_package_MLP(feature_file_path)
-            elif model_name == 'NB':
-                result = predict_package_NB(feature_file_path)
-            elif model_name == 'SVM':
-                result = predict_package_SVM(feature_file_path)
-            elif model_name == 'RF':
-                result = predict_package_RF(feature_file_path)
-            report_content += feature_file_name[:-4] + ', ' + result + '\n'
-
-        with open(os.path.join(SETTINGS['path']['reports'], report_name), 'w') as f:
-            f.write(report_content)
+        report_name = f'{dataset_name}-{model_name}-report'
+        if args.shard is None:
+            report_path = get_report_path(SETTINGS['path']['reports'], report_name, report_format)
+            csv_dir_path = os.path.join(SETTINGS['path']['features'], dataset_name)
+        else:
+            bundle_path = get_bundle_path(SETTINGS['path']['shards'], dataset_name, args.shard)
+            manifest = load_manifest(bundle_path)
+            if manifest is None:
+                print(f'Error: Bundle {bundle_path} not found, extract the shard first!')
+                exit(1)
+            report_path = get_report_path(os.path.join(bundle_path, 'reports'), report_name, report_format)
+            csv_dir_path = os.path.join(bundle_path, 'features')
+        with open_report_writer(report_path, report_format, resume=args.resume, buffer_size=args.buffer_size) as report_writer, profile_stage('predict'):
+            with os.scandir(csv_dir_path) as feature_files:
+                for feature_file in feature_files:
+                    package_name = feature_file.name[:-4]
+                    if report_writer.is_finished(package_name):
+                        continue
+                    report_writer.write(package_name, predict_package(model_name, feature_file.path))
+        if args.shard is not None:
+            if os.path.basename(report_path) not in manifest['reports']:
+                manifest['reports'].append(os.path.basename(report_path))
+            save_manifest(bundle_path, manifest)
+
+def merge_cli():
+    """Merge the shard bundles of a dataset into the standard feature directory and report layout."""
+    dataset_name = args.dataset
+    dataset_path = os.path.join(SETTINGS['path']['datasets'], dataset_name)
+    # the packages of the dataset are verified only if the dataset is visible from this host
+    package_names = get_dataset_package_names(dataset_path) if os.path.isdir(dataset_path) else None
+    [bundles, problems] = load_bundles(SETTINGS['path']['shards'], dataset_name, args.shards, package_names)
+    if problems:
+        for problem in problems:
+            print(f'Error: {problem}')
+        if not args.force:
+            print(f'Error: Shards of dataset {dataset_name} are incomplete, use --force to merge anyway.')
+            exit(1)
+    for _, manifest in bundles:
+        for package_name in sorted(set(manifest['packages']) - set(manifest['extracted'])):
+            print(f'Warning: Package {package_name} has no features in {get_shard_name(manifest["shard"])}.')
+
+    feature_path = os.path.abspath(os.path.join(SETTINGS['path']['features'], dataset_name))
+    feature_position_path = os.path.abspath(os.path.join(SETTINGS['path']['feature-positions'], dataset_name))
+    reset_dir(feature_path)
+    reset_dir(feature_position_path)
+    os.makedirs(SETTINGS['path']['reports'], exist_ok=True)
+    summary = merge_bundles(bundles, feature_path, feature_position_path, SETTINGS['path']['reports'])
+    print(f'Merged {len(bundles)} shards: {summary["extracted"]}/{summary["packages"]} packages extracted, reports: {", ".join(summary["reports"]) or "none"}.')
+
+def cascade_cli():
+    """Select the thresholds of the cascade classifier with given validation dataset."""
+    malicous_csv_dir_paths = []
+    benign_csv_dir_paths = []
+    for malicious_dataset_name in args.malicious:
+        malicous_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], malicious_dataset_name))
+    for benign_dataset_name in args.benign:
+        benign_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], benign_dataset_name))
+    select_cascade_thresholds(
+        malicous_csv_dir_paths,
+        benign_csv_dir_paths,
+        ModelEnum[args.first_stage],
+        ModelEnum[args.second_stage],
+        target_recall=args.target_recall,
+        max_false_positive_rate=args.max_false_positive_rate,
+        first_stage_profile=args.first_stage_profile
+    )
+
+def evaluate_cli():
+    """Evaluate the accuracy and the cost of saved models with given labeled dataset."""
+    malicous_csv_dir_paths = []
+    benign_csv_dir_paths = []
+    for malicious_dataset_name in args.malicious:
+        malicous_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], malicious_dataset_name))
+    for benign_dataset_name in args.benign:
+        benign_csv_dir_paths.append(os.path.join(SETTINGS['path']['features'], benign_dataset_name))
+    evaluation_table = evaluate_models(malicous_csv_dir_paths, benign_csv_dir_paths, args.model, latency_samples=args.latency_samples, batch_size=args.batch_size)
+    print(evaluation_table)
+
+def measure_extraction_cpu(dataset_path: str, profile_path: str = None) -> float:
+    """Run the compiled feature extractor on a decompressed dataset into temporary folders and measure its CPU time.
+
+    Args:
+        dataset_path: Path of the decompressed dataset.
+        profile_path: Path of the extraction profile, all features are extracted by default.
+
+    Returns:
+        User and system CPU seconds of the extractor.
+    """
+    profile_args = [] if profile_path is None else ['--profile', profile_path]
+    with tempfile.TemporaryDirectory() as temp_path:
+        feature_path = os.path.join(temp_path, 'features')
+        feature_position_path = os.path.join(temp_path, 'feature-positions')
+        os.makedirs(feature_path)
+        os.makedirs(feature_position_path)
+        start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        process = subprocess.run(['node', 'main.js', '-d', dataset_path, feature_path, feature_position_path] + profile_args, cwd=os.path.join(FEATURE_EXTRACT_PATH, 'dist'), stdout=subprocess.DEVNULL)
+        end = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if process.returncode != 0:
+        raise Exception(f'Extractor exited with code {process.returncode}.')
+    return end.ru_utime + end.ru_stime - start.ru_utime - start.ru_stime
+
+def profile_cli():
+    """Build extraction profiles from saved models or compare their accuracy and extraction cost."""
+    malicous_csv_dir_paths = [os.path.join(SETTINGS['path']['features'], dataset_name) for dataset_name in args.malicious or []]
+    benign_csv_dir_paths = [os.path.join(SETTINGS['path']['features'], dataset_name) for dataset_name in args.benign or []]
+    if args.action == 'build':
+        if args.model is None or len(args.name) != 1:
+            print('Error: Build one profile with -n from the model given with -o.')
+            exit(1)
+        [X, y] = [None, None]
+        if malicous_csv_dir_paths or benign_csv_dir_paths:
+            [X, y] = read_labeled_features(malicous_csv_dir_paths, benign_csv_dir_paths)
+        profile = build_extraction_profile(ModelEnum[args.model], args.name[0], coverage=args.coverage, X=X, y=y)
+        print(f'Profile {profile["name"]} of {profile["model"]} by {profile["importance_method"]} importance saved to {get_profile_path(profile["name"])}.')
+        print(f'Extracted features ({len(profile["features"])}): {", ".join(profile["features"])}')
+        print(f'Skipped features ({len(profile["skipped"])}): {", ".join(profile["skipped"]) or "none"}')
+        return
+
+    if not malicous_csv_dir_paths or not benign_csv_dir_paths:
+        print('Error: Evaluate profiles with labeled features given with -m and -b.')
+        exit(1)
+    cpu_seconds = None
+    if args.dataset is not None:
+        # the speedup is measured by extracting the same dataset with every profile
+        if subprocess.run(['npm', 'run', 'compile'], cwd=FEATURE_EXTRACT_PATH).returncode != 0:
+            print('Error: Compile the feature extractor failed.')
+            exit(1)
+        cache = DecompressCache(SETTINGS['path']['decompress-cache'], SETTINGS['cache']['quota'])
+        [dataset_path, tarball_hashes] = decompress_packages(os.path.join(SETTINGS['path']['datasets'], args.dataset), cache)
+        with cache.using(tarball_hashes):
+            package_number = max(len(os.listdir(dataset_path)), 1)
+            cpu_seconds = {FULL_PROFILE_NAME: measure_extraction_cpu(dataset_path) / package_number}
+            for profile_name in args.name:
+                cpu_seconds[profile_name] = measure_extraction_cpu(dataset_path, os.path.abspath(get_profile_path(profile_name))) / package_number
+    evaluation_table = evaluate_extraction_profiles(malicous_csv_dir_paths, benign_csv_dir_paths, args.name, cpu_seconds)
+    print(evaluation_table)
 
 def predict_single_package(package_path: str):
     """Extract features and predict from given path."""
@@ -234,33 +611,30 @@ def predict_single_package(package_path: str):
     feature_position_path = os.path.abspath(SETTINGS['path']['feature-positions'])
 
     try:
-        cwd = os.getcwd()
-        os.chdir('feature-extract')
-        os.system(f'npm run start -- -p {package_path} {feature_path} {feature_position_path}')
-        os.chdir(cwd)
+        # run the compiled extractor directly, so that node can be given the profiling arguments
+        subprocess.run(['npm', 'run', 'compile'], cwd=FEATURE_EXTRACT_PATH, check=True)
+        with profile_stage('extract', children=True):
+            subprocess.run(
+                ['node', *get_node_args(), 'main.js', '-p', os.path.abspath(package_path), feature_path, feature_position_path],
+                cwd=os.path.join(FEATURE_EXTRACT_PATH, 'dist'),
+                check=True
+            )
     except Exception:
         print(f'Error: Extract feature of package {package_path} failed.')
         traceback.print_exc()
 
     model_name = args.model
-    feature_positions_file_path = os.path.join(SETTINGS['path']['feature-positions'], f'{package_name}.json')
+    feature_positions_file_path = os.path.join(SETTINGS['path']['feature-positions'], f'{package_name}.jsonl')
     if not os.path.exists(feature_positions_file_path):
         print(f'Error: Feature positions file {feature_positions_file_path} not found!')
         exit(1)
-    with open(feature_positions_file_path, 'r') as f:
-        feature_positions = json.load(f)
+    feature_positions = read_feature_positions(feature_positions_file_path)
 
     report_name = f'{package_name}-{model_name}.json'
     report_dir_path = os.path.join(SETTINGS['path']['features'])
     feature_file_path = os.path.join(report_dir_path, f'{package_name}.csv')
-    if model_name == 'MLP':
-        result = predict_package_MLP(feature_file_path)
-    elif model_name == 'NB':
-        result = predict_package_NB(feature_file_path)
-    elif model_name == 'SVM':
-        result = predict_package_SVM(feature_file_path)
-    elif model_name == 'RF':
-        result = predict_package_RF(feature_file_path)
+    with profile_stage('predict'):
+        result = predict_package(model_name, feature_file_path)
     report_content = json.dumps({
         'prediction': result,
         'feature_positions': feature_positions
@@ -269,10 +643,316 @@ def predict_single_package(package_path: str):
     with open(os.path.join(SETTINGS['path']['reports'], report_name), 'w') as f:
         f.write(report_content)
 
+def predict_package_batch(model_name: str, feature_file_paths: list) -> list:
+    """Predict several packages from their feature files with one load of the model.
+
+    Args:
+        model_name: Model name.
+        feature_file_paths: Paths of the feature files.
+
+    Returns:
+        Predicted labels.
+    """
+    if model_name == 'cascade':
+        return [predict_package_cascade(feature_file_path) for feature_file_path in feature_file_paths]
+    return predict_packages(ModelEnum[model_name], feature_file_paths)
+
+def get_ledger_key(file_name: str, file_stat: os.stat_result) -> str:
+    """Get the key identifying an arrived package in the watch ledger.
+
+    Args:
+        file_name: File name of the compressed package.
+        file_stat: Stat of the compressed package.
+
+    Returns:
+        Ledger key, a package republished under the same file name gets a new key.
+    """
+    return f'{file_name}:{file_stat.st_size}:{file_stat.st_mtime_ns}'
+
+def load_ledger(ledger_path: str) -> set:
+    """Load the keys of the packages already processed by the watch.
+
+    Args:
+        ledger_path: Path of the ledger.
+
+    Returns:
+        Ledger keys.
+    """
+    ledger_keys = set()
+    if not os.path.exists(ledger_path):
+        return ledger_keys
+    with open(ledger_path, 'r') as f:
+        for line in f:
+            if line.endswith('\n'):
+                ledger_keys.add(json.loads(line)['key'])
+    return ledger_keys
+
+def write_ledger_entry(ledger_file, ledger_key: str, status: str):
+    """Record a processed package in the watch ledger.
+
+    Args:
+        ledger_file: Opened ledger.
+        ledger_key: Ledger key of the package.
+        status: done or failed.
+    """
+    ledger_file.write(json.dumps({'key': ledger_key, 'status': status, 'time': datetime.now().isoformat()}) + '\n')
+
+def escalate_packages(batch_path: str, package_names: list, feature_path: str, feature_position_path: str) -> list:
+    """Extract all features of the packages escalated by the first stage of the cascade, replacing their profiled features.
+
+    The profiled features are removed first, since the extractor exits successfully even if some packages fail.
+
+    Args:
+        batch_path: Path of the decompressed batch.
+        package_names: Names of the escalated packages.
+        feature_path: Path to save features.
+        feature_position_path: Path to save feature positions.
+
+    Returns:
+        Names of the escalated packages whose features were extracted.
+    """
+    escalated_path = os.path.join(batch_path, '.escalated')
+    os.makedirs(escalated_path)
+    for package_name in package_names:
+        for file_path in [os.path.join(feature_path, f'{package_name}.csv'), os.path.join(feature_position_path, f'{package_name}.jsonl')]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        os.symlink(os.path.join(batch_path, package_name), os.path.join(escalated_path, package_name), target_is_directory=True)
+    print(f'Escalating {len(package_names)} packages to the second stage...')
+    process = subprocess.run(['node', 'main.js', '-d', escalated_path, feature_path, feature_position_path], cwd=os.path.join(FEATURE_EXTRACT_PATH, 'dist'))
+    if process.returncode != 0:
+        raise Exception(f'Extract feature of escalated packages failed with exit code {process.returncode}.')
+    return [package_name for package_name in package_names if os.path.exists(os.path.join(feature_path, f'{package_name}.csv'))]
+
+def process_watch_batch(batch: list, watch_path: str, model_name: str, report_writer, ledger_file) -> list:
+    """Decompress, extract and predict a batch of arrived packages.
+
+    The packages are recorded in the ledger only after their predictions are synced to the report,
+    which makes them readable after a crash, so a crash in between processes them again on restart (at-least-once).
+    Every batch is extracted into emptied feature folders, so a package whose extraction fails is never
+    predicted from the features of an earlier batch, and the features of a batch do not pile up.
+    Packages with the same name, such as foo.tgz and foo.tar.gz, would be decompressed into the same folder,
+    so all but the first are deferred to a later batch.
+
+    Args:
+        batch: Ledger keys and paths of the arrived packages.
+        watch_path: Path of the watch state.
+        model_name: Model name.
+        report_writer: Writer of the rolling report.
+        ledger_file: Opened ledger.
+
+    Returns:
+        Ledger keys of the deferred packages, which are not recorded in the ledger.
+    """
+    batch_path = os.path.join(watch_path, 'batch')
+    feature_path = os.path.join(watch_path, 'features')
+    feature_position_path = os.path.join(watch_path, 'feature-positions')
+    for path in [batch_path, feature_path, feature_position_path]:
+        if os.path.exists(path):
+            add_mode(path)
+            shutil.rmtree(path)
+        os.makedirs(path)
+    package_names = {}
+    batch_package_names = set()
+    deferred_keys = []
+    for ledger_key, file_path in batch:
+        package_name = get_package_name(os.path.basename(file_path))
+        if package_name in batch_package_names:
+            deferred_keys.append(ledger_key)
+            continue
+        batch_package_names.add(package_name)
+        try:
+            decompress_package(file_path, batch_path)
+            package_names[ledger_key] = package_name
+        except Exception:
+            print(f'Error: Decompress the package {file_path} failed.')
+            traceback.print_exc()
+    add_mode(batch_path)
+
+    # the first stage of a cascade with an extraction profile scans the batch with its features only
+    first_stage_profile = get_first_stage_profile() if model_name == 'cascade' else None
+    profile_args = [] if first_stage_profile is None else ['--profile', os.path.abspath(get_profile_path(first_stage_profile['name']))]
+    process = subprocess.run(['node', 'main.js', '-d', batch_path, feature_path, feature_position_path] + profile_args, cwd=os.path.join(FEATURE_EXTRACT_PATH, 'dist'))
+    if process.returncode != 0:
+        print(f'Error: Extract feature of batch failed with exit code {process.returncode}.')
+
+    predicted_keys = [key for key, package_name in package_names.items() if os.path.exists(os.path.join(feature_path, f'{package_name}.csv'))]
+    feature_file_paths = [os.path.join(feature_path, f'{package_names[key]}.csv') for key in predicted_keys]
+    if first_stage_profile is None:
+        results = predict_package_batch(model_name, feature_file_paths)
+    else:
+        results = predict_packages_first_stage(feature_file_paths)
+        escalated_keys = [key for key, result in zip(predicted_keys, results) if result is None]
+        extracted_names = set(escalate_packages(batch_path, [package_names[key] for key in escalated_keys], feature_path, feature_position_path)) if escalated_keys else set()
+        # an escalated package whose full extraction failed is not predicted from its profiled features
+        failed_keys = {key for key in escalated_keys if package_names[key] not in extracted_names}
+        escalated_results = iter(predict_packages_second_stage([os.path.join(feature_path, f'{package_names[key]}.csv') for key in escalated_keys if key not in failed_keys]))
+        results = [next(escalated_results) if result is None else result for key, result in zip(predicted_keys, results) if key not in failed_keys]
+        predicted_keys = [key for key in predicted_keys if key not in failed_keys]
+    for ledger_key, result in zip(predicted_keys, results):
+        report_writer.write(package_names[ledger_key], result)
+    report_writer.sync()
+
+    for ledger_key, file_path in batch:
+        if ledger_key in deferred_keys:
+            continue
+        status = 'done' if ledger_key in predicted_keys else 'failed'
+        if status == 'failed':
+            print(f'Error: Predict the package {file_path} failed.')
+        write_ledger_entry(ledger_file, ledger_key, status)
+    ledger_file.flush()
+    return deferred_keys
+
+def watch_cli():
+    """Watch an incoming directory and predict newly arrived packages."""
+    incoming_path = os.path.abspath(args.incoming)
+    if not os.path.isdir(incoming_path):
+        print(f'Error: Incoming path {incoming_path} not found!')
+        exit(1)
+    model_name = args.model
+    report_format = REPORT_FORMATS[args.format]
+    watch_name = os.path.basename(incoming_path)
+    watch_path = os.path.abspath(os.path.join('.watch', watch_name))
+    for path in [watch_path, SETTINGS['path']['reports']]:
+        os.makedirs(path, exist_ok=True)
+
+    # compile the extractor once instead of before every batch
+    if subprocess.run(['npm', 'run', 'compile'], cwd=FEATURE_EXTRACT_PATH).returncode != 0:
+        print('Error: Compile the feature extractor failed.')
+        exit(1)
+
+    ledger_path = os.path.join(watch_path, 'ledger.jsonl')
+    ledger_keys = load_ledger(ledger_path)
+    # bounded queue, arrived packages stay in the incoming directory while it is full
+    package_queue = queue.Queue(maxsize=args.max_queue)
+    queued_keys = set()
+    queued_keys_lock = threading.Lock()
+
+    def process_queue():
+        ledger_file = open(ledger_path, 'a')
+        report_writer = None
+        report_date = None
+        # failed attempts of the packages of failed batches, they are queued again until they fail max_retries times
+        failures = {}
+        while True:
+            batch = [package_queue.get()]
+            while len(batch) < args.batch_size:
+                try:
+                    batch.append(package_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                print(f'Processing {len(batch)} packages, {package_queue.qsize()} packages queued...')
+                # packages left out of the ledger are found again by the scan of the incoming directory
+                retried_keys = set()
+                try:
+                    # roll the report every day
+                    today = datetime.now().strftime('%Y%m%d')
+                    if today != report_date:
+                        if report_writer is not None:
+                            report_writer.close()
+                            report_writer = None
+                        report_path = get_report_path(SETTINGS['path']['reports'], f'watch-{watch_name}-{model_name}-{today}', report_format)
+                        report_writer = open_report_writer(report_path, report_format, resume=True)
+                        report_date = today
+                    retried_keys.update(process_watch_batch(batch, watch_path, model_name, report_writer, ledger_file))
+                except Exception:
+                    print('Error: Process the batch failed.')
+                    traceback.print_exc()
+                    for ledger_key, file_path in batch:
+                        failures[ledger_key] = failures.get(ledger_key, 0) + 1
+                        if failures[ledger_key] < args.max_retries:
+                            retried_keys.add(ledger_key)
+                            continue
+                        print(f'Error: Process the package {file_path} failed {failures.pop(ledger_key)} times, it will not be retried.')
+                        write_ledger_entry(ledger_file, ledger_key, 'failed')
+                    ledger_file.flush()
+                with queued_keys_lock:
+                    for ledger_key, _ in batch:
+                        queued_keys.discard(ledger_key)
+                        if ledger_key not in retried_keys:
+                            ledger_keys.add(ledger_key)
+                            failures.pop(ledger_key, None)
+            if stopping:
+                break
+        if report_writer is not None:
+            report_writer.close()
+        ledger_file.close()
+
+    worker = threading.Thread(target=process_queue)
+    worker.start()
+    print(f'Watching {incoming_path}...')
+    # ledger key of each arrived file name and the time since it has not changed
+    arrivals = {}
+    try:
+        while worker.is_alive():
+            now = time.monotonic()
+            with os.scandir(incoming_path) as entries:
+                for entry in entries:
+                    if get_package_name(entry.name) is None or not entry.is_file():
+                        continue
+                    ledger_key = get_ledger_key(entry.name, entry.stat())
+                    with queued_keys_lock:
+                        if ledger_key in ledger_keys or ledger_key in queued_keys:
+                            continue
+                    if entry.name not in arrivals or arrivals[entry.name][0] != ledger_key:
+                        arrivals[entry.name] = (ledger_key, now)
+                        continue
+                    # debounce packages which are still being written
+                    if now - arrivals[entry.name][1] < args.debounce:
+                        continue
+                    try:
+                        package_queue.put_nowait((ledger_key, entry.path))
+                    except queue.Full:
+                        break
+                    with queued_keys_lock:
+                        queued_keys.add(ledger_key)
+                    del arrivals[entry.name]
+            time.sleep(args.poll_interval)
+        print('Error: Processing the queued packages stopped unexpectedly.')
+        exit(1)
+    except KeyboardInterrupt:
+        print('Stopping, waiting for queued packages...')
+    finally:
+        # a stopped worker no longer empties the queue
+        if worker.is_alive():
+            package_queue.put(None)
+            worker.join()
+
+def run_subcommand():
+    """Run the sub-command given on the command line."""
+    if args.subparser_name == 'extract':
+        extract_cli()
+    elif args.subparser_name == 'train':
+        train_cli()
+    elif args.subparser_name == 'cascade':
+        cascade_cli()
+    elif args.subparser_name == 'evaluate':
+        evaluate_cli()
+    elif args.subparser_name == 'watch':
+        watch_cli()
+    elif args.subparser_name == 'merge':
+        merge_cli()
+    elif args.subparser_name == 'cache':
+        cache_cli()
+    elif args.subparser_name == 'profile':
+        profile_cli()
+    elif args.subparser_name == 'predict':
+        if args.package_path:
+            predict_single_package(args.package_path)
+        elif args.model:
+            predict_cli()
+        else:
+            print('Error: Please specify package path or model name!')
+            exit(1)
+
 if __name__ == '__main__':
     settings = load_settings()
     DATASET_NAMES = [f for f in os.listdir(settings['path']['datasets']) if os.path.isdir(os.path.join(settings['path']['datasets'], f))]
     FEATURE_NAMES = [f for f in os.listdir(settings['path']['features']) if os.path.isdir(os.path.join(settings['path']['features'], f))]
+    SHARDED_DATASET_NAMES = [f for f in os.listdir(settings['path']['shards']) if os.path.isdir(os.path.join(settings['path']['shards'], f))] if os.path.isdir(settings['path']['shards']) else []
     MODEL_NAMES = settings['classifier']['models']
     PREPROCESS_METHOD_NAMES = settings['classifier']['preprocess_methods']
 
@@ -283,15 +963,27 @@ if __name__ == '__main__':
     # extract CLI parameters
     parser_extract = subparsers.add_parser('extract', help='extract features', description='Extract features from given dataset.')
     parser_extract.add_argument('-d', '--dataset', type=str, required=True, help='dataset name', choices=DATASET_NAMES, nargs='+')
-    parser_extract.add_argument('-c', '--cache', type=bool, help='use cache or not', default=False)
+    parser_extract.add_argument('-c', '--cache', type=bool, help='deprecated, decompressed packages are always reused from the cache', default=False)
+    parser_extract.add_argument('--cache-quota', type=int, help='size quota of the cache of decompressed packages in MiB', default=settings['cache']['quota'])
+    parser_extract.add_argument('-s', '--shard', type=parse_shard, help='extract only shard i of N shards into its bundle, e.g. 0/4')
+    parser_extract.add_argument('--cpus', type=int, help='number of CPUs shared by concurrent datasets (default: all CPUs)')
+    parser_extract.add_argument('--memory', type=int, help='memory in MiB shared by concurrent datasets (default: 80%% of the physical memory)')
+    parser_extract.add_argument('--extract-memory', type=int, help='memory in MiB reserved for the extraction of one dataset', default=DEFAULT_EXTRACT_MEMORY)
+    parser_extract.add_argument('--summary', type=str, help='path to save the summary of the extraction as json')
+    parser_extract.add_argument('--profile', type=str, help='extract only the features of an extraction profile into <dataset_name>-<profile>', choices=get_profile_names())
+    parser_extract.add_argument('--cpu-profile', type=str, help='profile the CPU time of the run, the Node extractor included', choices=PROFILE_MODES, nargs='?', const='sampling')
 
     # train CLI parameters
     parser_train = subparsers.add_parser('train', help='train model', description='Train model with given dataset.')
     parser_train.add_argument('-m', '--malicious', type=str, required=True, help='malicious dataset name', choices=FEATURE_NAMES, nargs='+')
     parser_train.add_argument('-b', '--benign', type=str, required=True, help='benign dataset name', choices=FEATURE_NAMES, nargs='+')
-    parser_train.add_argument('-o', '--model', type=str, required=True, help='model name', choices=MODEL_NAMES)
-    parser_train.add_argument('-p', '--preprocess', type=str, required=True, help='preprocess method', choices=PREPROCESS_METHOD_NAMES)
-    parser_train.add_argument('-a', '--action', type=str, required=True, help='action', choices=['training', 'save'])
+    parser_train.add_argument('-o', '--model', type=str, required=True, help='model name, several models are trained in parallel', choices=MODEL_NAMES, nargs='+')
+    parser_train.add_argument('-p', '--preprocess', type=str, required=True, help='preprocess method, or one per model', choices=PREPROCESS_METHOD_NAMES, nargs='+')
+    parser_train.add_argument('-a', '--action', type=str, required=True, help='action', choices=['training', 'save', 'update'])
+    parser_train.add_argument('--out-of-core', action='store_true', help='keep the training set in a compact on-disk matrix and fit NB and MLP chunk by chunk')
+    parser_train.add_argument('--chunk-size', type=int, help='number of samples per chunk with --out-of-core', default=100000)
+    parser_train.add_argument('-j', '--jobs', type=int, help='number of processes training several models (default: one per model)')
+    parser_train.add_argument('--cpu-profile', type=str, help='profile the CPU time of the run, the training processes included', choices=PROFILE_MODES, nargs='?', const='sampling')
 
     # NB
     parser_train.add_argument('-hs', '--hyper-smoothing', type=float, help='smoothing of NB', choices=settings['classifier']['hyperparameters']['NB']['smoothings'])
@@ -304,7 +996,7 @@ if __name__ == '__main__':
     parser_train.add_argument('-ha', '--hyper-activation', type=str, help='activation function of MLP', choices=settings['classifier']['hyperparameters']['MLP']['activation_functions'])
 
     # RF
-    parser_train.add_argument('-he', '--hyper-trees', type=int, help='number of decision trees of RF', choices=settings['classifier']['hyperparameters']['RF']['number_of_decision_trees'])
+    parser_train.add_argument('-he', '--hyper-trees', type=int, help='number of decision trees of RF, or number of decision trees to add when updating', choices=settings['classifier']['hyperparameters']['RF']['number_of_decision_trees'])
     parser_train.add_argument('-hd', '--hyper-depth', type=int, help='maxium depth of RF', choices=settings['classifier']['hyperparameters']['RF']['maxium_depths'])
 
     # SVM
@@ -313,22 +1005,76 @@ if __name__ == '__main__':
 
     # predict CLI parameters
     parser_predict = subparsers.add_parser('predict', help='predict package', description='Predict package with given model.')
-    parser_predict.add_argument('-o', '--model', type=str, required=True, help='model name', choices=MODEL_NAMES)
-    parser_predict.add_argument('-d', '--dataset', type=str, help='dataset name', choices=FEATURE_NAMES, nargs='+')
+    parser_predict.add_argument('-o', '--model', type=str, required=True, help='model name', choices=MODEL_NAMES + ['cascade'])
+    parser_predict.add_argument('-d', '--dataset', type=str, help='dataset name', choices=sorted(set(FEATURE_NAMES + SHARDED_DATASET_NAMES)), nargs='+')
     parser_predict.add_argument('-p', '--package-path', type=str, help='absolute package path')
+    parser_predict.add_argument('-f', '--format', type=str, help='report format', choices=list(REPORT_FORMATS.keys()), default='csv')
+    parser_predict.add_argument('-r', '--resume', action='store_true', help='skip packages already in the report and append to it')
+    parser_predict.add_argument('--buffer-size', type=int, help='number of report rows buffered before flushing', default=1000)
+    parser_predict.add_argument('-s', '--shard', type=parse_shard, help='predict only shard i of N shards from its bundle, e.g. 0/4')
+    parser_predict.add_argument('--cpu-profile', type=str, help='profile the CPU time of the run, the Node extractor included', choices=PROFILE_MODES, nargs='?', const='sampling')
+
+    # merge CLI parameters
+    parser_merge = subparsers.add_parser('merge', help='merge shard bundles', description='Merge the shard bundles of a dataset into the standard feature directory and report layout.')
+    parser_merge.add_argument('-d', '--dataset', type=str, required=True, help='dataset name', choices=SHARDED_DATASET_NAMES)
+    parser_merge.add_argument('-n', '--shards', type=int, required=True, help='number of shards')
+    parser_merge.add_argument('--force', action='store_true', help='merge the available shards even if some are missing')
+
+    # cascade CLI parameters
+    parser_cascade = subparsers.add_parser('cascade', help='select cascade thresholds', description='Select the thresholds of the cascade classifier with given validation dataset.')
+    parser_cascade.add_argument('-m', '--malicious', type=str, required=True, help='malicious validation dataset name', choices=FEATURE_NAMES, nargs='+')
+    parser_cascade.add_argument('-b', '--benign', type=str, required=True, help='benign validation dataset name', choices=FEATURE_NAMES, nargs='+')
+    parser_cascade.add_argument('-f', '--first-stage', type=str, help='fast model deciding confident packages', choices=['NB', 'MLP', 'RF'], default='NB')
+    parser_cascade.add_argument('-s', '--second-stage', type=str, help='model deciding uncertain packages', choices=MODEL_NAMES, default='RF')
+    parser_cascade.add_argument('-r', '--target-recall', type=float, help='recall on the malicious class to keep (default: recall of the second stage alone)')
+    parser_cascade.add_argument('-fp', '--max-false-positive-rate', type=float, help='rate of benign packages allowed to be decided malicious by the first stage', default=0.01)
+    parser_cascade.add_argument('--first-stage-profile', type=str, help='extraction profile of the first stage, escalated packages are extracted again with all features', choices=get_profile_names())
+
+    # cache CLI parameters
+    parser_cache = subparsers.add_parser('cache', help='manage decompressed packages', description='Show statistics of the cache of decompressed packages or prune it.')
+    parser_cache.add_argument('action', type=str, help='action', choices=['stats', 'prune'])
+    parser_cache.add_argument('-q', '--quota', type=int, help='size quota in MiB to prune the cache to', default=settings['cache']['quota'])
+
+    # evaluate CLI parameters
+    parser_evaluate = subparsers.add_parser('evaluate', help='evaluate models', description='Evaluate the accuracy and the cost of saved models with given labeled dataset.')
+    parser_evaluate.add_argument('-m', '--malicious', type=str, required=True, help='malicious test dataset name', choices=FEATURE_NAMES, nargs='+')
+    parser_evaluate.add_argument('-b', '--benign', type=str, required=True, help='benign test dataset name', choices=FEATURE_NAMES, nargs='+')
+    parser_evaluate.add_argument('-o', '--model', type=str, required=True, help='saved models, e.g. RF or RF-<version>', choices=get_artifact_names(), nargs='+')
+    parser_evaluate.add_argument('--latency-samples', type=int, help='number of samples predicted one by one to measure the latency', default=1000)
+    parser_evaluate.add_argument('--batch-size', type=int, help='number of samples per batch to measure the throughput', default=1000)
+
+    # profile CLI parameters
+    parser_profile = subparsers.add_parser('profile', help='manage extraction profiles', description='Build an extraction profile from the feature importances of a saved model, or compare the accuracy and extraction cost of profiles.')
+    parser_profile.add_argument('action', type=str, help='action', choices=['build', 'evaluate'])
+    parser_profile.add_argument('-n', '--name', type=str, required=True, help='profile name, several profiles can be evaluated', nargs='+')
+    parser_profile.add_argument('-o', '--model', type=str, help='model the profile is built from', choices=MODEL_NAMES)
+    parser_profile.add_argument('--coverage', type=float, help='share of the total feature importance kept by the profile', default=1.0)
+    parser_profile.add_argument('-m', '--malicious', type=str, help='malicious labeled dataset name, for permutation importances or the evaluation', choices=FEATURE_NAMES, nargs='+')
+    parser_profile.add_argument('-b', '--benign', type=str, help='benign labeled dataset name, for permutation importances or the evaluation', choices=FEATURE_NAMES, nargs='+')
+    parser_profile.add_argument('-d', '--dataset', type=str, help='dataset extracted with every profile to measure the CPU time per package', choices=DATASET_NAMES)
+
+    # watch CLI parameters
+    parser_watch = subparsers.add_parser('watch', help='watch incoming packages', description='Watch an incoming directory and predict newly arrived packages.')
+    parser_watch.add_argument('-i', '--incoming', type=str, required=True, help='incoming directory of .tgz or .tar.gz packages')
+    parser_watch.add_argument('-o', '--model', type=str, required=True, help='model name', choices=MODEL_NAMES + ['cascade'])
+    parser_watch.add_argument('-f', '--format', type=str, help='report format', choices=list(REPORT_FORMATS.keys()), default='csv')
+    parser_watch.add_argument('--debounce', type=float, help='seconds a package should stay unchanged before it is queued', default=2.0)
+    parser_watch.add_argument('--poll-interval', type=float, help='seconds between scans of the incoming directory', default=1.0)
+    parser_watch.add_argument('--max-queue', type=int, help='maximum number of queued packages', default=1000)
+    parser_watch.add_argument('--batch-size', type=int, help='maximum number of packages extracted together', default=64)
+    parser_watch.add_argument('--max-retries', type=int, help='number of failed batches a package is processed in before it is recorded as failed', default=3)
 
     args = parser.parse_args()
 
     subparser_name = args.subparser_name
-    if subparser_name == 'extract':
-        extract_cli()
-    elif subparser_name == 'train':
-        train_cli()
-    elif subparser_name == 'predict':
-        if args.package_path:
-            predict_single_package(args.package_path)
-        elif args.model:
-            predict_cli()
-        else:
-            print('Error: Please specify package path or model name!')
-            exit(1)
\ No newline at end of file
+    run_profiler = None
+    if getattr(args, 'cpu_profile', None):
+        run_profiler = RunProfiler(os.path.join(SETTINGS['path']['cpu-profiles'], f'{subparser_name}-{datetime.now().strftime("%Y%m%d-%H%M%S")}'), args.cpu_profile)
+        run_profiler.start()
+    try:
+        run_subcommand()
+    finally:
+        if run_profiler is not None:
+            run_profiler.stop()
+            print(summarize_run(run_profiler.run_path))
+            print(f'CPU profile saved to {run_profiler.run_path}, render profile.collapsed with flamegraph.pl or speedscope.')
\ No newline at end of file
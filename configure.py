@@ -41,6 +41,26 @@ def configure():
     print(f'    Current path of the feature positions: {current_settings["path"]["feature-positions"]}')
     print('    Enter the new path of the feature positions:')
     feature_positions_path = input().strip()
+    print('6. Configure the path of the shard bundles:')
+    print(f'    Current path of the shard bundles: {current_settings["path"]["shards"]}')
+    print('    Enter the new path of the shard bundles:')
+    shards_path = input().strip()
+    print('7. Configure the path of the cache of decompressed packages:')
+    print(f'    Current path of the cache of decompressed packages: {current_settings["path"]["decompress-cache"]}')
+    print('    Enter the new path of the cache of decompressed packages:')
+    decompress_cache_path = input().strip()
+    print('8. Configure the size quota of the cache of decompressed packages in MiB:')
+    print(f'    Current size quota of the cache of decompressed packages: {current_settings["cache"]["quota"]}')
+    print('    Enter the new size quota of the cache of decompressed packages:')
+    cache_quota = input().strip()
+    print('9. Configure the path of the CPU profiles:')
+    print(f'    Current path of the CPU profiles: {current_settings["path"]["cpu-profiles"]}')
+    print('    Enter the new path of the CPU profiles:')
+    cpu_profiles_path = input().strip()
+    print('10. Configure the path of the temporary training matrices:')
+    print(f'    Current path of the temporary training matrices: {current_settings["path"]["feature-matrices"]}')
+    print('    Enter the new path of the temporary training matrices:')
+    feature_matrices_path = input().strip()
 
     print('Saving the new settings...')
     current_settings['path']['datasets'] = datasets_path if datasets_path else current_settings["path"]['datasets']
@@ -48,6 +68,11 @@ def configure():
     current_settings['path']['reports'] = reports_path if reports_path else current_settings["path"]['reports']
     current_settings['path']['features'] = features_path if features_path else current_settings["path"]['features']
     current_settings['path']['feature-positions'] = feature_positions_path if feature_positions_path else current_settings["path"]['feature-positions']
+    current_settings['path']['shards'] = shards_path if shards_path else current_settings["path"]['shards']
+    current_settings['path']['decompress-cache'] = decompress_cache_path if decompress_cache_path else current_settings["path"]['decompress-cache']
+    current_settings['path']['cpu-profiles'] = cpu_profiles_path if cpu_profiles_path else current_settings["path"]['cpu-profiles']
+    current_settings['path']['feature-matrices'] = feature_matrices_path if feature_matrices_path else current_settings["path"]['feature-matrices']
+    current_settings['cache']['quota'] = int(cache_quota) if cache_quota else current_settings['cache']['quota']
     
     print('Creating the new directories...')
     os.makedirs(current_settings['path']['datasets'], exist_ok=True)
@@ -55,6 +80,10 @@ def configure():
     os.makedirs(current_settings['path']['reports'], exist_ok=True)
     os.makedirs(current_settings['path']['features'], exist_ok=True)
     os.makedirs(current_settings['path']['feature-positions'], exist_ok=True)
+    os.makedirs(current_settings['path']['shards'], exist_ok=True)
+    os.makedirs(current_settings['path']['decompress-cache'], exist_ok=True)
+    os.makedirs(current_settings['path']['cpu-profiles'], exist_ok=True)
+    os.makedirs(current_settings['path']['feature-matrices'], exist_ok=True)
     print('Creating the new directories successfully!')
     
     try:
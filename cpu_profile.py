@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+import contextlib
+import collections
+
+from prettytable import PrettyTable
+
+
+SAMPLING_INTERVAL = 0.005
+TOP_FUNCTION_NUMBER = 30
+PROFILE_MODES = ['sampling', 'deterministic']
+
+# profiler of this process and the stages running in each thread, stages are no-ops without a profiler
+active_profiler = None
+thread_stages = collections.defaultdict(list)
+
+
+def get_frame_name(code) -> str:
+    """Get the name of a Python frame in collapsed stacks, e.g. read_features (read_feature.py:36)."""
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+def get_thread_cpu_time(thread_id: int) -> float:
+    """Get the CPU time of a thread in seconds, or None if it is unknown on this platform or the thread ended."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError):
+        return None
+
+class StackSampler(threading.Thread):
+    """Sample the stacks of all threads of this process and weight them by the CPU time of the thread.
+
+    A thread waiting on I/O or a lock gets no CPU time, so it does not show up in the profile.
+    Where the CPU time of a thread is unknown, the stacks are weighted by the wall time between samples.
+    """
+
+    def __init__(self, root_name: str, interval: float = SAMPLING_INTERVAL):
+        super().__init__(name='cpu-profile-sampler', daemon=True)
+        self.root_name = root_name
+        self.interval = interval
+        # collapsed stack to CPU microseconds
+        self.stacks = collections.Counter()
+        self.cpu_times = {thread_id: get_thread_cpu_time(thread_id) for thread_id in sys._current_frames()}
+        self.stopped = threading.Event()
+
+    def run(self):
+        last_sample_time = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(now - last_sample_time)
+            last_sample_time = now
+
+    def sample(self, elapsed: float):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident:
+                continue
+            cpu_time = get_thread_cpu_time(thread_id)
+            if cpu_time is None:
+                weight = elapsed
+            else:
+                weight = cpu_time - (self.cpu_times.get(thread_id) or 0.0)
+                self.cpu_times[thread_id] = cpu_time
+            if weight <= 0:
+                continue
+            frame_names = []
+            while frame is not None:
+                frame_names.append(get_frame_name(frame.f_code))
+                frame = frame.f_back
+            stage_names = [f'stage {stage_name}' for stage_name in thread_stages.get(thread_id, [])]
+            self.stacks[';'.join([self.root_name] + stage_names + frame_names[::-1])] += weight * 1e6
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+class RunProfiler:
+    """Profile the Python stages of this process into a profile directory of the run.
+
+    The sampling mode writes python/<name>-<pid>.collapsed, the collapsed stacks of all threads weighted
+    by CPU microseconds. The deterministic mode writes python/<name>-<pid>.pstats of cProfile, which only
+    traces the thread starting the profiler. The wall and CPU time of every stage are written to
+    stages/<name>-<pid>.json, and Node processes launched with node_args write their CPU profiles to node.
+    """
+
+    def __init__(self, run_path: str, mode: str = 'sampling', name: str = 'main'):
+        """
+        Args:
+            run_path: Path of the profile directory of the run.
+            mode: sampling or deterministic.
+            name: Name of the process in the profile.
+        """
+        self.run_path = os.path.abspath(run_path)
+        self.mode = mode
+        self.name = f'{name}-{os.getpid()}'
+        self.stages = []
+        self.sampler = None
+        self.profile = None
+        for dir_name in ['python', 'node', 'stages']:
+            os.makedirs(os.path.join(self.run_path, dir_name), exist_ok=True)
+
+    def start(self):
+        global active_profiler
+        active_profiler = self
+        if self.mode == 'sampling':
+            self.sampler = StackSampler(f'python {self.name}')
+            self.sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        global active_profiler
+        active_profiler = None
+        if self.sampler is not None:
+            self.sampler.stop()
+            with open(os.path.join(self.run_path, 'python', f'{self.name}.collapsed'), 'w') as f:
+                for stack, weight in self.sampler.stacks.items():
+                    if round(weight) > 0:
+                        f.write(f'{stack} {round(weight)}\n')
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(self.run_path, 'python', f'{self.name}.pstats'))
+        with open(os.path.join(self.run_path, 'stages', f'{self.name}.json'), 'w') as f:
+            json.dump(self.stages, f, indent=4)
+
+    def node_args(self) -> list:
+        """Get the arguments making Node and its worker threads write CPU profiles into the run."""
+        return ['--cpu-prof', f'--cpu-prof-dir={os.path.join(self.run_path, "node")}']
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+def get_children_cpu_time() -> float:
+    """Get the CPU time of the child processes of this process which have exited and been waited for, in seconds."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+@contextlib.contextmanager
+def profile_stage(stage_name: str, children: bool = False):
+    """Record the wall and CPU time of a stage and mark the stacks sampled in it, if this process is profiled.
+
+    The CPU time is the time of the calling thread. With children, the CPU time of the child processes waited for
+    in the stage is added, e.g. of the Node extractor, counting every child of the process waited for meanwhile.
+
+    Args:
+        stage_name: Stage name, e.g. decompress, read_features, preprocess, fit or predict.
+        children: Add the CPU time of the child processes to the stage.
+    """
+    profiler = active_profiler
+    if profiler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    thread_stages[thread_id].append(stage_name)
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.thread_time()
+    start_children_cpu_time = get_children_cpu_time()
+    try:
+        yield
+    finally:
+        thread_stages[thread_id].pop()
+        cpu_time = time.thread_time() - start_cpu_time
+        if children:
+            cpu_time += get_children_cpu_time() - start_children_cpu_time
+        profiler.stages.append({
+            'stage': stage_name,
+            'thread': threading.current_thread().name,
+            'wall_seconds': round(time.perf_counter() - start_wall_time, 6),
+            'cpu_seconds': round(cpu_time, 6)
+        })
+
+@contextlib.contextmanager
+def profile_process(cpu_profile: list, name: str):
+    """Profile a worker process into the run of its parent process.
+
+    Args:
+        cpu_profile: Path of the profile directory of the run and the mode, or None if the run is not profiled.
+        name: Name of the process in the profile.
+    """
+    if cpu_profile is None:
+        yield
+        return
+    with RunProfiler(cpu_profile[0], cpu_profile[1], name):
+        yield
+
+def get_profiler_config() -> list:
+    """Get the profile directory and the mode of the profiler of this process for its worker processes, or None."""
+    if active_profiler is None:
+        return None
+    return [active_profiler.run_path, active_profiler.mode]
+
+def read_node_profile(profile_path: str) -> collections.Counter:
+    """Convert a CPU profile written by node --cpu-prof into collapsed stacks.
+
+    Args:
+        profile_path: Path of the .cpuprofile, named CPU.<date>.<time>.<pid>.<thread>.<sequence>.cpuprofile.
+
+    Returns:
+        Collapsed stacks weighted by CPU microseconds, idle samples are left out.
+    """
+    with open(profile_path, 'r') as f:
+        profile = json.load(f)
+    name_parts = os.path.basename(profile_path).split('.')
+    root_name = f'node {name_parts[3]} main' if name_parts[4] == '0' else f'node {name_parts[3]} worker {name_parts[4]}'
+
+    nodes = {node['id']: node for node in profile['nodes']}
+    parents = {}
+    for node in profile['nodes']:
+        for child_id in node.get('children', []):
+            parents[child_id] = node['id']
+    collapsed_stacks = {}
+
+    def get_frame_name_of_node(call_frame: dict) -> str:
+        function_name = call_frame['functionName'] or '(anonymous)'
+        if not call_frame['url']:
+            return function_name.replace(';', ':')
+        return f'{function_name} ({os.path.basename(call_frame["url"])}:{call_frame["lineNumber"] + 1})'.replace(';', ':')
+
+    def get_collapsed_stack(node_id: int) -> str:
+        if node_id not in collapsed_stacks:
+            frame_names = []
+            parent_id = node_id
+            while parent_id in nodes:
+                call_frame = nodes[parent_id]['callFrame']
+                if call_frame['functionName'] != '(root)':
+                    frame_names.append(get_frame_name_of_node(call_frame))
+                parent_id = parents.get(parent_id)
+            collapsed_stacks[node_id] = ';'.join([root_name] + frame_names[::-1])
+        return collapsed_stacks[node_id]
+
+    stacks = collections.Counter()
+    samples = profile.get('samples', [])
+    time_deltas = profile.get('timeDeltas', [])
+    for index, node_id in enumerate(samples):
+        # a sample lasts until the next one
+        weight = time_deltas[index + 1] if index + 1 < len(time_deltas) else 0
+        if weight <= 0 or nodes[node_id]['callFrame']['functionName'] == '(idle)':
+            continue
+        stacks[get_collapsed_stack(node_id)] += weight
+    return stacks
+
+def read_collapsed_stacks(collapsed_path: str) -> collections.Counter:
+    """Read collapsed stacks, every line is a stack of frames separated by ; and its weight."""
+    stacks = collections.Counter()
+    with open(collapsed_path, 'r') as f:
+        for line in f:
+            stack, _, weight = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(weight)
+    return stacks
+
+def get_function_times(stacks: collections.Counter) -> dict:
+    """Get the self and total time of every function in collapsed stacks.
+
+    Returns:
+        Self and total microseconds by frame name, the root and stage frames are left out.
+    """
+    function_times = collections.defaultdict(lambda: [0, 0])
+    for stack, weight in stacks.items():
+        frame_names = [frame_name for frame_name in stack.split(';')[1:] if not frame_name.startswith('stage ')]
+        if not frame_names:
+            continue
+        function_times[frame_names[-1]][0] += weight
+        # recursive functions are counted once per stack
+        for frame_name in set(frame_names):
+            function_times[frame_name][1] += weight
+    return function_times
+
+def summarize_run(run_path: str, top_number: int = TOP_FUNCTION_NUMBER) -> PrettyTable:
+    """Merge the Python and Node profiles of a run into profile.collapsed and summarize the hot functions.
+
+    profile.collapsed can be rendered by flamegraph.pl or speedscope. The top functions by self time are
+    saved to top.txt, and the wall and CPU time of the stages of all processes to stages.json.
+
+    Args:
+        run_path: Path of the profile directory of the run.
+        top_number: Number of functions in the summary.
+
+    Returns:
+        The table of the hot functions.
+    """
+    stacks = collections.Counter()
+    function_times = collections.defaultdict(lambda: [0, 0])
+    python_path = os.path.join(run_path, 'python')
+    node_path = os.path.join(run_path, 'node')
+    for file_name in sorted(os.listdir(python_path)):
+        file_path = os.path.join(python_path, file_name)
+        if file_name.endswith('.collapsed'):
+            stacks.update(read_collapsed_stacks(file_path))
+        elif file_name.endswith('.pstats'):
+            for (source_path, line_number, function_name), (_, _, self_time, total_time, _) in pstats.Stats(file_path).stats.items():
+                frame_name = f'{function_name} ({os.path.basename(source_path)}:{line_number})'
+                function_times[frame_name][0] += round(self_time * 1e6)
+                function_times[frame_name][1] += round(total_time * 1e6)
+    for file_name in sorted(os.listdir(node_path)):
+        if file_name.endswith('.cpuprofile'):
+            stacks.update(read_node_profile(os.path.join(node_path, file_name)))
+
+    with open(os.path.join(run_path, 'profile.collapsed'), 'w') as f:
+        for stack, weight in sorted(stacks.items()):
+            f.write(f'{stack} {weight}\n')
+    for frame_name, [self_time, total_time] in get_function_times(stacks).items():
+        function_times[frame_name][0] += self_time
+        function_times[frame_name][1] += total_time
+
+    stages = collections.OrderedDict()
+    stages_path = os.path.join(run_path, 'stages')
+    for file_name in sorted(os.listdir(stages_path)):
+        with open(os.path.join(stages_path, file_name), 'r') as f:
+            for stage in json.load(f):
+                summary = stages.setdefault(stage['stage'], {'stage': stage['stage'], 'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+                summary['count'] += 1
+                summary['wall_seconds'] = round(summary['wall_seconds'] + stage['wall_seconds'], 6)
+                summary['cpu_seconds'] = round(summary['cpu_seconds'] + stage['cpu_seconds'], 6)
+    with open(os.path.join(run_path, 'stages.json'), 'w') as f:
+        json.dump(list(stages.values()), f, indent=4)
+
+    total_time = sum(self_time for self_time, _ in function_times.values()) or 1
+    top_table = PrettyTable()
+    top_table.field_names = ['function', 'self (ms)', 'self (%)', 'total (ms)', 'total (%)']
+    top_table.align['function'] = 'l'
+    for frame_name, [self_time, function_total_time] in sorted(function_times.items(), key=lambda item: -item[1][0])[:top_number]:
+        top_table.add_row([frame_name, round(self_time / 1000, 1), round(self_time / total_time * 100, 1), round(function_total_time / 1000, 1), round(function_total_time / total_time * 100, 1)])
+    with open(os.path.join(run_path, 'top.txt'), 'w') as f:
+        f.write(top_table.get_string() + '\n')
+    return top_table
@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import tarfile
+import contextlib
+import collections
+
+
+DEFAULT_CACHE_QUOTA = 20480
+HASH_BLOCK_SIZE = 1024 * 1024
+LOCK_FILE_NAME = '.lock'
+PINS_DIR_NAME = '.pins'
+
+
+def get_tarball_hash(file_path: str) -> str:
+    """Get the SHA-256 of a compressed package.
+
+    Args:
+        file_path: Path of the compressed package.
+
+    Returns:
+        Hex digest of the package.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def get_tree_size(dir_path: str) -> int:
+    """Get the disk usage of a folder.
+
+    Args:
+        dir_path: Folder path.
+
+    Returns:
+        Disk usage in bytes.
+    """
+    size = 0
+    for dirpath, _, filenames in os.walk(dir_path):
+        for filename in filenames:
+            stat = os.lstat(os.path.join(dirpath, filename))
+            size += stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size
+    return size
+
+def make_accessible(dir_path: str):
+    """Add read, write and execute permissions to the folders and read and write permissions to the files of a tree."""
+    for dirpath, dirnames, filenames in os.walk(dir_path):
+        for dirname in dirnames:
+            os.chmod(os.path.join(dirpath, dirname), 0o777)
+        for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
+            if not os.path.islink(file_path):
+                os.chmod(file_path, 0o666)
+
+class DecompressCache:
+    """Cache of decompressed packages keyed by the SHA-256 of their tarballs.
+
+    Every entry is a folder <hash> with the decompressed package and a marker <hash>.json,
+    which is written only after the folder is complete, so half-extracted entries are never reused.
+    The modification time of the marker is the last use of the entry, and the least recently used
+    entries are evicted when the cache exceeds its quota. Entries in use are never evicted: every process
+    records the entries it uses in .pins/<pid> until it unpins them or exits, and pinning an entry and
+    evicting entries both hold the lock file .lock of the cache, so an entry is never evicted between its
+    lookup and its pin. An entry is renamed into place and marked with the lock held too, so a process never
+    sees the folder of another process before its marker.
+    """
+
+    def __init__(self, cache_path: str, quota: int = DEFAULT_CACHE_QUOTA):
+        """
+        Args:
+            cache_path: Path of the cache.
+            quota: Size quota of the cache in MiB.
+        """
+        self.cache_path = os.path.abspath(cache_path)
+        self.quota = quota
+        # number of uses of each entry pinned by this process, an entry can be used by several datasets at once
+        self.pin_counts = collections.Counter()
+        self.pins_path = os.path.join(self.cache_path, PINS_DIR_NAME)
+        os.makedirs(self.pins_path, exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold the lock of the cache shared by all processes."""
+        with open(os.path.join(self.cache_path, LOCK_FILE_NAME), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_pin_path(self) -> str:
+        """Get the path of the pins of this process."""
+        return os.path.join(self.pins_path, str(os.getpid()))
+
+    def pin(self, tarball_hash: str):
+        """Keep an entry from being evicted by any process until it is unpinned, called with the lock held."""
+        if self.pin_counts[tarball_hash] == 0:
+            with open(self.get_pin_path(), 'a') as f:
+                f.write(f'{tarball_hash}\n')
+        self.pin_counts[tarball_hash] += 1
+
+    def unpin(self, tarball_hashes: list):
+        """Release one use of each entry, an entry can be evicted again once all its uses are released.
+
+        Args:
+            tarball_hashes: Hashes of the entries, given once per use.
+        """
+        with self.lock():
+            for tarball_hash in tarball_hashes:
+                self.pin_counts[tarball_hash] -= 1
+                if self.pin_counts[tarball_hash] <= 0:
+                    del self.pin_counts[tarball_hash]
+            pin_path = self.get_pin_path()
+            with open(f'{pin_path}.tmp', 'w') as f:
+                f.write(''.join(f'{tarball_hash}\n' for tarball_hash in self.pin_counts))
+            os.replace(f'{pin_path}.tmp', pin_path)
+
+    @contextlib.contextmanager
+    def using(self, tarball_hashes: list):
+        """Unpin entries when the block using them ends.
+
+        Args:
+            tarball_hashes: Hashes of the entries pinned by get_package, given once per use.
+        """
+        try:
+            yield
+        finally:
+            self.unpin(tarball_hashes)
+
+    def get_pinned_hashes(self) -> set:
+        """Get the entries pinned by running processes and remove the pins of exited processes, called with the lock held."""
+        pinned_hashes = set(self.pin_counts)
+        for file_name in os.listdir(self.pins_path):
+            pin_path = os.path.join(self.pins_path, file_name)
+            if not file_name.isdigit():
+                continue
+            if not is_process_alive(int(file_name)):
+                os.remove(pin_path)
+                continue
+            with open(pin_path, 'r') as f:
+                pinned_hashes.update(line.strip() for line in f if line.strip())
+        return pinned_hashes
+
+    def get_marker_path(self, tarball_hash: str) -> str:
+        """Get the path of the marker of an entry."""
+        return os.path.join(self.cache_path, f'{tarball_hash}.json')
+
+    def load_marker(self, tarball_hash: str) -> dict:
+        """Load the marker of an entry, or None if the entry is incomplete."""
+        try:
+            with open(self.get_marker_path(tarball_hash), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+
+    def get_package(self, file_path: str) -> list:
+        """Get the decompressed package of a tarball, decompressing it only if it is not cached.
+
+        The entry is pinned until it is unpinned with the hash returned, e.g. by using.
+
+        Args:
+            file_path: Path of the compressed package.
+
+        Returns:
+            Path of the decompressed package, hash of the entry and whether it was reused from the cache.
+        """
+        tarball_hash = get_tarball_hash(file_path)
+        entry_path = os.path.join(self.cache_path, tarball_hash)
+        with self.lock():
+            self.pin(tarball_hash)
+            if self.load_marker(tarball_hash) is not None and os.path.isdir(entry_path):
+                os.utime(self.get_marker_path(tarball_hash))
+                return [entry_path, tarball_hash, True]
+
+        temp_entry_path = f'{entry_path}.tmp-{os.getpid()}'
+        try:
+            if os.path.exists(temp_entry_path):
+                shutil.rmtree(temp_entry_path)
+            os.makedirs(temp_entry_path)
+            with tarfile.open(file_path) as tar:
+                tar.extractall(path=temp_entry_path)
+            make_accessible(temp_entry_path)
+            marker = {
+                'package': os.path.basename(file_path),
+                'size': get_tree_size(temp_entry_path),
+                'created': time.time()
+            }
+            with self.lock():
+                if self.load_marker(tarball_hash) is not None and os.path.isdir(entry_path):
+                    # another process decompressed the same tarball first
+                    shutil.rmtree(temp_entry_path)
+                    os.utime(self.get_marker_path(tarball_hash))
+                    return [entry_path, tarball_hash, True]
+                if os.path.exists(entry_path):
+                    # an unmarked folder is only left by an interrupted decompression, since entries are marked with the lock held
+                    make_accessible(entry_path)
+                    shutil.rmtree(entry_path)
+                os.rename(temp_entry_path, entry_path)
+                marker_path = self.get_marker_path(tarball_hash)
+                with open(f'{marker_path}.tmp-{os.getpid()}', 'w') as f:
+                    json.dump(marker, f)
+                os.replace(f'{marker_path}.tmp-{os.getpid()}', marker_path)
+        except BaseException:
+            if os.path.exists(temp_entry_path):
+                make_accessible(temp_entry_path)
+                shutil.rmtree(temp_entry_path, ignore_errors=True)
+            self.unpin([tarball_hash])
+            raise
+        return [entry_path, tarball_hash, False]
+
+    def list_entries(self) -> list:
+        """List the complete entries from the least to the most recently used.
+
+        Returns:
+            Hash, size in bytes and last use of each entry.
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_path):
+            if file_name.startswith('.') or not file_name.endswith('.json'):
+                continue
+            tarball_hash = file_name[:-5]
+            marker = self.load_marker(tarball_hash)
+            if marker is None or not os.path.isdir(os.path.join(self.cache_path, tarball_hash)):
+                continue
+            try:
+                last_used = os.path.getmtime(self.get_marker_path(tarball_hash))
+            except FileNotFoundError:
+                continue
+            entries.append([tarball_hash, marker['size'], last_used])
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def remove_entry(self, tarball_hash: str):
+        """Remove an entry, the marker first so the entry is never reused half-deleted."""
+        try:
+            os.remove(self.get_marker_path(tarball_hash))
+        except FileNotFoundError:
+            pass
+        entry_path = os.path.join(self.cache_path, tarball_hash)
+        if os.path.exists(entry_path):
+            make_accessible(entry_path)
+            shutil.rmtree(entry_path, ignore_errors=True)
+
+    def remove_incomplete_entries(self) -> int:
+        """Remove the folders left by interrupted decompressions.
+
+        Returns:
+            Number of removed folders.
+        """
+        with self.lock():
+            pinned_hashes = self.get_pinned_hashes()
+        removed_number = 0
+        for file_name in os.listdir(self.cache_path):
+            file_path = os.path.join(self.cache_path, file_name)
+            # the folder of a pinned entry is complete once its marker is written
+            if file_name.startswith('.') or file_name in pinned_hashes or not os.path.isdir(file_path):
+                continue
+            # temporary folders of running decompressions are skipped
+            if '.tmp-' in file_name:
+                pid = file_name.rsplit('.tmp-', 1)[1]
+                if pid.isdigit() and is_process_alive(int(pid)):
+                    continue
+            elif self.load_marker(file_name) is not None:
+                continue
+            make_accessible(file_path)
+            shutil.rmtree(file_path, ignore_errors=True)
+            removed_number += 1
+        return removed_number
+
+    def evict(self, quota: int = None) -> list:
+        """Evict the least recently used entries until the cache fits in the quota.
+
+        Args:
+            quota: Size quota in MiB, the quota of the cache by default.
+
+        Returns:
+            Number of evicted entries, evicted bytes and the size of the cache in bytes after eviction,
+            which is above the quota if the entries used by running processes do not fit in it.
+        """
+        quota_bytes = (self.quota if quota is None else quota) * 1024 * 1024
+        with self.lock():
+            pinned_hashes = self.get_pinned_hashes()
+            entries = self.list_entries()
+            total_size = sum(entry[1] for entry in entries)
+            evicted_number = 0
+            evicted_size = 0
+            for tarball_hash, size, _ in entries:
+                if total_size <= quota_bytes:
+                    break
+                if tarball_hash in pinned_hashes:
+                    continue
+                self.remove_entry(tarball_hash)
+                total_size -= size
+                evicted_number += 1
+                evicted_size += size
+        return [evicted_number, evicted_size, total_size]
+
+    def prune(self, quota: int = None) -> dict:
+        """Remove incomplete entries and evict entries until the cache fits in the quota.
+
+        Args:
+            quota: Size quota in MiB, the quota of the cache by default.
+
+        Returns:
+            Number of removed incomplete entries, number of evicted entries and evicted bytes.
+        """
+        incomplete_number = self.remove_incomplete_entries()
+        [evicted_number, evicted_size, _] = self.evict(quota)
+        return {
+            'incomplete': incomplete_number,
+            'evicted': evicted_number,
+            'evicted_size': evicted_size
+        }
+
+    def stats(self) -> dict:
+        """Get the statistics of the cache.
+
+        Returns:
+            Number of entries, size in bytes, quota in bytes, number of incomplete entries and the first and last use.
+        """
+        entries = self.list_entries()
+        incomplete_number = sum(
+            1 for file_name in os.listdir(self.cache_path)
+            if not file_name.startswith('.') and os.path.isdir(os.path.join(self.cache_path, file_name)) and self.load_marker(file_name) is None
+        )
+        return {
+            'entries': len(entries),
+            'size': sum(entry[1] for entry in entries),
+            'quota': self.quota * 1024 * 1024,
+            'incomplete': incomplete_number,
+            'least_recently_used': entries[0][2] if entries else None,
+            'most_recently_used': entries[-1][2] if entries else None
+        }
+
+def is_process_alive(pid: int) -> bool:
+    """Whether a process is running on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -8,6 +8,6 @@ export const Logger = {
     console.log(chalk.yellow(`${new Date().toLocaleString()}: ${message}\n`))
   },
   error (message: string) {
-    console.log(chalk.red(`${new Date().toLocaleString()}: ${message}\n`))
+    console.error(chalk.red(`${new Date().toLocaleString()}: ${message}\n`))
   }
 }
@@ -1,4 +1,5 @@
 import { type PositionRecorder } from './feature-extract/PositionRecorder'
+import { type ExtractionProfile } from './feature-extract/ExtractionProfile'
 
 export enum Classifier {
   RF = 'RF',
@@ -10,11 +11,13 @@ export enum Classifier {
 interface Config {
   positionRecorder: PositionRecorder | null
   classifier: Classifier
+  extractionProfile: ExtractionProfile | null
 }
 
 const config: Config = {
   positionRecorder: null,
-  classifier: Classifier.SVM
+  classifier: Classifier.SVM,
+  extractionProfile: null
 }
 
 export const getConfig = () => config
@@ -26,3 +29,7 @@ export const setPositionRecorder = (positionRecorder: PositionRecorder) => {
 export const setClassifier = (classifier: Classifier) => {
   config.classifier = classifier
 }
+
+export const setExtractionProfile = (extractionProfile: ExtractionProfile | null) => {
+  config.extractionProfile = extractionProfile
+}
@@ -13,6 +13,7 @@ import {
 } from './Patterns'
 import { getFileLogger } from '../FileLogger'
 import { type PositionRecorder, type Record } from './PositionRecorder'
+import { isFeatureEnabled, type FeatureField } from './ExtractionProfile'
 
 const MAX_STRING_LENGTH = 66875
 
@@ -39,6 +40,32 @@ export async function extractFeaturesFromJSFileByAST (
     } as Record
   }
 
+  function isEnabledInFile (field: FeatureField, scriptField: FeatureField) {
+    return isFeatureEnabled(field) || (isInstallScript && isFeatureEnabled(scriptField))
+  }
+
+  // checks and scans of the features skipped by the extraction profile are not run
+  const checkBase64Conversion = isEnabledInFile('useBase64Conversion', 'useBase64ConversionInScript')
+  const checkProcess = isEnabledInFile('useProcess', 'useProcessInScript')
+  const checkFileSystem = isEnabledInFile('useFileSystem', 'useFileSystemInScript')
+  const checkNetwork = isEnabledInFile('useNetwork', 'useNetworkInScript')
+  const checkProcessEnv = isEnabledInFile('useProcessEnv', 'useProcessEnvInScript')
+  const checkEncryptAndEncode = isFeatureEnabled('useEncryptAndEncode')
+  const checkOperatingSystem = isFeatureEnabled('useOperatingSystem')
+  const checkBuffer = isFeatureEnabled('useBuffer')
+  const checkEval = isFeatureEnabled('useEval')
+  const scanIP = isFeatureEnabled('includeIP')
+  const scanBase64String = isEnabledInFile('includeBase64String', 'includeBase64StringInScript')
+  const scanDomain = isEnabledInFile('includeDomain', 'includeDomainInScript')
+  const scanSensitiveString = isFeatureEnabled('includeSensitiveFiles')
+  const scanObfuscatedCode = isFeatureEnabled('includeObfuscatedCode')
+  // the file is not parsed if none of its features is computed
+  if (!(checkBase64Conversion || checkProcess || checkFileSystem || checkNetwork || checkProcessEnv ||
+    checkEncryptAndEncode || checkOperatingSystem || checkBuffer || checkEval ||
+    scanIP || scanBase64String || scanDomain || scanSensitiveString || scanObfuscatedCode)) {
+    return featureSet
+  }
+
   const logger = await getFileLogger()
   let ast: any
   try {
@@ -57,6 +84,7 @@ export async function extractFeaturesFromJSFileByAST (
         // @ts-expect-error uselesss lint error
         if (path.node.callee.name === 'require') {
           if (
+            checkBase64Conversion &&
             path.node.arguments.length > 0 &&
             // @ts-expect-error uselesss lint error
             path.node.arguments[0].value === 'base64-js'
@@ -69,6 +97,7 @@ export async function extractFeaturesFromJSFileByAST (
             }
           }
           if (
+            checkProcess &&
             path.node.arguments.length > 0 &&
             // @ts-expect-error uselesss lint error
             path.node.arguments[0].value === 'child_process'
@@ -80,7 +109,7 @@ export async function extractFeaturesFromJSFileByAST (
               positionRecorder.addRecord('useProcessInScript', getRecord(path))
             }
           }
-          if (path.node.arguments.length > 0) {
+          if (checkFileSystem && path.node.arguments.length > 0) {
             // @ts-expect-error uselesss lint error
             const importModuleName = path.node.arguments[0].value
             if (
@@ -97,7 +126,7 @@ export async function extractFeaturesFromJSFileByAST (
               }
             }
           }
-          if (path.node.arguments.length > 0) {
+          if (checkNetwork && path.node.arguments.length > 0) {
             // @ts-expect-error uselesss lint error
             const moduleName = path.node.arguments[0].value as string
             if (
@@ -118,7 +147,7 @@ export async function extractFeaturesFromJSFileByAST (
               }
             }
           }
-          if (path.node.arguments.length > 0) {
+          if (checkEncryptAndEncode && path.node.arguments.length > 0) {
             // @ts-expect-error uselesss lint error
             const moduleName = path.node.arguments[0].value as string
             if (moduleName === 'crypto' || moduleName === 'zlib') {
@@ -128,6 +157,7 @@ export async function extractFeaturesFromJSFileByAST (
           }
         }
         if (
+          checkOperatingSystem &&
           isMemberExpression(path.node.callee) &&
           // @ts-expect-error uselesss lint error
           path.node.callee.object.name === 'os'
@@ -138,7 +168,7 @@ export async function extractFeaturesFromJSFileByAST (
       },
       StringLiteral: function (path) {
         const content = path.node.value
-        if (content === 'base64') {
+        if (checkBase64Conversion && content === 'base64') {
           featureSet.useBase64Conversion = true
           positionRecorder.addRecord('useBase64Conversion', getRecord(path))
           if (isInstallScript) {
@@ -149,14 +179,14 @@ export async function extractFeaturesFromJSFileByAST (
         if (content.length >= MAX_STRING_LENGTH) {
           return
         }
-        {
+        if (scanIP) {
           const matchResult = content.match(IP_Pattern)
           if (matchResult != null) {
             featureSet.includeIP = true
             positionRecorder.addRecord('includeIP', getRecord(path))
           }
         }
-        {
+        if (scanBase64String) {
           const matchResult = content.match(base64_Pattern)
           if (matchResult != null) {
             featureSet.includeBase64String = true
@@ -165,7 +195,7 @@ export async function extractFeaturesFromJSFileByAST (
             }
           }
         }
-        {
+        if (scanDomain) {
           const matchResult = content.match(getDomainPattern())
           if (matchResult != null) {
             const domainType = getDomainsType(matchResult)
@@ -192,7 +222,7 @@ export async function extractFeaturesFromJSFileByAST (
             }
           }
         }
-        {
+        if (scanSensitiveString) {
           const matchResult = content.match(SensitiveStringPattern)
           if (matchResult != null) {
             featureSet.includeSensitiveFiles = true
@@ -202,6 +232,7 @@ export async function extractFeaturesFromJSFileByAST (
       },
       MemberExpression: function (path) {
         if (
+          checkProcessEnv &&
           path.get('object').isIdentifier({ name: 'process' }) &&
           path.get('property').isIdentifier({ name: 'env' })
         ) {
@@ -213,6 +244,7 @@ export async function extractFeaturesFromJSFileByAST (
           }
         }
         if (
+          checkBuffer &&
           path.get('object').isIdentifier({ name: 'Buffer' }) &&
           path.get('property').isIdentifier({ name: 'from' })
         ) {
@@ -222,14 +254,14 @@ export async function extractFeaturesFromJSFileByAST (
       },
       NewExpression: function (path) {
         // @ts-expect-error uselesss lint error
-        if (path.node.callee.name === 'Buffer') {
+        if (checkBuffer && path.node.callee.name === 'Buffer') {
           featureSet.useBuffer = true
           positionRecorder.addRecord('useBuffer', getRecord(path))
         }
       },
       ImportDeclaration: function (path) {
         const moduleName = path.node.source.value
-        if (path.node.source.value === 'base64-js') {
+        if (checkBase64Conversion && path.node.source.value === 'base64-js') {
           featureSet.useBase64Conversion = true
           positionRecorder.addRecord('useBase64Conversion', getRecord(path))
           if (isInstallScript) {
@@ -237,7 +269,7 @@ export async function extractFeaturesFromJSFileByAST (
             positionRecorder.addRecord('useBase64ConversionInScript', getRecord(path))
           }
         }
-        if (path.node.source.value === 'child_process') {
+        if (checkProcess && path.node.source.value === 'child_process') {
           featureSet.useProcess = true
           positionRecorder.addRecord('useProcess', getRecord(path))
           if (isInstallScript) {
@@ -247,10 +279,12 @@ export async function extractFeaturesFromJSFileByAST (
         }
         {
           if (
-            moduleName === 'fs' ||
-            moduleName === 'fs/promises' ||
-            moduleName === 'path' ||
-            moduleName === 'promise-fs'
+            checkFileSystem && (
+              moduleName === 'fs' ||
+              moduleName === 'fs/promises' ||
+              moduleName === 'path' ||
+              moduleName === 'promise-fs'
+            )
           ) {
             featureSet.useFileSystem = true
             positionRecorder.addRecord('useFileSystem', getRecord(path))
@@ -262,14 +296,16 @@ export async function extractFeaturesFromJSFileByAST (
         }
         {
           if (
-            moduleName === 'http' ||
-            moduleName === 'https' ||
-            moduleName === 'nodemailer' ||
-            moduleName === 'aixos' ||
-            moduleName === 'request' ||
-            moduleName === 'node-fetch' ||
-            moduleName === 'got' ||
-            moduleName === 'dns'
+            checkNetwork && (
+              moduleName === 'http' ||
+              moduleName === 'https' ||
+              moduleName === 'nodemailer' ||
+              moduleName === 'aixos' ||
+              moduleName === 'request' ||
+              moduleName === 'node-fetch' ||
+              moduleName === 'got' ||
+              moduleName === 'dns'
+            )
           ) {
             featureSet.useNetwork = true
             positionRecorder.addRecord('useNetwork', getRecord(path))
@@ -280,17 +316,17 @@ export async function extractFeaturesFromJSFileByAST (
           }
         }
         {
-          if (moduleName === 'crypto' || moduleName === 'zlib') {
+          if (checkEncryptAndEncode && (moduleName === 'crypto' || moduleName === 'zlib')) {
             featureSet.useEncryptAndEncode = true
             positionRecorder.addRecord('useEncryptAndEncode', getRecord(path))
           }
         }
       },
       Identifier: function (path) {
-        if (path.node.name === 'eval') {
+        if (checkEval && path.node.name === 'eval') {
           featureSet.useEval = true
           positionRecorder.addRecord('useEval', getRecord(path))
-        } else if (path.node.name?.startsWith('_0x')) {
+        } else if (scanObfuscatedCode && path.node.name?.startsWith('_0x')) {
           featureSet.includeObfuscatedCode = true
           positionRecorder.addRecord('includeObfuscatedCode', getRecord(path))
         }
@@ -0,0 +1,62 @@
+import { readFileSync } from 'fs'
+import { type PackageFeatureInfo } from './PackageFeatureInfo'
+import { getConfig } from '../config'
+import featureList from './features.json'
+
+export type FeatureField = Exclude<keyof PackageFeatureInfo, 'installCommand' | 'executeJSFiles'>
+
+// the features in the order of the feature files, with the field of PackageFeatureInfo holding each of them,
+// features.json is also read by the training scripts to name the columns of the feature files
+export const FEATURES: Array<[string, FeatureField]> = featureList.map((feature): [string, FeatureField] => [feature.name, feature.field as FeatureField])
+const NEUTRAL_VALUES = new Map<FeatureField, number | boolean>(featureList.map((feature): [FeatureField, number | boolean] => [feature.field as FeatureField, feature.neutral]))
+
+/**
+ * Features computed by the extraction, derived from a saved model by the profile command.
+ * The visitors and scans of the other features are not run, and they are written with their neutral
+ * value in features.json, the value of a package without the feature.
+ */
+export interface ExtractionProfile {
+  name: string
+  fields: Set<FeatureField>
+}
+
+/**
+ * Load an extraction profile
+ * @param profilePath the path to the profile json file, whose features are the names in the feature files
+ * @returns the extraction profile
+ */
+export function loadExtractionProfile (profilePath: string): ExtractionProfile {
+  const profile = JSON.parse(readFileSync(profilePath, { encoding: 'utf-8' }))
+  const fields = new Set<FeatureField>()
+  for (const featureName of profile.features as string[]) {
+    const feature = FEATURES.find(([name]) => name === featureName)
+    if (feature === undefined) {
+      throw new Error(`Unknown feature ${featureName} in the extraction profile ${profilePath}`)
+    }
+    fields.add(feature[1])
+  }
+  return { name: profile.name, fields }
+}
+
+/**
+ * Whether a feature is computed, all features are computed without an extraction profile
+ * @param field the field of the feature
+ * @returns whether the feature is computed
+ */
+export function isFeatureEnabled (field: FeatureField): boolean {
+  const profile = getConfig().extractionProfile
+  return profile === null || profile.fields.has(field)
+}
+
+/**
+ * Get the value of a feature to be written, skipped features are written with their neutral value
+ * @param field the field of the feature
+ * @param value the extracted value of the feature
+ * @returns the value to be written
+ */
+export function getProfiledValue (field: FeatureField, value: number | boolean): number | boolean {
+  if (isFeatureEnabled(field)) {
+    return value
+  }
+  return NEUTRAL_VALUES.get(field) as number | boolean
+}
@@ -5,13 +5,15 @@ import { accessSync, readFileSync } from 'fs'
 import { dirname, join } from 'path'
 import { isStringLiteral } from '@babel/types'
 import { getFileLogger } from '../FileLogger'
+import { type PackageFileIndex } from './PackageFileIndex'
 
 /**
  * Get all JavaScript files that are executed or imported directly and indirectly in the install hook
  * @param jsFilesInInstallScript the path to js files in install script
+ * @param fileIndex the index of the package files, which is queried instead of the filesystem and records the install script files
  * @returns the parameter jsFilesInInstallScript
  */
-export async function getAllJSFilesInInstallScript (jsFilesInInstallScript: string[]) {
+export async function getAllJSFilesInInstallScript (jsFilesInInstallScript: string[], fileIndex?: PackageFileIndex) {
   async function resolveAllJSFilesInInstallScript (jsFilesInInstallScript: string[], idx: number) {
     if (idx >= jsFilesInInstallScript.length) {
       return
@@ -46,11 +48,18 @@ export async function getAllJSFilesInInstallScript (jsFilesInInstallScript: stri
                       if (!importScript.endsWith('.js')) {
                         importScript = importScript + '.js'
                       }
-                      try {
-                        accessSync(importScript)
-                        jsFilesInInstallScript.push(importScript)
-                      } catch (error) {
-                        // console.log(error)
+                      if (fileIndex !== undefined) {
+                        // each file is resolved once, so files requiring each other are not resolved endlessly
+                        if (fileIndex.exists(importScript) && fileIndex.addInstallScriptFile(importScript)) {
+                          jsFilesInInstallScript.push(importScript)
+                        }
+                      } else {
+                        try {
+                          accessSync(importScript)
+                          jsFilesInInstallScript.push(importScript)
+                        } catch (error) {
+                          // console.log(error)
+                        }
                       }
                     }
                   }
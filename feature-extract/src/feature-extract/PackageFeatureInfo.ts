@@ -6,8 +6,9 @@ import { getAllJSFilesInInstallScript } from './GetInstallScripts'
 import { extractFeaturesFromJSFileByAST } from './AST'
 import { matchUseRegExp } from './RegExp'
 import { PositionRecorder } from './PositionRecorder'
+import { PackageFileIndex } from './PackageFileIndex'
+import { isFeatureEnabled } from './ExtractionProfile'
 import { setPositionRecorder } from '../config'
-import { getPackageFromDir } from '../util'
 import { Logger } from '../Logger'
 
 const ALLOWED_MAX_JS_SIZE = 2 * 1024 * 1024
@@ -43,9 +44,12 @@ export interface PackageFeatureInfo {
 /**
  * Extract features from the npm package
  * @param packagePath the directory of the npm package, where there should be a package.json file
+ * @param featurePosPath the path to stream the feature positions to
  */
-export async function getPackageFeatureInfo (packagePath: string): Promise<PackageFeatureInfo> {
-  const positionRecorder = new PositionRecorder()
+export async function getPackageFeatureInfo (packagePath: string, featurePosPath?: string): Promise<PackageFeatureInfo> {
+  // the package tree is walked once, and all stages query the index instead of the filesystem
+  const fileIndex = await PackageFileIndex.build(packagePath)
+  const positionRecorder = new PositionRecorder(featurePosPath)
   const result: PackageFeatureInfo = {
     includeInstallScript: false,
     includeIP: false,
@@ -76,11 +80,10 @@ export async function getPackageFeatureInfo (packagePath: string): Promise<Packa
   
   try {
     // const packageJSONPath = path.join(packagePath, 'package', 'package.json')
-    const actualPackagePath = await getPackageFromDir(packagePath)
+    const actualPackagePath = fileIndex.packageRoot
     if (actualPackagePath !== '') {
       const packageJSONPath = path.join(actualPackagePath, 'package.json')
-      await promises.access(packageJSONPath)
-      const packageJSONInfo: PackageJSONInfo = await getPackageJSONInfo(packageJSONPath)
+      const packageJSONInfo: PackageJSONInfo = await getPackageJSONInfo(packageJSONPath, fileIndex)
       Object.assign(result, packageJSONInfo)
 
       if (packageJSONInfo.includeInstallScript) {
@@ -92,14 +95,14 @@ export async function getPackageFeatureInfo (packagePath: string): Promise<Packa
 
       // analyze commands in the install script 
       for (const scriptContent of packageJSONInfo.installCommand) {
-        {
+        if (isFeatureEnabled('includeIP')) {
           const matchResult = scriptContent.match(IP_Pattern)
           if (matchResult != null) {
             result.includeIP = true
             positionRecorder.addRecord('includeIP', { filePath: packageJSONPath, content: scriptContent })
           }
         }
-        {
+        if (isFeatureEnabled('includeDomainInScript')) {
           const matchResult = scriptContent.match(getDomainPattern())
           if (matchResult != null) {
             const domainType = getDomainsType(matchResult)
@@ -114,7 +117,7 @@ export async function getPackageFeatureInfo (packagePath: string): Promise<Packa
             }
           }
         }
-        {
+        if (isFeatureEnabled('useNetworkInScript')) {
           const matchResult = scriptContent.match(Network_Command_Pattern)
           if (matchResult != null) {
             result.useNetworkInScript = true
@@ -124,7 +127,7 @@ export async function getPackageFeatureInfo (packagePath: string): Promise<Packa
             })
           }
         }
-        {
+        if (isFeatureEnabled('includeSensitiveFiles')) {
           const matchResult = scriptContent.match(SensitiveStringPattern)
           if (matchResult != null) {
             result.includeSensitiveFiles = true
@@ -141,36 +144,35 @@ export async function getPackageFeatureInfo (packagePath: string): Promise<Packa
     Logger.error(`Cannot find package.json in ${packagePath}/package`)
   }
 
-  // analyze JavaScript files in the install script
-  await getAllJSFilesInInstallScript(result.executeJSFiles)
-
-  async function traverseDir (dirPath: string) {
-    if (path.basename(dirPath) === 'node_modules') {
-      return
+  async function analyzeFiles () {
+    for (const file of fileIndex.getAnalyzedFiles()) {
+      const isInstallScriptFile = fileIndex.isInstallScriptFile(file.filePath)
+      await new Promise((resolve) => {
+        setTimeout(async () => {
+          const fileSize = file.size ?? (await promises.stat(file.filePath)).size
+          // large files are skipped without reading them
+          if (fileSize <= ALLOWED_MAX_JS_SIZE) {
+            const jsFileContent = await promises.readFile(file.filePath, { encoding: 'utf-8' })
+            await extractFeaturesFromJSFileByAST(jsFileContent, result, isInstallScriptFile, file.filePath, positionRecorder)
+            matchUseRegExp(jsFileContent, result, positionRecorder, file.filePath)
+          }
+          resolve(true)
+        }, 0)
+      })
     }
-    const dir = await promises.opendir(dirPath)
-    for await (const dirent of dir) {
-      const jsFilePath = path.join(dirPath, dirent.name)
-      const isInstallScriptFile = result.executeJSFiles.findIndex(filePath => filePath === jsFilePath) >= 0
-      if (dirent.isFile() && (dirent.name.endsWith('.js') || isInstallScriptFile)) {
-        await new Promise((resolve) => {
-          setTimeout(async () => {
-            const targetJSFilePath = path.join(dirPath, dirent.name)
-            const jsFileContent = await promises.readFile(targetJSFilePath, { encoding: 'utf-8' })
-            const fileInfo = await promises.stat(targetJSFilePath)
-            if (fileInfo.size <= ALLOWED_MAX_JS_SIZE) {
-              await extractFeaturesFromJSFileByAST(jsFileContent, result, isInstallScriptFile, targetJSFilePath, positionRecorder)
-              matchUseRegExp(jsFileContent, result, positionRecorder, targetJSFilePath)
-            }
-            resolve(true)
-          }, 0)
-        })
-      } else if (dirent.isDirectory()) {
-        await traverseDir(path.join(dirPath, dirent.name))
-      }
+  }
+  // the package.json stage above catches its own errors, so the recorder is
+  // closed on every path once the install scripts are resolved inside the try
+  try {
+    // analyze JavaScript files in the install script
+    for (const jsFilePath of result.executeJSFiles) {
+      fileIndex.addInstallScriptFile(jsFilePath)
     }
+    await getAllJSFilesInInstallScript(result.executeJSFiles, fileIndex)
+    await analyzeFiles()
+  } finally {
+    positionRecorder.close()
   }
-  await traverseDir(packagePath)
   setPositionRecorder(positionRecorder)
   return result
 }
@@ -0,0 +1,148 @@
+import path from 'path'
+import promises from 'fs/promises'
+import { existsSync, type Dirent } from 'fs'
+
+export type IndexedFileType = 'file' | 'directory' | 'symlink'
+
+/**
+ * Compare two directories, neither of which is an ancestor of the other, by their order in a walk visiting directories sorted by name
+ * @param dirPath1 the first directory
+ * @param dirPath2 the second directory
+ * @returns a negative number if the first directory is visited first, otherwise a positive number
+ */
+function compareInSortedWalk (dirPath1: string, dirPath2: string): number {
+  const names1 = dirPath1.split(path.sep)
+  const names2 = dirPath2.split(path.sep)
+  for (let i = 0; i < Math.min(names1.length, names2.length); i++) {
+    if (names1[i] !== names2[i]) {
+      return Buffer.compare(Buffer.from(names1[i]), Buffer.from(names2[i]))
+    }
+  }
+  return names1.length - names2.length
+}
+
+export interface IndexedFile {
+  filePath: string
+  type: IndexedFileType
+  // only JavaScript files are stat-ed, their size decides whether they are analyzed
+  size?: number
+}
+
+/**
+ * Index of the files of an npm package, built by one walk of its directory tree.
+ * Directories named node_modules are not walked, the same as the feature extraction.
+ */
+export class PackageFileIndex {
+  // the directory of the package.json of the package, '' if there is none
+  packageRoot = ''
+  readonly files = new Map<string, IndexedFile>()
+  // files in walk order, which is the order they are analyzed in
+  readonly orderedFiles: IndexedFile[] = []
+  readonly installScriptFiles = new Set<string>()
+
+  private constructor (readonly packagePath: string) {}
+
+  /**
+   * Walk the directory tree of a package once
+   * @param packagePath the directory of the npm package
+   * @returns the index of the package files
+   */
+  static async build (packagePath: string): Promise<PackageFileIndex> {
+    const index = new PackageFileIndex(packagePath)
+    const packageRoots: string[] = []
+    await index.walk(packagePath, false, packageRoots)
+    // getPackageFromDir visits the directories sorted by name and keeps the last package.json it finds
+    for (const packageRoot of packageRoots) {
+      if (index.packageRoot === '' || compareInSortedWalk(index.packageRoot, packageRoot) < 0) {
+        index.packageRoot = packageRoot
+      }
+    }
+    return index
+  }
+
+  /**
+   * Walk a directory in the order of opendir, which is the order files are analyzed in
+   * @param dirPath the directory to be walked
+   * @param underPackageRoot whether an ancestor of the directory has a package.json
+   * @param packageRoots the directories with a package.json which have no ancestor with a package.json
+   */
+  private async walk (dirPath: string, underPackageRoot: boolean, packageRoots: string[]) {
+    if (path.basename(dirPath) === 'node_modules') {
+      return
+    }
+    const dirents: Dirent[] = []
+    for await (const dirent of await promises.opendir(dirPath)) {
+      dirents.push(dirent)
+    }
+    const hasPackageJSON = dirents.some(dirent => dirent.isFile() && dirent.name === 'package.json')
+    if (hasPackageJSON && !underPackageRoot) {
+      packageRoots.push(dirPath)
+    }
+    for (const dirent of dirents) {
+      const filePath = path.join(dirPath, dirent.name)
+      if (dirent.isFile()) {
+        const file: IndexedFile = { filePath, type: 'file' }
+        if (dirent.name.endsWith('.js')) {
+          file.size = (await promises.stat(filePath)).size
+        }
+        this.files.set(filePath, file)
+        this.orderedFiles.push(file)
+      } else if (dirent.isDirectory()) {
+        this.files.set(filePath, { filePath, type: 'directory' })
+        await this.walk(filePath, underPackageRoot || hasPackageJSON, packageRoots)
+      } else if (dirent.isSymbolicLink()) {
+        this.files.set(filePath, { filePath, type: 'symlink' })
+      }
+    }
+  }
+
+  /**
+   * Whether a path exists. Paths the walk did not reach, inside node_modules or behind a symlink, fall back to the filesystem.
+   * @param filePath the path to be checked
+   * @returns whether the path exists
+   */
+  exists (filePath: string): boolean {
+    const file = this.files.get(filePath)
+    if (file !== undefined) {
+      // a symlink may be dangling
+      return file.type !== 'symlink' || existsSync(filePath)
+    }
+    const relativePath = path.relative(this.packagePath, filePath)
+    if (relativePath.startsWith('..') || path.isAbsolute(relativePath)) {
+      return existsSync(filePath)
+    }
+    let dirPath = path.dirname(filePath)
+    while (dirPath.length > this.packagePath.length) {
+      if (path.basename(dirPath) === 'node_modules' || this.files.get(dirPath)?.type === 'symlink') {
+        return existsSync(filePath)
+      }
+      dirPath = path.dirname(dirPath)
+    }
+    return false
+  }
+
+  /**
+   * Record a JavaScript file executed or imported in the install script
+   * @param filePath the path to the JavaScript file
+   * @returns whether the file was not recorded before
+   */
+  addInstallScriptFile (filePath: string): boolean {
+    if (this.installScriptFiles.has(filePath)) {
+      return false
+    }
+    this.installScriptFiles.add(filePath)
+    return true
+  }
+
+  isInstallScriptFile (filePath: string): boolean {
+    return this.installScriptFiles.has(filePath)
+  }
+
+  /**
+   * Get the files to be analyzed in walk order, JavaScript files and files executed in the install script
+   * @returns the files to be analyzed
+   */
+  getAnalyzedFiles (): IndexedFile[] {
+    return this.orderedFiles.filter(file => file.filePath.endsWith('.js') || this.installScriptFiles.has(file.filePath))
+  }
+}
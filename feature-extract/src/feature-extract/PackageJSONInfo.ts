@@ -3,6 +3,7 @@ import promises from 'fs/promises'
 import path from 'path'
 import { isUTF8WithBOM, readFileFromUTF8WithBOM } from '../util/FileUtil'
 import { Logger } from '../Logger'
+import { type PackageFileIndex } from './PackageFileIndex'
 
 export interface PackageJSONInfo {
   dependencyNumber: number
@@ -22,12 +23,26 @@ export async function getPackageSize (tgzPath: string) {
   return fileInfo.size
 }
 
+/**
+ * Check that a file exists, from the package file index if given
+ * @param filePath the path to the file
+ * @param fileIndex the index of the package files
+ */
+async function accessFile (filePath: string, fileIndex?: PackageFileIndex) {
+  if (fileIndex === undefined) {
+    await promises.access(filePath)
+  } else if (!fileIndex.exists(filePath)) {
+    throw new Error(`${filePath} doesn't exist.`)
+  }
+}
+
 /**
  * Extract package information from package.json
  * @param packageJsonPath the path to package.json
+ * @param fileIndex the index of the package files, which is queried instead of the filesystem
  * @returns package information
  */
-export async function getPackageJSONInfo (packageJsonPath: string): Promise<PackageJSONInfo> {
+export async function getPackageJSONInfo (packageJsonPath: string, fileIndex?: PackageFileIndex): Promise<PackageJSONInfo> {
   const result: PackageJSONInfo = {
     dependencyNumber: 0,
     devDependencyNumber: 0,
@@ -56,7 +71,7 @@ export async function getPackageJSONInfo (packageJsonPath: string): Promise<Pack
     if (jsFile) {
       try {
         jsFile = path.join(parentDir, jsFile)
-        await promises.access(jsFile)
+        await accessFile(jsFile, fileIndex)
         executeJSFiles.push(jsFile)
       } catch (error) {
         Logger.warning(chalk.red(`The file in ${packageJsonPath} doesn't exist.`))
@@ -69,7 +84,7 @@ export async function getPackageJSONInfo (packageJsonPath: string): Promise<Pack
     if (jsFile) {
       try {
         jsFile = path.join(parentDir, jsFile)
-        await promises.access(jsFile)
+        await accessFile(jsFile, fileIndex)
         executeJSFiles.push(jsFile)
       } catch (error) {
         Logger.warning(chalk.red(`The file in ${packageJsonPath} doesn't exist.`))
@@ -82,7 +97,7 @@ export async function getPackageJSONInfo (packageJsonPath: string): Promise<Pack
     if (jsFile) {
       jsFile = path.join(parentDir, jsFile)
       try {
-        await promises.access(jsFile)
+        await accessFile(jsFile, fileIndex)
         executeJSFiles.push(jsFile)
       } catch (error) {
         Logger.warning(chalk.red(`The file in ${packageJsonPath} doesn't exist.`))
@@ -1,7 +1,12 @@
+import { closeSync, openSync, writeSync } from 'fs'
 import { type PackageFeatureInfo } from './PackageFeatureInfo'
+import { isFeatureEnabled, type FeatureField } from './ExtractionProfile'
 
 const MAX_RECORD_NUMBER = 1000
 
+// flush buffered lines to the position file once they exceed this number of characters
+const MAX_BUFFER_SIZE = 64 * 1024
+
 export interface Record {
   filePath: string
   content: {
@@ -18,39 +23,102 @@ export interface Record {
 
 type RecordFeatureInfo = Omit<PackageFeatureInfo, 'includeBase64String' | 'includeBase64StringInScript' | 'installCommand' | 'executeJSFiles' | 'packageName' | 'version'>
 
+/**
+ * Record the positions of features in JSON Lines, where every line is a JSON array:
+ * - [fileId, filePath] interns a file path, written before the first record in the file
+ * - [feature, fileId, startLine, startColumn, endLine, endColumn] records a code location
+ * - [feature, fileId, content] records a matched string
+ * Lines are streamed to the position file while the package is analyzed.
+ */
 export class PositionRecorder {
-  featurePosSet: { [k in keyof RecordFeatureInfo]: Record[] } = {
-    includeInstallScript: [],
-    includeIP: [],
-    useBase64Conversion: [],
-    useBase64ConversionInScript: [],
-    includeDomain: [],
-    includeDomainInScript: [],
-    includeByteString: [],
-    useBuffer: [],
-    useEval: [],
-    useProcess: [],
-    useProcessInScript: [],
-    useFileSystem: [],
-    useFileSystemInScript: [],
-    useNetwork: [],
-    useNetworkInScript: [],
-    useProcessEnv: [],
-    useProcessEnvInScript: [],
-    useEncryptAndEncode: [],
-    useOperatingSystem: [],
-    includeObfuscatedCode: [],
-    includeSensitiveFiles: []
+  recordNumbers: { [k in keyof RecordFeatureInfo]: number } = {
+    includeInstallScript: 0,
+    includeIP: 0,
+    useBase64Conversion: 0,
+    useBase64ConversionInScript: 0,
+    includeDomain: 0,
+    includeDomainInScript: 0,
+    includeByteString: 0,
+    useBuffer: 0,
+    useEval: 0,
+    useProcess: 0,
+    useProcessInScript: 0,
+    useFileSystem: 0,
+    useFileSystemInScript: 0,
+    useNetwork: 0,
+    useNetworkInScript: 0,
+    useProcessEnv: 0,
+    useProcessEnvInScript: 0,
+    useEncryptAndEncode: 0,
+    useOperatingSystem: 0,
+    includeObfuscatedCode: 0,
+    includeSensitiveFiles: 0
+  }
+
+  fileIds = new Map<string, number>()
+  lines: string[] = []
+  bufferSize = 0
+  fd: number | null = null
+
+  /**
+   * @param featurePosPath the path to the position file, lines are kept in memory if it is not given
+   */
+  constructor (featurePosPath?: string) {
+    if (featurePosPath) {
+      this.fd = openSync(featurePosPath, 'w')
+    }
   }
 
   addRecord (key: keyof PackageFeatureInfo, record: Record) {
-    if (this.featurePosSet[key].length > MAX_RECORD_NUMBER) {
+    // features skipped by the extraction profile have no positions
+    if (this.recordNumbers[key] > MAX_RECORD_NUMBER || !isFeatureEnabled(key as FeatureField)) {
+      return
+    }
+    this.recordNumbers[key]++
+    let fileId = this.fileIds.get(record.filePath)
+    if (fileId === undefined) {
+      fileId = this.fileIds.size
+      this.fileIds.set(record.filePath, fileId)
+      this.writeLine([fileId, record.filePath])
+    }
+    const content = record.content
+    if (content == null) {
+      this.writeLine([key, fileId])
+    } else if (typeof content === 'string') {
+      this.writeLine([key, fileId, content])
+    } else {
+      this.writeLine([key, fileId, content.start.line, content.start.column, content.end.line, content.end.column])
+    }
+  }
+
+  writeLine (line: Array<string | number>) {
+    const serializedLine = JSON.stringify(line)
+    this.lines.push(serializedLine)
+    this.bufferSize += serializedLine.length
+    if (this.bufferSize >= MAX_BUFFER_SIZE) {
+      this.flush()
+    }
+  }
+
+  flush () {
+    if (this.fd === null || this.lines.length === 0) {
+      return
+    }
+    writeSync(this.fd, this.lines.join('\n') + '\n')
+    this.lines = []
+    this.bufferSize = 0
+  }
+
+  close () {
+    if (this.fd === null) {
       return
     }
-    this.featurePosSet[key].push(record)
+    this.flush()
+    closeSync(this.fd)
+    this.fd = null
   }
 
   serializeRecord () {
-    return JSON.stringify(this.featurePosSet)
+    return this.lines.map(line => line + '\n').join('')
   }
 }
@@ -1,8 +1,13 @@
 import { type PackageFeatureInfo } from './PackageFeatureInfo'
 import { byteString_Pattern } from './Patterns'
 import { type PositionRecorder } from './PositionRecorder'
+import { isFeatureEnabled } from './ExtractionProfile'
 
 export function matchUseRegExp (code: string, result: PackageFeatureInfo, positionRecorder: PositionRecorder, targetJSFilePath: string) {
+  // the byte string pattern scans the whole file
+  if (!isFeatureEnabled('includeByteString')) {
+    return
+  }
   const matchResult = code.match(byteString_Pattern)
   if (matchResult != null) {
     result.includeByteString = true
@@ -1,29 +1,39 @@
 import { accessSync, constants } from 'fs'
 import { Worker, isMainThread, parentPort, workerData } from 'worker_threads'
 import { Logger } from './Logger'
+import { setExtractionProfile } from './config'
+import { loadExtractionProfile } from './feature-extract/ExtractionProfile'
 import { analyzeSinglePackage, analyzePackages, analyzePackagesMaster, analyzePackagesWorker } from './programs/AnalyzePackage/PackageAnalyzer'
 
 function showUsage () {
   Logger.info(
-`node main.js [-p, -d] [$package_path, $package_dir_path] $feature_dir_path $feature_pos_dir_path.
+`node main.js [-p, -d] [$package_path, $package_dir_path] $feature_dir_path $feature_pos_dir_path [--profile $profile_path].
 \t$package_path is absolute path to the npm package which should have a file named package.json.
 \t$package_dir_path is absolute path to the parent directory of the npm package which should have a file named package.json.
 \t$feature_dir_path is absolute path to the parent directory of the feature files.
-\t$feature_pos_dir_path is absolute path to the parent directory of the feature position files.`
+\t$feature_pos_dir_path is absolute path to the parent directory of the feature position files.
+\t$profile_path is path to the extraction profile, only the features of the profile are computed and the others are written with their neutral value.`
   )
 }
 
 async function main () {
-  if (process.argv.length === 6) {
-    const option = process.argv[2]
-    const packageOrDirPath = process.argv[3]
-    const featureDirPath = process.argv[4]
-    const featurePosDirPath = process.argv[5]
+  const args = process.argv.slice(2)
+  let profilePath: string | undefined
+  const profileIndex = args.indexOf('--profile')
+  if (profileIndex !== -1) {
+    profilePath = args[profileIndex + 1]
+    args.splice(profileIndex, 2)
+  }
+  if (args.length === 4 && (profileIndex === -1 || profilePath !== undefined)) {
+    const [option, packageOrDirPath, featureDirPath, featurePosDirPath] = args
     try {
+      if (profilePath !== undefined) {
+        setExtractionProfile(loadExtractionProfile(profilePath))
+      }
       if (option === '-d') {
         accessSync(packageOrDirPath, constants.F_OK | constants.R_OK)
         const packagesPath = await analyzePackages(packageOrDirPath, featureDirPath, featurePosDirPath)
-        await analyzePackagesMaster(packagesPath, featureDirPath, featurePosDirPath)
+        await analyzePackagesMaster(packagesPath, featureDirPath, featurePosDirPath, profilePath)
         return
       } else if (option === '-p') {
         accessSync(packageOrDirPath, constants.F_OK | constants.R_OK)
@@ -34,9 +44,11 @@ async function main () {
     } catch (error) {
       Logger.error(`Error: ${(error as Error).message}`)
       Logger.error(`Stack: ${(error as Error).stack}`)
+      process.exitCode = 1
     }
   } else {
     showUsage()
+    process.exitCode = 1
   }
 }
 
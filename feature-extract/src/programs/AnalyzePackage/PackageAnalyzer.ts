@@ -3,8 +3,9 @@ import promises from 'fs/promises'
 import { Worker, parentPort, workerData } from 'worker_threads'
 import { extractFeatureFromPackage } from '../../feature-extract'
 import { getErrorInfo } from '../../util'
-import { getConfig } from '../../config'
 import { Logger } from '../../Logger'
+import { setExtractionProfile } from '../../config'
+import { loadExtractionProfile } from '../../feature-extract/ExtractionProfile'
 import { readdirSync } from 'fs'
 
 /**
@@ -25,14 +26,12 @@ function getAnalyzeResult (fileName: string, featurePosPath: string): string {
  * @returns the result of extracting features
  */
 export async function analyzeSinglePackage (packagePath: string, featureDirPath: string, featurePosDirPath: string) {
-  const result = await extractFeatureFromPackage(packagePath, featureDirPath)
   // const packageName = path.basename(path.dirname(packagePath))
   const packageName = path.basename(packagePath)
   try {
-    const featurePosPath = path.join(featurePosDirPath, `${packageName}.json`)
-    // const featurePosPath = path.join(featurePosDirPath, `feature-positions.json`)
+    const featurePosPath = path.join(featurePosDirPath, `${packageName}.jsonl`)
+    const result = await extractFeatureFromPackage(packagePath, featureDirPath, featurePosPath)
     Logger.info(getAnalyzeResult(packageName, featurePosPath))
-    await promises.writeFile(featurePosPath, getConfig().positionRecorder!.serializeRecord())
     return result
   } catch (error) {
     Logger.error(getErrorInfo(error))
@@ -59,7 +58,14 @@ export async function analyzePackages (packageDirPath: string, featureDirPath: s
   return packagesPath
 }
 
-export async function analyzePackagesMaster(packagesPath: string[], featureDirPath: string, featurePosDirPath: string) {
+/**
+ * Extract the features of npm packages with worker threads
+ * @param packagesPath the absolute paths to npm packages
+ * @param featureDirPath the absolute directory path to save feature files
+ * @param featurePosDirPath the absolute directory path to save feature position files
+ * @param profilePath the path to the extraction profile, which every worker loads
+ */
+export async function analyzePackagesMaster(packagesPath: string[], featureDirPath: string, featurePosDirPath: string, profilePath?: string) {
   // const workersCount = os.cpus().length
   // FIXME: use 8 workers for now because of the memory limit, or the program will be killed
   const workersCount = 8
@@ -73,7 +79,8 @@ export async function analyzePackagesMaster(packagesPath: string[], featureDirPa
         workerId: i,
         packagesPath: packagesPath.slice(start, end),
         featureDirPath,
-        featurePosDirPath
+        featurePosDirPath,
+        profilePath
       }
     })
     workers.push(worker)
@@ -81,13 +88,20 @@ export async function analyzePackagesMaster(packagesPath: string[], featureDirPa
   for (const worker of workers) {
     worker.on('exit', (exitCode: number) => {
       Logger.info(`Worker stopped with exit code ${exitCode}`)
+      if (exitCode !== 0) {
+        process.exitCode = 1
+      }
     })
   }
 }
 
 export async function analyzePackagesWorker() {
-  const { workerId, packagesPath, featureDirPath, featurePosDirPath } = workerData
+  const { workerId, packagesPath, featureDirPath, featurePosDirPath, profilePath } = workerData
   Logger.info(`Worker ${workerId} started`)
+  // worker threads do not share the config of the main thread
+  if (profilePath !== undefined) {
+    setExtractionProfile(loadExtractionProfile(profilePath))
+  }
   for (const packagePath of packagesPath) {
     await analyzeSinglePackage(packagePath, featureDirPath, featurePosDirPath)
   }
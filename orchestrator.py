@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import asyncio
+import contextlib
+import collections
+
+from cpu_profile import profile_stage
+
+
+# the extractor analyzes packages with 8 worker threads
+EXTRACT_CPUS = 8
+DEFAULT_EXTRACT_MEMORY = 2048
+DECOMPRESS_MEMORY = 256
+STDERR_TAIL_LINES = 20
+
+
+def get_total_memory() -> int:
+    """Get the physical memory of the host.
+
+    Returns:
+        Physical memory in MiB, or None if it is unknown.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 1024 // 1024
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def get_default_memory_budget() -> int:
+    """Get the default memory budget of the extraction, 80% of the physical memory.
+
+    Returns:
+        Memory budget in MiB.
+    """
+    total_memory = get_total_memory()
+    if total_memory is None:
+        return 4 * DEFAULT_EXTRACT_MEMORY
+    return max(total_memory * 4 // 5, DECOMPRESS_MEMORY)
+
+class ResourceBudget:
+    """CPUs and memory shared by the concurrent steps of the extraction."""
+
+    def __init__(self, cpus: int, memory: int):
+        self.cpus = cpus
+        self.memory = memory
+        self.free_cpus = cpus
+        self.free_memory = memory
+        self.condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, cpus: int, memory: int):
+        """Wait until the CPUs and memory of a step are free and hold them while it runs.
+
+        Args:
+            cpus: Number of CPUs, a step larger than the budget runs alone.
+            memory: Memory in MiB, a step larger than the budget runs alone.
+        """
+        cpus = min(cpus, self.cpus)
+        memory = min(memory, self.memory)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.free_cpus >= cpus and self.free_memory >= memory)
+            self.free_cpus -= cpus
+            self.free_memory -= memory
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.free_cpus += cpus
+                self.free_memory += memory
+                self.condition.notify_all()
+
+async def run_extractor(extractor_path: str, dataset_name: str, dataset_path: str, feature_path: str, feature_position_path: str, profile_path: str = None, node_args: list = None) -> list:
+    """Run the compiled feature extractor on a decompressed dataset.
+
+    The stderr of the extractor is echoed with the dataset name as prefix.
+
+    Args:
+        extractor_path: Path of the compiled feature extractor.
+        dataset_name: Dataset name.
+        dataset_path: Path of the decompressed dataset.
+        feature_path: Path to save features.
+        feature_position_path: Path to save feature positions.
+        profile_path: Path of the extraction profile, all features are extracted by default.
+        node_args: Extra arguments of node, e.g. to write CPU profiles.
+
+    Returns:
+        Exit code and the last lines of stderr.
+    """
+    profile_args = [] if profile_path is None else ['--profile', profile_path]
+    process = await asyncio.create_subprocess_exec(
+        'node', *(node_args or []), 'main.js', '-d', dataset_path, feature_path, feature_position_path, *profile_args,
+        cwd=extractor_path,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    async for line in process.stderr:
+        line = line.decode('utf-8', errors='replace').rstrip()
+        stderr_tail.append(line)
+        print(f'[{dataset_name}] {line}', file=sys.stderr)
+    return [await process.wait(), list(stderr_tail)]
+
+async def extract_dataset(dataset_name: str, prepare, extractor_path: str, budget: ResourceBudget, decompress_lock: asyncio.Lock, extract_memory: int, profile_path: str = None, node_args: list = None, release=None) -> dict:
+    """Decompress and extract a dataset within the budget.
+
+    Args:
+        dataset_name: Dataset name.
+        prepare: Function decompressing a dataset and preparing its output folders, returns the paths of the decompressed dataset, features and feature positions.
+        extractor_path: Path of the compiled feature extractor.
+        budget: Budget shared by all datasets.
+        decompress_lock: Lock keeping one dataset decompressing at a time.
+        extract_memory: Memory of one extractor run in MiB.
+        profile_path: Path of the extraction profile, all features are extracted by default.
+        node_args: Extra arguments of node, e.g. to write CPU profiles.
+        release: Function called with the dataset name once a prepared dataset is extracted, e.g. to unpin its packages.
+
+    Returns:
+        Summary of the dataset.
+    """
+    summary = {'dataset': dataset_name, 'status': 'failed', 'exit_code': None, 'stderr': [], 'extracted': 0, 'decompress_seconds': 0.0, 'extract_seconds': 0.0}
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    try:
+        # datasets are decompressed in order, so the next one is decompressed while the previous one is extracted
+        async with decompress_lock:
+            async with budget.reserve(1, DECOMPRESS_MEMORY):
+                [dataset_path, feature_path, feature_position_path] = await loop.run_in_executor(None, prepare, dataset_name)
+    except Exception as e:
+        summary['stderr'] = [f'Decompress failed: {e}']
+        return summary
+    summary['decompress_seconds'] = round(time.monotonic() - start, 3)
+
+    try:
+        # leave one CPU and the memory of a decompression free, so the next dataset is decompressed while this one is extracted
+        extract_cpus = min(EXTRACT_CPUS, budget.cpus - 1) if budget.cpus > 1 else 1
+        if budget.memory > DECOMPRESS_MEMORY:
+            extract_memory = min(extract_memory, budget.memory - DECOMPRESS_MEMORY)
+        async with budget.reserve(extract_cpus, extract_memory):
+            start = time.monotonic()
+            # the stage starts after the dataset is decompressed, which is a stage of its own
+            with profile_stage('extract', children=True):
+                try:
+                    [summary['exit_code'], summary['stderr']] = await run_extractor(extractor_path, dataset_name, dataset_path, feature_path, feature_position_path, profile_path, node_args)
+                except OSError as e:
+                    summary['stderr'] = [f'Run extractor failed: {e}']
+            summary['extract_seconds'] = round(time.monotonic() - start, 3)
+        if summary['exit_code'] == 0:
+            summary['status'] = 'done'
+        summary['extracted'] = sum(1 for f in os.listdir(feature_path) if f.endswith('.csv'))
+        return summary
+    finally:
+        if release is not None:
+            await loop.run_in_executor(None, release, dataset_name)
+
+async def extract_datasets_async(dataset_names: list, prepare, extractor_path: str, cpus: int, memory: int, extract_memory: int, profile_path: str = None, node_args: list = None, release=None) -> list:
+    """Run the extraction of all datasets in one event loop, see extract_datasets."""
+    budget = ResourceBudget(cpus, memory)
+    decompress_lock = asyncio.Lock()
+    return await asyncio.gather(*[
+        extract_dataset(dataset_name, prepare, extractor_path, budget, decompress_lock, extract_memory, profile_path, node_args, release)
+        for dataset_name in dataset_names
+    ])
+
+def extract_datasets(dataset_names: list, prepare, extractor_path: str, cpus: int = None, memory: int = None, extract_memory: int = DEFAULT_EXTRACT_MEMORY, profile_path: str = None, node_args: list = None, release=None) -> list:
+    """Decompress and extract several datasets concurrently within a CPU and memory budget.
+
+    Args:
+        dataset_names: Dataset names.
+        prepare: Function decompressing a dataset and preparing its output folders, returns the paths of the decompressed dataset, features and feature positions.
+        extractor_path: Path of the compiled feature extractor.
+        cpus: Number of CPUs of the budget, all CPUs by default.
+        memory: Memory of the budget in MiB, 80% of the physical memory by default.
+        extract_memory: Memory of one extractor run in MiB.
+        profile_path: Path of the extraction profile, all features are extracted by default.
+        node_args: Extra arguments of node, e.g. to write CPU profiles.
+        release: Function called with the dataset name once a prepared dataset is extracted, e.g. to unpin its packages.
+
+    Returns:
+        Summary of each dataset in the given order, with its status, extractor exit code, last lines of stderr,
+        number of extracted packages and the time spent decompressing and extracting.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    memory = memory or get_default_memory_budget()
+    return asyncio.run(extract_datasets_async(dataset_names, prepare, extractor_path, cpus, memory, extract_memory, profile_path, node_args, release))
@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+
+from training import get_parquet_part_file_names
+
+
+def parse_shard(value: str) -> list:
+    """Parse a shard given as i/N.
+
+    Args:
+        value: Shard, e.g. 0/4 for the first of 4 shards.
+
+    Returns:
+        Shard index and shard count.
+    """
+    try:
+        shard_index, shard_count = [int(v) for v in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} is not a shard like 0/4.')
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError(f'{value} is not a shard like 0/4.')
+    return [shard_index, shard_count]
+
+def get_shard_index(package_name: str, shard_count: int) -> int:
+    """Get the shard of a package, which is stable across hosts and runs.
+
+    Args:
+        package_name: Package name.
+        shard_count: Number of shards.
+
+    Returns:
+        Shard index.
+    """
+    return int(hashlib.sha1(package_name.encode('utf-8')).hexdigest(), 16) % shard_count
+
+def in_shard(package_name: str, shard: list) -> bool:
+    """Whether a package belongs to a shard.
+
+    Args:
+        package_name: Package name.
+        shard: Shard index and shard count.
+
+    Returns:
+        Whether the package belongs to the shard.
+    """
+    return get_shard_index(package_name, shard[1]) == shard[0]
+
+def get_shard_name(shard: list) -> str:
+    """Get the name of a shard, e.g. shard-0-of-4."""
+    return f'shard-{shard[0]}-of-{shard[1]}'
+
+def get_bundle_path(shards_path: str, dataset_name: str, shard: list) -> str:
+    """Get the path of the output bundle of a shard.
+
+    A bundle contains the features, feature-positions and reports directories and a manifest.json.
+
+    Args:
+        shards_path: Path of the shard bundles.
+        dataset_name: Dataset name.
+        shard: Shard index and shard count.
+
+    Returns:
+        Path of the bundle.
+    """
+    return os.path.abspath(os.path.join(shards_path, dataset_name, get_shard_name(shard)))
+
+def load_manifest(bundle_path: str) -> dict:
+    """Load the manifest of a bundle.
+
+    Args:
+        bundle_path: Path of the bundle.
+
+    Returns:
+        Manifest, or None if the bundle has no manifest.
+    """
+    manifest_path = os.path.join(bundle_path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(bundle_path: str, manifest: dict):
+    """Save the manifest of a bundle atomically.
+
+    Args:
+        bundle_path: Path of the bundle.
+        manifest: Manifest.
+    """
+    manifest_path = os.path.join(bundle_path, 'manifest.json')
+    with open(f'{manifest_path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+def load_bundles(shards_path: str, dataset_name: str, shard_count: int, package_names: list = None) -> list:
+    """Load and verify the manifests of all shards of a dataset.
+
+    Args:
+        shards_path: Path of the shard bundles.
+        dataset_name: Dataset name.
+        shard_count: Number of shards.
+        package_names: All packages of the dataset, used to verify that every package was assigned, if known.
+
+    Returns:
+        Bundle paths and manifests by shard index, and the problems found.
+    """
+    bundles = []
+    problems = []
+    assigned_packages = set()
+    for shard_index in range(shard_count):
+        bundle_path = get_bundle_path(shards_path, dataset_name, [shard_index, shard_count])
+        manifest = load_manifest(bundle_path)
+        if manifest is None:
+            problems.append(f'Bundle {bundle_path} has no manifest.')
+            continue
+        if manifest['dataset'] != dataset_name or manifest['shard'] != [shard_index, shard_count]:
+            problems.append(f'Manifest of {bundle_path} belongs to {manifest["dataset"]} {get_shard_name(manifest["shard"])}.')
+            continue
+        for package_name in manifest['packages']:
+            if not in_shard(package_name, [shard_index, shard_count]):
+                problems.append(f'Package {package_name} does not belong to {get_shard_name([shard_index, shard_count])}.')
+        assigned_packages.update(manifest['packages'])
+        bundles.append([bundle_path, manifest])
+    if package_names is not None:
+        for package_name in sorted(set(package_names) - assigned_packages):
+            problems.append(f'Package {package_name} is missing from all shards.')
+    return [bundles, problems]
+
+def copy_directory_files(source_path: str, target_path: str):
+    """Copy the files of a directory into another directory."""
+    if not os.path.exists(source_path):
+        return
+    with os.scandir(source_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                shutil.copy2(entry.path, os.path.join(target_path, entry.name))
+
+def merge_reports(report_paths: list, merged_report_path: str):
+    """Merge the reports of all shards into one report.
+
+    Only the complete part files of Parquet reports are merged, a part file left behind by an interrupted
+    shard is skipped.
+
+    Args:
+        report_paths: Paths of the shard reports in the same format.
+        merged_report_path: Path of the merged report.
+    """
+    if merged_report_path.endswith('.parquet'):
+        if os.path.exists(merged_report_path):
+            shutil.rmtree(merged_report_path)
+        os.makedirs(merged_report_path)
+        part_counter = 0
+        for report_path in report_paths:
+            for part_file_name in get_parquet_part_file_names(report_path):
+                shutil.copy2(os.path.join(report_path, part_file_name), os.path.join(merged_report_path, f'part-{part_counter:05d}.parquet'))
+                part_counter += 1
+        return
+    with open(merged_report_path, 'w') as merged_report:
+        for counter, report_path in enumerate(report_paths):
+            with open(report_path, 'r') as report:
+                # csv reports keep only the header of the first shard
+                if merged_report_path.endswith('.csv') and counter > 0:
+                    next(report, None)
+                shutil.copyfileobj(report, merged_report)
+
+def merge_bundles(bundles: list, feature_path: str, feature_position_path: str, report_dir_path: str) -> dict:
+    """Merge the bundles of all shards into the standard feature directory and report layout.
+
+    Args:
+        bundles: Bundle paths and manifests of all shards.
+        feature_path: Path of the merged features, which should be empty.
+        feature_position_path: Path of the merged feature positions, which should be empty.
+        report_dir_path: Path of the reports.
+
+    Returns:
+        Number of packages, number of extracted packages and merged report names.
+    """
+    package_number = 0
+    extracted_number = 0
+    for bundle_path, manifest in bundles:
+        copy_directory_files(os.path.join(bundle_path, 'features'), feature_path)
+        copy_directory_files(os.path.join(bundle_path, 'feature-positions'), feature_position_path)
+        package_number += len(manifest['packages'])
+        extracted_number += len(manifest['extracted'])
+
+    # only reports produced by every shard are merged
+    report_names = set(bundles[0][1]['reports']) if bundles else set()
+    for _, manifest in bundles[1:]:
+        report_names &= set(manifest['reports'])
+    for report_name in sorted(report_names):
+        report_paths = [os.path.join(bundle_path, 'reports', report_name) for bundle_path, _ in bundles]
+        merge_reports(report_paths, os.path.join(report_dir_path, report_name))
+    return {
+        'packages': package_number,
+        'extracted': extracted_number,
+        'reports': sorted(report_names)
+    }
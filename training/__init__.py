@@ -1,13 +1,44 @@
-from .src.train_classifier import PreprocessMethodEnum, ModelEnum, ActionEnum, train
-from .src.predict import predict_package_MLP, predict_package_NB, predict_package_SVM, predict_package_RF
+from .src.train_classifier import PreprocessMethodEnum, ModelEnum, ActionEnum, train, train_models
+from .src.predict import predict_package_MLP, predict_package_NB, predict_package_SVM, predict_package_RF, predict_packages
+from .src.cascade import select_cascade_thresholds, predict_package_cascade, get_first_stage_profile, predict_packages_first_stage, predict_packages_second_stage
+from .src.report_writer import ReportFormatEnum, open_report_writer, get_report_path, get_parquet_part_file_names
+from .src.feature_matrix import build_feature_matrix, get_peak_rss
+from .src.evaluate import evaluate_models, get_artifact_names
+from .src.read_feature import read_labeled_features
+from .src.extraction_profile import build_extraction_profile, evaluate_extraction_profiles, get_profile_names, get_profile_path, FULL_PROFILE_NAME
+from .src.read_feature_position import iter_feature_positions, read_feature_positions, get_feature_positions
 
 __all__ = [
     'PreprocessMethodEnum',
     'ModelEnum',
     'ActionEnum',
     'train',
+    'train_models',
     'predict_package_MLP',
     'predict_package_NB',
     'predict_package_SVM',
-    'predict_package_RF'
+    'predict_package_RF',
+    'predict_packages',
+    'select_cascade_thresholds',
+    'predict_package_cascade',
+    'get_first_stage_profile',
+    'predict_packages_first_stage',
+    'predict_packages_second_stage',
+    'iter_feature_positions',
+    'read_feature_positions',
+    'get_feature_positions',
+    'ReportFormatEnum',
+    'open_report_writer',
+    'get_report_path',
+    'get_parquet_part_file_names',
+    'build_feature_matrix',
+    'get_peak_rss',
+    'evaluate_models',
+    'get_artifact_names',
+    'build_extraction_profile',
+    'evaluate_extraction_profiles',
+    'read_labeled_features',
+    'get_profile_names',
+    'get_profile_path',
+    'FULL_PROFILE_NAME'
 ]
\ No newline at end of file
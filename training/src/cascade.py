@@ -0,0 +1,201 @@
+import os
+import json
+import math
+from functools import lru_cache
+
+import numpy
+from prettytable import PrettyTable
+
+from .commons import table_path, field_names, cascade_save_path
+from .model_util import evaluate_model
+from .predict import load_model, scale_feature_vectors
+from .read_feature import read_labeled_features, read_feature_from_file
+from .train_classifier import ModelEnum
+from .extraction_profile import load_extraction_profile, apply_extraction_profile
+
+
+def malicious_probability(classifier, feature_vectors) -> numpy.ndarray:
+    """Get the probability of the malicious class.
+
+    Args:
+        classifier: The classifier, which should support predict_proba.
+        feature_vectors: The (scaled) feature vectors.
+
+    Returns:
+        The probability of each feature vector being malicious.
+    """
+    malicious_index = list(classifier.classes_).index('malicious')
+    return classifier.predict_proba(feature_vectors)[:, malicious_index]
+
+def cascade_predict(probabilities: numpy.ndarray, second_stage_labels: numpy.ndarray, benign_threshold: float, malicious_threshold: float) -> numpy.ndarray:
+    """Combine the first stage probabilities and the second stage labels into cascade labels.
+
+    Args:
+        probabilities: The malicious probabilities of the first stage.
+        second_stage_labels: The labels predicted by the second stage.
+        benign_threshold: Packages whose probability is below it are decided benign by the first stage.
+        malicious_threshold: Packages whose probability is not below it are decided malicious by the first stage.
+
+    Returns:
+        The labels predicted by the cascade.
+    """
+    return numpy.where(probabilities >= malicious_threshold, 'malicious', numpy.where(probabilities < benign_threshold, 'benign', second_stage_labels))
+
+def select_cascade_thresholds(malcious_features_dir_paths: [], normal_features_dir_paths: [], first_stage: ModelEnum, second_stage: ModelEnum, target_recall: float = None, max_false_positive_rate: float = 0.01, first_stage_profile: str = None) -> dict:
+    """Select the thresholds of the cascade on validation data and save the cascade.
+
+    The malicious threshold is the lowest threshold that lets at most max_false_positive_rate of the benign
+    packages be decided malicious by the first stage. The benign threshold is then the highest threshold
+    that keeps the recall of the whole cascade on the malicious class at least target_recall.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing malicious validation feature files.
+        normal_features_dir_paths: The paths of the directories containing benign validation feature files.
+        first_stage: The fast model deciding confident packages, which should support predict_proba.
+        second_stage: The model deciding the uncertain packages.
+        target_recall: The recall on the malicious class to keep, defaults to the recall of the second stage alone.
+        max_false_positive_rate: The rate of benign packages allowed to be decided malicious by the first stage.
+        first_stage_profile: The extraction profile of the first stage, whose features are the only ones extracted before escalation.
+
+    Returns:
+        The cascade settings.
+    """
+    [X_val, y_val] = read_labeled_features(malcious_features_dir_paths, normal_features_dir_paths)
+    y_val = numpy.array(y_val)
+    is_malicious = y_val == 'malicious'
+    if is_malicious.all() or not is_malicious.any():
+        raise Exception('Validation data should contain both malicious and benign packages.')
+
+    [first_classifier, first_scaler] = load_model(first_stage)
+    [second_classifier, second_scaler] = load_model(second_stage)
+    # the first stage sees only the features of its extraction profile
+    profile = None if first_stage_profile is None else load_extraction_profile(first_stage_profile)
+    probabilities = malicious_probability(first_classifier, scale_feature_vectors(first_scaler, apply_extraction_profile(profile, X_val)))
+    second_stage_labels = second_classifier.predict(scale_feature_vectors(second_scaler, X_val))
+
+    benign_probabilities = numpy.sort(probabilities[~is_malicious])[::-1]
+    allowed_false_positives = int(max_false_positive_rate * len(benign_probabilities))
+    if allowed_false_positives < len(benign_probabilities):
+        malicious_threshold = float(numpy.nextafter(benign_probabilities[allowed_false_positives], numpy.inf))
+    else:
+        malicious_threshold = 0.0
+
+    second_stage_hits = second_stage_labels == 'malicious'
+    malicious_count = int(is_malicious.sum())
+    if target_recall is None:
+        target_recall = float(second_stage_hits[is_malicious].mean())
+    hits = (is_malicious & ((probabilities >= malicious_threshold) | second_stage_hits)).sum()
+    allowed_misses = int(hits) - math.ceil(target_recall * malicious_count)
+    if allowed_misses < 0:
+        benign_threshold = 0.0
+    else:
+        # clearing a malicious package below the benign threshold only costs recall if the second stage would have caught it
+        order = numpy.argsort(probabilities[is_malicious], kind='stable')
+        malicious_probabilities = probabilities[is_malicious][order]
+        misses = numpy.cumsum(second_stage_hits[is_malicious][order])
+        exceeded = numpy.nonzero(misses > allowed_misses)[0]
+        benign_threshold = float(malicious_probabilities[exceeded[0]]) if len(exceeded) > 0 else malicious_threshold
+    benign_threshold = min(benign_threshold, malicious_threshold)
+
+    y_pred = cascade_predict(probabilities, second_stage_labels, benign_threshold, malicious_threshold)
+    escalation_rate = float(((probabilities >= benign_threshold) & (probabilities < malicious_threshold)).mean())
+    table = PrettyTable()
+    table.field_names = field_names + ['escalation rate']
+    table.add_row([f'first_stage={first_stage.name}; first_stage_profile={first_stage_profile}; second_stage={second_stage.name}; benign_threshold={benign_threshold}; malicious_threshold={malicious_threshold}'] + evaluate_model(y_val, y_pred) + [escalation_rate])
+    table.add_row([f'second_stage={second_stage.name}'] + evaluate_model(y_val, second_stage_labels) + [1.0])
+    with open(os.path.join(table_path, 'cascade_validation.csv'), 'w+') as f:
+        f.write(table.get_csv_string())
+    print(table)
+
+    cascade = {
+        'first_stage': first_stage.name,
+        'first_stage_profile': first_stage_profile,
+        'second_stage': second_stage.name,
+        'benign_threshold': benign_threshold,
+        'malicious_threshold': malicious_threshold,
+        'target_recall': target_recall
+    }
+    with open(cascade_save_path, 'w') as f:
+        json.dump(cascade, f, indent=4)
+    load_cascade.cache_clear()
+    return cascade
+
+@lru_cache(maxsize=1)
+def load_cascade() -> list:
+    """Load the saved cascade and its models once per process.
+
+    Returns:
+        The cascade settings, the first stage classifier and scaler, the second stage classifier and scaler,
+        and the extraction profile of the first stage, which is None for the full extraction.
+    """
+    try:
+        with open(cascade_save_path, 'r') as f:
+            cascade = json.load(f)
+    except FileNotFoundError:
+        raise Exception(f'{cascade_save_path} not found, select the cascade thresholds first.')
+    first_stage_profile = cascade.get('first_stage_profile')
+    profile = None if first_stage_profile is None else load_extraction_profile(first_stage_profile)
+    return [cascade, load_model(ModelEnum[cascade['first_stage']]), load_model(ModelEnum[cascade['second_stage']]), profile]
+
+def get_first_stage_profile():
+    """Get the extraction profile of the first stage of the saved cascade.
+
+    Returns:
+        The extraction profile, or None if the first stage uses all features.
+    """
+    return load_cascade()[3]
+
+def predict_packages_first_stage(feature_file_paths: list) -> list:
+    """Predict the packages the first stage of the cascade is confident about.
+
+    Args:
+        feature_file_paths: The paths of the feature files of the packages, which may be extracted with the profile of the first stage.
+
+    Returns:
+        The predicted label of each package, or None if the package is escalated to the second stage.
+    """
+    if len(feature_file_paths) == 0:
+        return []
+    [cascade, [first_classifier, first_scaler], _, profile] = load_cascade()
+    feature_vectors = apply_extraction_profile(profile, [read_feature_from_file(feature_file_path) for feature_file_path in feature_file_paths])
+    probabilities = malicious_probability(first_classifier, scale_feature_vectors(first_scaler, feature_vectors))
+    return [
+        'malicious' if probability >= cascade['malicious_threshold'] else 'benign' if probability < cascade['benign_threshold'] else None
+        for probability in probabilities
+    ]
+
+def predict_packages_second_stage(feature_file_paths: list) -> list:
+    """Predict escalated packages with the second stage of the cascade.
+
+    Args:
+        feature_file_paths: The paths of the feature files of the packages, which should be extracted with all features.
+
+    Returns:
+        The predicted labels of the packages.
+    """
+    if len(feature_file_paths) == 0:
+        return []
+    [_, _, [second_classifier, second_scaler], _] = load_cascade()
+    feature_vectors = [read_feature_from_file(feature_file_path) for feature_file_path in feature_file_paths]
+    return list(second_classifier.predict(scale_feature_vectors(second_scaler, feature_vectors)))
+
+def predict_package_cascade(feature_file_path):
+    """Predict the label of a single package using the cascade.
+
+    The first stage decides the package if its malicious probability is outside the thresholds,
+    otherwise the package is escalated to the second stage.
+
+    Args:
+        feature_file_path: The path of the feature file of the package.
+
+    Returns:
+        The predicted label of the package.
+    """
+    [cascade, [first_classifier, first_scaler], [second_classifier, second_scaler], profile] = load_cascade()
+    feature_vector = [read_feature_from_file(feature_file_path)]
+    probability = malicious_probability(first_classifier, scale_feature_vectors(first_scaler, apply_extraction_profile(profile, feature_vector)))[0]
+    if probability >= cascade['malicious_threshold']:
+        return 'malicious'
+    if probability < cascade['benign_threshold']:
+        return 'benign'
+    return second_classifier.predict(scale_feature_vectors(second_scaler, feature_vector))[0]
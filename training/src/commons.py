@@ -19,6 +19,12 @@ rf_classifier_path = os.path.join(classifier_save_path, "RF.pkl")
 MLP_path = os.path.join(classifier_save_path, "MLP.pkl")
 nb_path = os.path.join(classifier_save_path, 'NB.pkl')
 svm_path = os.path.join(classifier_save_path, 'SVM.pkl')
+cascade_save_path = os.path.join(classifier_save_path, 'cascade.json')
+# parent directory of the temporary on-disk training matrices, one directory per run
+feature_matrix_save_path = SETTINGS['path']['feature-matrices']
+
+# older versions of the classifiers and scalers, one directory per version
+version_save_path = os.path.join(classifier_save_path, 'versions')
 
 classifier_path = rf_classifier_path
 
@@ -0,0 +1,146 @@
+import os
+import time
+import tracemalloc
+
+import numpy
+from prettytable import PrettyTable
+
+from .read_feature import read_labeled_features
+from .pickle_util import load_classifier, load_scaler
+from .predict import scale_feature_vectors
+from .model_util import evaluate_model
+from .update_classifier import get_version_path
+from .commons import table_path, classifier_save_path, version_save_path
+from .train_classifier import ModelEnum
+
+
+evaluation_field_names = ["model", "TP", "FP", "TN", "FN", "accuracy", "precision", "recall", "f1", "MCC", "load time (s)", "model size (MiB)", "load memory (MiB)", "p50 latency (ms)", "p99 latency (ms)", "throughput (samples/s)"]
+
+
+def get_classifier_names(dir_path: str) -> list:
+    """Get the names of the classifiers saved in a directory, without their scalers."""
+    if not os.path.isdir(dir_path):
+        return []
+    return [file_name[:-4] for file_name in os.listdir(dir_path) if file_name.endswith('.pkl') and file_name[:-4] in ModelEnum.__members__]
+
+def get_artifact_names() -> list:
+    """Get the names of the saved classifiers, including older versions such as RF-<version>.
+
+    Returns:
+        The artifact names.
+    """
+    artifact_names = get_classifier_names(classifier_save_path)
+    if os.path.isdir(version_save_path):
+        for version in os.listdir(version_save_path):
+            artifact_names += [f'{model_name}-{version}' for model_name in get_classifier_names(os.path.join(version_save_path, version))]
+    return sorted(artifact_names)
+
+def resolve_artifact(artifact_name: str) -> list:
+    """Resolve a saved classifier to its model and the paths of its classifier and scaler.
+
+    The scaler of a version is the scaler saved in the same version, a version without one was saved by RF.
+
+    Args:
+        artifact_name: The artifact name, e.g. RF or RF-<version>.
+
+    Returns:
+        The model, the path of the classifier and the path of the scaler, which is None for RF.
+    """
+    model_name, _, version = artifact_name.partition('-')
+    model = ModelEnum[model_name]
+    classifier_path = os.path.join(classifier_save_path, f'{model_name}.pkl')
+    scaler_path = os.path.join(classifier_save_path, f'{model_name}_scaler.pkl')
+    if version:
+        classifier_path = get_version_path(classifier_path, version)
+        scaler_path = get_version_path(scaler_path, version)
+    # RF predicts on unscaled features
+    if model == ModelEnum.RF:
+        return [model, classifier_path, None]
+    return [model, classifier_path, scaler_path]
+
+def load_artifact(classifier_path: str, scaler_path: str) -> list:
+    """Load a classifier and its scaler.
+
+    Args:
+        classifier_path: The path of the classifier.
+        scaler_path: The path of the scaler, or None if the model uses unscaled features.
+
+    Returns:
+        The classifier and the scaler.
+    """
+    return [load_classifier(classifier_path), None if scaler_path is None else load_scaler(scaler_path)]
+
+def evaluate_artifact(artifact_name: str, X: numpy.ndarray, y: list, latency_samples: int = 1000, batch_size: int = 1000) -> list:
+    """Evaluate the accuracy and the cost of a saved classifier.
+
+    Args:
+        artifact_name: The artifact name, e.g. RF or RF-<version>.
+        X: The feature vectors of the labeled samples.
+        y: The labels of the samples.
+        latency_samples: The number of samples predicted one by one to measure the latency.
+        batch_size: The number of samples per batch to measure the throughput.
+
+    Returns:
+        The row of the evaluation table.
+    """
+    [_, classifier_path, scaler_path] = resolve_artifact(artifact_name)
+    model_size = os.path.getsize(classifier_path) + (0 if scaler_path is None else os.path.getsize(scaler_path))
+
+    start = time.perf_counter()
+    [classifier, scaler] = load_artifact(classifier_path, scaler_path)
+    load_time = time.perf_counter() - start
+
+    # load again with tracing, which slows the load down
+    tracemalloc.start()
+    traced_artifact = load_artifact(classifier_path, scaler_path)
+    load_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced_artifact
+
+    latencies = []
+    for index in range(min(latency_samples, len(X))):
+        start = time.perf_counter()
+        classifier.predict(scale_feature_vectors(scaler, X[index:index + 1]))
+        latencies.append(time.perf_counter() - start)
+
+    y_pred = []
+    start = time.perf_counter()
+    for index in range(0, len(X), batch_size):
+        y_pred.extend(classifier.predict(scale_feature_vectors(scaler, X[index:index + batch_size])))
+    throughput = len(X) / (time.perf_counter() - start)
+
+    [tp, fp, tn, fn, acc, precision, recall, f1, mcc] = evaluate_model(y, y_pred)
+    return [
+        artifact_name, tp, fp, tn, fn, acc, precision, recall, f1, mcc,
+        round(load_time, 4),
+        round(model_size / 1024 / 1024, 3),
+        round(load_memory / 1024 / 1024, 3),
+        round(numpy.percentile(latencies, 50) * 1000, 4),
+        round(numpy.percentile(latencies, 99) * 1000, 4),
+        round(throughput, 1)
+    ]
+
+def evaluate_models(malcious_features_dir_paths: [], normal_features_dir_paths: [], artifact_names: list, latency_samples: int = 1000, batch_size: int = 1000) -> PrettyTable:
+    """Evaluate saved classifiers side by side on labeled feature datasets.
+
+    The table is saved to evaluation.csv in the results directory.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing malicious sample feature files.
+        normal_features_dir_paths: The paths of the directories containing benign sample feature files.
+        artifact_names: The saved classifiers, e.g. RF, RF-<version> or MLP.
+        latency_samples: The number of samples predicted one by one to measure the latency.
+        batch_size: The number of samples per batch to measure the throughput.
+
+    Returns:
+        The evaluation table.
+    """
+    [X, y] = read_labeled_features(malcious_features_dir_paths, normal_features_dir_paths)
+
+    evaluation_table = PrettyTable()
+    evaluation_table.field_names = evaluation_field_names
+    for artifact_name in artifact_names:
+        evaluation_table.add_row(evaluate_artifact(artifact_name, X, y, latency_samples, batch_size))
+    with open(os.path.join(table_path, 'evaluation.csv'), 'w+') as evaluation_file:
+        evaluation_file.write(evaluation_table.get_csv_string())
+    return evaluation_table
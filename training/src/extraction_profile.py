@@ -0,0 +1,195 @@
+import os
+import json
+
+import numpy
+from prettytable import PrettyTable
+from sklearn.inspection import permutation_importance
+
+from conf import ROOT_PATH
+
+from .commons import classifier_save_path, table_path
+from .model_util import evaluate_model
+from .predict import load_model, scale_feature_vectors
+from .read_feature import read_labeled_features
+from .train_classifier import ModelEnum
+
+
+# the features in the order of the feature files, shared with the extractor
+feature_list_path = os.path.join(ROOT_PATH, 'feature-extract', 'src', 'feature-extract', 'features.json')
+with open(feature_list_path, 'r') as f:
+    feature_list = json.load(f)
+feature_names = [feature['name'] for feature in feature_list]
+# skipped features are written with the value of a package without the feature
+neutral_feature_values = {feature['name']: feature['neutral'] for feature in feature_list}
+
+profile_save_path = os.path.join(classifier_save_path, 'profiles')
+FULL_PROFILE_NAME = 'full'
+
+profile_evaluation_field_names = ["profile", "model", "features", "TP", "FP", "TN", "FN", "accuracy", "precision", "recall", "f1", "MCC", "CPU per package (ms)", "speedup"]
+
+
+def get_profile_path(profile_name: str) -> str:
+    """Get the path of a saved extraction profile."""
+    return os.path.join(profile_save_path, f'{profile_name}.json')
+
+def get_profile_names() -> list:
+    """Get the names of the saved extraction profiles.
+
+    Returns:
+        The profile names.
+    """
+    if not os.path.isdir(profile_save_path):
+        return []
+    return sorted(file_name[:-5] for file_name in os.listdir(profile_save_path) if file_name.endswith('.json'))
+
+def load_extraction_profile(profile_name: str) -> dict:
+    """Load a saved extraction profile.
+
+    Args:
+        profile_name: The profile name.
+
+    Returns:
+        The extraction profile.
+    """
+    try:
+        with open(get_profile_path(profile_name), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise Exception(f'{get_profile_path(profile_name)} not found, build the extraction profile first.')
+
+def apply_extraction_profile(profile: dict, feature_vectors) -> numpy.ndarray:
+    """Replace the features skipped by a profile with their neutral value, as if extracted with the profile.
+
+    Args:
+        profile: The extraction profile, or None for the full extraction.
+        feature_vectors: The unscaled feature vectors.
+
+    Returns:
+        The feature vectors.
+    """
+    feature_vectors = numpy.array(feature_vectors, dtype=numpy.float64)
+    if profile is None:
+        return feature_vectors
+    for feature_name in profile['skipped']:
+        feature_vectors[:, feature_names.index(feature_name)] = float(neutral_feature_values[feature_name])
+    return feature_vectors
+
+def get_feature_importances(model: ModelEnum, X: numpy.ndarray = None, y: list = None) -> list:
+    """Get the importance of every feature to a saved model.
+
+    With labeled features, the importance is the mean drop of the accuracy when the feature is permuted.
+    Otherwise it is read from the model: the impurity importances of RF, the input weights of MLP and
+    the standardized distance between the class means of NB.
+
+    Args:
+        model: The model.
+        X: The unscaled feature vectors of labeled samples, optional.
+        y: The labels of the samples.
+
+    Returns:
+        The importances in the order of the features and the method computing them.
+    """
+    [classifier, scaler] = load_model(model)
+    if X is not None:
+        result = permutation_importance(classifier, scale_feature_vectors(scaler, X), y, n_repeats=5, random_state=0)
+        return [numpy.clip(result.importances_mean, 0, None), 'permutation']
+    if model == ModelEnum.RF:
+        return [classifier.feature_importances_, 'impurity']
+    if model == ModelEnum.MLP:
+        # an input whose weights are all zero is never used
+        return [numpy.abs(classifier.coefs_[0]).sum(axis=1), 'weights']
+    if model == ModelEnum.NB:
+        variances = classifier.var_ if hasattr(classifier, 'var_') else classifier.sigma_
+        return [numpy.abs(classifier.theta_[1] - classifier.theta_[0]) / numpy.sqrt(variances.mean(axis=0)), 'class means']
+    if getattr(classifier, 'kernel', None) == 'linear':
+        return [numpy.abs(classifier.coef_).sum(axis=0), 'weights']
+    raise Exception(f'{model.name} with a {classifier.kernel} kernel has no feature importances, give labeled features to compute permutation importances.')
+
+def build_extraction_profile(model: ModelEnum, profile_name: str, coverage: float = 1.0, X: numpy.ndarray = None, y: list = None) -> dict:
+    """Build an extraction profile from the feature importances of a saved model and save it.
+
+    The profile keeps the most important features until they cover the given share of the total importance,
+    features with no importance are always skipped.
+
+    Args:
+        model: The model.
+        profile_name: The profile name.
+        coverage: The share of the total importance kept, 1.0 skips only the features with no importance.
+        X: The unscaled feature vectors of labeled samples to compute permutation importances, optional.
+        y: The labels of the samples.
+
+    Returns:
+        The extraction profile.
+    """
+    if profile_name == FULL_PROFILE_NAME:
+        raise Exception(f'{FULL_PROFILE_NAME} is the extraction of all features and cannot be built.')
+    [importances, importance_method] = get_feature_importances(model, X, y)
+    total_importance = float(numpy.sum(importances))
+    if total_importance <= 0:
+        raise Exception(f'No feature is important to {model.name}.')
+    kept_features = set()
+    covered_importance = 0.0
+    for index in numpy.argsort(-importances, kind='stable'):
+        if importances[index] <= 0 or covered_importance >= coverage * total_importance - 1e-12:
+            break
+        kept_features.add(feature_names[index])
+        covered_importance += float(importances[index])
+
+    profile = {
+        'name': profile_name,
+        'model': model.name,
+        'coverage': coverage,
+        'importance_method': importance_method,
+        'features': [feature_name for feature_name in feature_names if feature_name in kept_features],
+        'skipped': [feature_name for feature_name in feature_names if feature_name not in kept_features],
+        'importances': {feature_name: float(importance / total_importance) for feature_name, importance in zip(feature_names, importances)}
+    }
+    profile['neutral_values'] = {feature_name: neutral_feature_values[feature_name] for feature_name in profile['skipped']}
+    os.makedirs(profile_save_path, exist_ok=True)
+    with open(f'{get_profile_path(profile_name)}.tmp', 'w') as f:
+        json.dump(profile, f, indent=4)
+    os.replace(f'{get_profile_path(profile_name)}.tmp', get_profile_path(profile_name))
+    return profile
+
+def evaluate_extraction_profiles(malcious_features_dir_paths: [], normal_features_dir_paths: [], profile_names: list, cpu_seconds: dict = None) -> PrettyTable:
+    """Compare the accuracy and the extraction cost of extraction profiles with the full extraction.
+
+    The accuracy of a profile is measured on fully extracted labeled features whose skipped features are
+    replaced with their neutral value, which is what the extraction with the profile writes.
+    The table is saved to profile_evaluation.csv in the results directory.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing malicious sample feature files.
+        normal_features_dir_paths: The paths of the directories containing benign sample feature files.
+        profile_names: The profile names.
+        cpu_seconds: The CPU seconds per package of the full extraction and of each profile by profile name, optional.
+
+    Returns:
+        The evaluation table.
+    """
+    [X, y] = read_labeled_features(malcious_features_dir_paths, normal_features_dir_paths)
+    profiles = [load_extraction_profile(profile_name) for profile_name in profile_names]
+    cpu_seconds = cpu_seconds or {}
+
+    def get_cost(profile_name: str) -> list:
+        if profile_name not in cpu_seconds:
+            return ['-', '-']
+        speedup = cpu_seconds[FULL_PROFILE_NAME] / cpu_seconds[profile_name] if cpu_seconds[profile_name] > 0 else '-'
+        return [round(cpu_seconds[profile_name] * 1000, 2), speedup if speedup == '-' else round(speedup, 2)]
+
+    evaluation_table = PrettyTable()
+    evaluation_table.field_names = profile_evaluation_field_names
+    models = {}
+    for profile in profiles:
+        model = ModelEnum[profile['model']]
+        if model not in models:
+            models[model] = load_model(model)
+            [classifier, scaler] = models[model]
+            y_pred = classifier.predict(scale_feature_vectors(scaler, X))
+            evaluation_table.add_row([FULL_PROFILE_NAME, model.name, len(feature_names)] + evaluate_model(y, y_pred) + get_cost(FULL_PROFILE_NAME))
+        [classifier, scaler] = models[model]
+        y_pred = classifier.predict(scale_feature_vectors(scaler, apply_extraction_profile(profile, X)))
+        evaluation_table.add_row([profile['name'], model.name, len(profile['features'])] + evaluate_model(y, y_pred) + get_cost(profile['name']))
+    with open(os.path.join(table_path, 'profile_evaluation.csv'), 'w+') as evaluation_file:
+        evaluation_file.write(evaluation_table.get_csv_string())
+    return evaluation_table
@@ -0,0 +1,141 @@
+import os
+import sys
+import shutil
+import tempfile
+import resource
+import contextlib
+
+import numpy
+from numpy.lib.format import open_memmap
+
+from .read_feature import read_feature_from_file
+from .commons import feature_matrix_save_path
+
+
+# labels are stored as 0 (benign) and 1 (malicious) and mapped to the label names only when fitting
+LABEL_NAMES = numpy.array(['benign', 'malicious'], dtype=object)
+
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def get_feature_file_paths(dir_paths: list):
+    """Iterate over the feature files in the directories.
+
+    Args:
+        dir_paths: The paths of the directories containing multiple sample feature files.
+
+    Yields:
+        The path of each feature file.
+    """
+    for dir_path in dir_paths:
+        for root, _, files in os.walk(dir_path):
+            for f in files:
+                yield os.path.join(root, f)
+
+@contextlib.contextmanager
+def feature_matrix_dir():
+    """Create the directory of the training matrices of one run, removed when the run ends.
+
+    Every run gets its own directory under the feature matrices path, so concurrent runs do not overwrite
+    each other's matrices.
+
+    Yields:
+        The path of the directory.
+    """
+    os.makedirs(feature_matrix_save_path, exist_ok=True)
+    matrix_dir_path = tempfile.mkdtemp(prefix='run-', dir=feature_matrix_save_path)
+    try:
+        yield matrix_dir_path
+    finally:
+        shutil.rmtree(matrix_dir_path, ignore_errors=True)
+
+def build_feature_matrix(malcious_features_dir_paths: list, normal_features_dir_paths: list, matrix_dir_path: str) -> list:
+    """Read the feature files into a compact on-disk matrix, one uint8 row per sample.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing multiple malicious sample feature files.
+        normal_features_dir_paths: The paths of the directories containing multiple benign sample feature files.
+        matrix_dir_path: The directory to store the matrix and the labels.
+
+    Returns:
+        The memory mapped feature matrix and the label vector.
+    """
+    malicious_number = sum(1 for _ in get_feature_file_paths(malcious_features_dir_paths))
+    benign_number = sum(1 for _ in get_feature_file_paths(normal_features_dir_paths))
+    sample_number = malicious_number + benign_number
+    if sample_number == 0:
+        raise Exception('No feature files found.')
+    first_feature_file_path = next(get_feature_file_paths(malcious_features_dir_paths + normal_features_dir_paths))
+    feature_number = len(read_feature_from_file(first_feature_file_path))
+
+    X = open_memmap(os.path.join(matrix_dir_path, 'features.npy'), mode='w+', dtype=numpy.uint8, shape=(sample_number, feature_number))
+    y = numpy.zeros(sample_number, dtype=numpy.uint8)
+    y[:malicious_number] = 1
+    feature_file_paths = get_feature_file_paths(malcious_features_dir_paths + normal_features_dir_paths)
+    for index, feature_file_path in enumerate(feature_file_paths):
+        X[index] = [int(value) for value in read_feature_from_file(feature_file_path)]
+    X.flush()
+    numpy.save(os.path.join(matrix_dir_path, 'labels.npy'), y)
+    return [X, y]
+
+def iter_chunk_indices(sample_number: int, chunk_size: int = DEFAULT_CHUNK_SIZE, shuffle: bool = False):
+    """Iterate over the sample indices chunk by chunk.
+
+    Args:
+        sample_number: The number of samples.
+        chunk_size: The number of samples per chunk.
+        shuffle: Draw the samples of each chunk at random, so every chunk mixes both labels.
+
+    Yields:
+        The sorted indices of each chunk.
+    """
+    indices = numpy.random.permutation(sample_number) if shuffle else numpy.arange(sample_number)
+    for start in range(0, sample_number, chunk_size):
+        yield numpy.sort(indices[start:start + chunk_size])
+
+def fit_scaler(scaler, X: numpy.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Fit a scaler chunk by chunk.
+
+    Args:
+        scaler: The StandardScaler or MinMaxScaler.
+        X: The feature matrix.
+        chunk_size: The number of samples per chunk.
+
+    Returns:
+        The fitted scaler.
+    """
+    for indices in iter_chunk_indices(len(X), chunk_size):
+        scaler.partial_fit(X[indices])
+    return scaler
+
+def scale_feature_matrix(scaler, X: numpy.ndarray, scaled_matrix_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, dtype=numpy.float32) -> numpy.ndarray:
+    """Scale a feature matrix chunk by chunk into an on-disk matrix.
+
+    Args:
+        scaler: The fitted scaler, or None to only convert the matrix to dtype.
+        X: The feature matrix.
+        scaled_matrix_path: The path of the scaled matrix.
+        chunk_size: The number of samples per chunk.
+        dtype: The dtype of the scaled matrix.
+
+    Returns:
+        The memory mapped scaled matrix.
+    """
+    X_scaled = open_memmap(scaled_matrix_path, mode='w+', dtype=dtype, shape=X.shape)
+    for start in range(0, len(X), chunk_size):
+        X_chunk = X[start:start + chunk_size]
+        X_scaled[start:start + chunk_size] = X_chunk if scaler is None else scaler.transform(X_chunk)
+    X_scaled.flush()
+    return X_scaled
+
+def get_peak_rss() -> float:
+    """Get the peak resident set size of the current process.
+
+    Returns:
+        The peak resident set size in MiB.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak_rss / 1024 / 1024
+    return peak_rss / 1024
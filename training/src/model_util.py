@@ -8,7 +8,7 @@ def evaluate_model(y_test, y_pred):
       y_test (list): List of true labels.
       y_pred (list): List of predicted labels.
    """
-   tn, fp, fn, tp = confusion_matrix(y_test, y_pred).ravel()
+   tn, fp, fn, tp = confusion_matrix(y_test, y_pred, labels=["benign", "malicious"]).ravel()
    acc = accuracy_score(y_test, y_pred)
    precision = precision_score(y_test, y_pred, pos_label="malicious")
    recall = recall_score(y_test, y_pred, pos_label="malicious")
@@ -1,17 +1,23 @@
+import os
 import pickle
 
 
+def save_atomically(obj, file_path):
+   """Pickle an object to a temporary file and move it into place, so readers never see a partial file."""
+   temp_file_path = f"{file_path}.tmp-{os.getpid()}"
+   with open(temp_file_path, "wb") as f:
+      pickle.dump(obj, f)
+   os.replace(temp_file_path, file_path)
+
 def save_classifier(classifier, file_path):
-   with open(file_path, "wb") as f:
-      pickle.dump(classifier, f)
+   save_atomically(classifier, file_path)
 
 def load_classifier(file_path):
    with open(file_path, "rb") as f:
       return pickle.load(f)
 
 def save_scaler(scaler, scaler_save_path):
-   with open(scaler_save_path, "wb") as f:
-      pickle.dump(scaler, f)
+   save_atomically(scaler, scaler_save_path)
 
 def load_scaler(scaler_save_path):
    with open(scaler_save_path, "rb") as f:
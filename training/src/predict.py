@@ -1,6 +1,7 @@
 from .pickle_util import load_classifier, load_scaler
 from .read_feature import read_feature_from_file
 from .commons import MLP_path, rf_scaler_save_path, mlp_scaler_save_path, nb_path,nb_scaler_save_path, svm_scaler_save_path,svm_path, rf_classifier_path
+from .train_classifier import ModelEnum
 
 
 def predict_single_package(classifier, feature_vector):
@@ -15,6 +16,54 @@ def predict_single_package(classifier, feature_vector):
     """
     return classifier.predict(feature_vector)
 
+def load_model(model: ModelEnum) -> list:
+    """Load a saved classifier together with its scaler.
+
+    Args:
+        model: The model to be loaded.
+
+    Returns:
+        The classifier and the scaler. The scaler is None for RF, which predicts on unscaled features.
+    """
+    if model == ModelEnum.RF:
+        return [load_classifier(rf_classifier_path), None]
+    if model == ModelEnum.MLP:
+        return [load_classifier(MLP_path), load_scaler(mlp_scaler_save_path)]
+    if model == ModelEnum.NB:
+        return [load_classifier(nb_path), load_scaler(nb_scaler_save_path)]
+    if model == ModelEnum.SVM:
+        return [load_classifier(svm_path), load_scaler(svm_scaler_save_path)]
+
+def scale_feature_vectors(scaler, feature_vectors):
+    """Scale feature vectors with the scaler of a model.
+
+    Args:
+        scaler: The scaler, or None if the model uses unscaled features.
+        feature_vectors: The feature vectors.
+
+    Returns:
+        The scaled feature vectors.
+    """
+    if scaler is None:
+        return feature_vectors
+    return scaler.transform(feature_vectors)
+
+def predict_packages(model: ModelEnum, feature_file_paths: list) -> list:
+    """Predict the labels of several packages with one load of the model.
+
+    Args:
+        model: The model used to predict.
+        feature_file_paths: The paths of the feature files of the packages.
+
+    Returns:
+        The predicted labels of the packages.
+    """
+    if len(feature_file_paths) == 0:
+        return []
+    [classifier, scaler] = load_model(model)
+    feature_vectors = [read_feature_from_file(feature_file_path) for feature_file_path in feature_file_paths]
+    return list(predict_single_package(classifier, scale_feature_vectors(scaler, feature_vectors)))
+
 def predict_package_MLP(feature_file_path):
     """Predict the label of a single package using MLP.
     
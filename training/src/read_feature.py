@@ -1,6 +1,8 @@
 import csv
 import os
 
+import numpy
+
 
 def normalize_feature(value):
     """Normalize the feature value.
@@ -70,4 +72,28 @@ def read_features_from_di(dirPath, feature_arr: list, label_arr: list, isMalicou
             csvPath = os.path.join(root, f)
             feature_file_names.append(f)
             feature_arr.append(read_feature_from_file(csvPath))
-            label_arr.append("malicious" if isMalicous  else "benign")
\ No newline at end of file
+            label_arr.append("malicious" if isMalicous  else "benign")
+
+def read_labeled_features(malcious_features_dir_paths: [], normal_features_dir_paths: []) -> list:
+    """Read the feature vectors and labels of labeled feature datasets.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing malicious sample feature files.
+        normal_features_dir_paths: The paths of the directories containing benign sample feature files.
+
+    Returns:
+        The feature vectors and the labels.
+    """
+    X = []
+    y = []
+    for malcious_features_dir_path in malcious_features_dir_paths:
+        [X_mal, y_mal, _] = read_features(malcious_features_dir_path, None)
+        X += X_mal
+        y += y_mal
+    for normal_features_dir_path in normal_features_dir_paths:
+        [X_ben, y_ben, _] = read_features(None, normal_features_dir_path)
+        X += X_ben
+        y += y_ben
+    if len(X) == 0:
+        raise Exception('No feature files found.')
+    return [numpy.array(X, dtype=numpy.float64), y]
@@ -0,0 +1,81 @@
+import os
+import json
+
+
+def decode_position_record(line: list, file_paths: dict) -> dict:
+    """Decode a record line of a feature position file.
+
+    Args:
+        line: The record line, which is [feature, file id] followed by a matched string or a code location.
+        file_paths: The interned file paths by file id.
+
+    Returns:
+        The record with its file path and content.
+    """
+    record = {'filePath': file_paths.get(line[1]), 'content': None}
+    if len(line) == 3:
+        record['content'] = line[2]
+    elif len(line) == 6:
+        record['content'] = {
+            'start': {'line': line[2], 'column': line[3]},
+            'end': {'line': line[4], 'column': line[5]}
+        }
+    return record
+
+def iter_feature_positions(feature_positions_file_path: str, feature: str = None):
+    """Lazily iterate over the records of a feature position file.
+
+    Only the interned file paths and the records of the requested feature are parsed.
+
+    Args:
+        feature_positions_file_path: The path of the feature position file.
+        feature: The feature to iterate over, all features if None.
+
+    Yields:
+        The feature name and its record.
+    """
+    file_paths = {}
+    record_prefix = '[' + json.dumps(feature) + ',' if feature is not None else '["'
+    with open(feature_positions_file_path, 'r') as f:
+        for line in f:
+            if line.startswith('["'):
+                if line.startswith(record_prefix):
+                    record = json.loads(line)
+                    yield record[0], decode_position_record(record, file_paths)
+            elif line.strip():
+                file_id, file_path = json.loads(line)
+                file_paths[file_id] = file_path
+
+def read_feature_positions(feature_positions_file_path: str, features: list = None) -> dict:
+    """Read the records of a feature position file.
+
+    Args:
+        feature_positions_file_path: The path of the feature position file.
+        features: The features to read, all features if None.
+
+    Returns:
+        The records grouped by feature.
+    """
+    feature_positions = {}
+    if features is not None and len(features) == 1:
+        records = iter_feature_positions(feature_positions_file_path, features[0])
+    else:
+        records = iter_feature_positions(feature_positions_file_path)
+    for feature, record in records:
+        if features is None or feature in features:
+            feature_positions.setdefault(feature, []).append(record)
+    return feature_positions
+
+def get_feature_positions(feature_positions_dir_path: str, package_name: str, feature: str) -> list:
+    """Get the records of a feature of a package.
+
+    Args:
+        feature_positions_dir_path: The path of the directory containing the feature position files.
+        package_name: The name of the package.
+        feature: The feature name, such as useEval.
+
+    Returns:
+        The records of the feature.
+    """
+    feature_positions_file_path = os.path.join(feature_positions_dir_path, f'{package_name}.jsonl')
+    return [record for _, record in iter_feature_positions(feature_positions_file_path, feature)]
@@ -0,0 +1,298 @@
+import os
+import abc
+import json
+from enum import Enum
+
+
+class ReportFormatEnum(Enum):
+    """Enumeration of report formats."""
+    CSV = 1
+    JSON_LINES = 2
+    PARQUET = 3
+
+REPORT_FILE_EXTENSIONS = {
+    ReportFormatEnum.CSV: 'csv',
+    ReportFormatEnum.JSON_LINES: 'jsonl',
+    ReportFormatEnum.PARQUET: 'parquet'
+}
+
+CSV_HEADER = 'package name, predict\n'
+
+
+def truncate_partial_line(report_path: str):
+    """Drop the last line of a line based report if it was not completely written.
+
+    Args:
+        report_path: The path of the report.
+    """
+    with open(report_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline_index = chunk.rfind(b'\n')
+            if newline_index >= 0:
+                position = position - step + newline_index + 1
+                break
+            position -= step
+        if position < size:
+            f.truncate(position)
+
+def get_parquet_part_file_names(report_path: str) -> list:
+    """Get the names of the complete part files of a Parquet report, in the order they were written.
+
+    Part files being written have a .parquet.tmp name and are left out.
+
+    Args:
+        report_path: The path of the report directory.
+
+    Returns:
+        The part file names.
+    """
+    return sorted(f for f in os.listdir(report_path) if f.startswith('part-') and f.endswith('.parquet'))
+
+class ReportWriter(abc.ABC):
+    """Write the prediction of packages to a report as they are produced.
+
+    Rows are buffered and flushed every buffer_size rows, so a crash loses at most one buffer.
+    When resuming, the packages already in the report are kept and can be skipped with is_finished.
+    Their names are held in a set, so resuming reads the whole report and takes about 120 bytes of memory
+    per finished package, around 1.2 GB for ten million packages.
+    """
+
+    def __init__(self, report_path: str, resume: bool = False, buffer_size: int = 1000):
+        """
+        Args:
+            report_path: The path of the report.
+            resume: Append to an existing report instead of overwriting it.
+            buffer_size: The number of rows buffered before flushing.
+        """
+        self.report_path = report_path
+        self.buffer_size = buffer_size
+        self.rows = []
+        self.finished_packages = set()
+        if resume and os.path.exists(report_path):
+            self.finished_packages = self.read_finished_packages()
+        else:
+            resume = False
+        self.open(resume)
+
+    @abc.abstractmethod
+    def open(self, resume: bool):
+        """Open the report, appending to it when resuming."""
+
+    @abc.abstractmethod
+    def read_finished_packages(self) -> set:
+        """Read the names of the packages already in the report."""
+
+    @abc.abstractmethod
+    def write_rows(self, rows: list):
+        """Write rows of package name and prediction to the report durably."""
+
+    @abc.abstractmethod
+    def close_report(self):
+        """Close the report."""
+
+    def is_finished(self, package_name: str) -> bool:
+        """Whether the package is already in the report."""
+        return package_name in self.finished_packages
+
+    def write(self, package_name: str, prediction: str):
+        """Add the prediction of a package to the report.
+
+        Args:
+            package_name: The name of the package.
+            prediction: The predicted label of the package.
+        """
+        self.rows.append((package_name, prediction))
+        if len(self.rows) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows to the report."""
+        if self.rows:
+            self.write_rows(self.rows)
+            self.rows = []
+
+    def sync(self):
+        """Flush the buffered rows and make every row written so far readable from the report after a crash."""
+        self.flush()
+
+    def close(self):
+        """Flush the buffered rows and close the report."""
+        self.flush()
+        self.close_report()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CSVReportWriter(ReportWriter):
+    """Write the report as CSV, in the same layout as the batch prediction report."""
+
+    def open(self, resume: bool):
+        if resume:
+            truncate_partial_line(self.report_path)
+        self.file = open(self.report_path, 'a' if resume else 'w')
+        if self.file.tell() == 0:
+            self.file.write(CSV_HEADER)
+            self.file.flush()
+
+    def read_finished_packages(self) -> set:
+        finished_packages = set()
+        with open(self.report_path, 'r') as f:
+            next(f, None)
+            for line in f:
+                if line.endswith('\n'):
+                    finished_packages.add(line.split(', ', 1)[0])
+        return finished_packages
+
+    def write_rows(self, rows: list):
+        self.file.write(''.join(f'{package_name}, {prediction}\n' for package_name, prediction in rows))
+        self.file.flush()
+
+    def close_report(self):
+        self.file.close()
+
+class JSONLinesReportWriter(ReportWriter):
+    """Write the report as JSON Lines, one object with package and prediction per line."""
+
+    def open(self, resume: bool):
+        if resume:
+            truncate_partial_line(self.report_path)
+        self.file = open(self.report_path, 'a' if resume else 'w')
+
+    def read_finished_packages(self) -> set:
+        finished_packages = set()
+        with open(self.report_path, 'r') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    finished_packages.add(json.loads(line)['package'])
+        return finished_packages
+
+    def write_rows(self, rows: list):
+        self.file.write(''.join(json.dumps({'package': package_name, 'prediction': prediction}) + '\n' for package_name, prediction in rows))
+        self.file.flush()
+
+    def close_report(self):
+        self.file.close()
+
+class ParquetReportWriter(ReportWriter):
+    """Write the report as a directory of Parquet part files, rolled every row_groups_per_part flushes.
+
+    Every flush writes one row group to the part file kept open, under a temporary name. A Parquet file is
+    only readable once its footer is written, so the part file is closed and renamed into place when it holds
+    row_groups_per_part row groups, when the report is closed, or on sync. A crash loses the rows of the open
+    part file, which is removed when resuming.
+    """
+
+    def __init__(self, report_path: str, resume: bool = False, buffer_size: int = 1000, row_groups_per_part: int = 16):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception('The parquet report format requires pyarrow, install it with pip3 install pyarrow.')
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.schema = pyarrow.schema([('package', pyarrow.string()), ('prediction', pyarrow.string())])
+        self.row_groups_per_part = row_groups_per_part
+        self.part_writer = None
+        self.part_row_groups = 0
+        super().__init__(report_path, resume, buffer_size)
+
+    def part_file_names(self) -> list:
+        return get_parquet_part_file_names(self.report_path)
+
+    def open(self, resume: bool):
+        if not resume:
+            if os.path.exists(self.report_path):
+                for part_file_name in self.part_file_names():
+                    os.remove(os.path.join(self.report_path, part_file_name))
+            os.makedirs(self.report_path, exist_ok=True)
+        for file_name in os.listdir(self.report_path):
+            if file_name.endswith('.parquet.tmp'):
+                os.remove(os.path.join(self.report_path, file_name))
+        self.part_counter = len(self.part_file_names())
+
+    def read_finished_packages(self) -> set:
+        finished_packages = set()
+        for part_file_name in self.part_file_names():
+            part_path = os.path.join(self.report_path, part_file_name)
+            try:
+                table = self.parquet.read_table(part_path, columns=['package'])
+            except Exception:
+                print(f'Warning: Remove incomplete report part {part_path}.')
+                os.remove(part_path)
+                continue
+            finished_packages.update(table.column('package').to_pylist())
+        # renumber the part files so the next part does not overwrite a kept one
+        for counter, part_file_name in enumerate(self.part_file_names()):
+            os.replace(os.path.join(self.report_path, part_file_name), os.path.join(self.report_path, f'part-{counter:05d}.parquet'))
+        return finished_packages
+
+    def get_part_path(self) -> str:
+        return os.path.join(self.report_path, f'part-{self.part_counter:05d}.parquet')
+
+    def write_rows(self, rows: list):
+        if self.part_writer is None:
+            self.part_writer = self.parquet.ParquetWriter(f'{self.get_part_path()}.tmp', self.schema)
+        package_names, predictions = zip(*rows)
+        self.part_writer.write_table(self.pyarrow.table([list(package_names), list(predictions)], schema=self.schema))
+        self.part_row_groups += 1
+        if self.part_row_groups >= self.row_groups_per_part:
+            self.close_part()
+
+    def close_part(self):
+        """Write the footer of the open part file and rename it into place."""
+        if self.part_writer is None:
+            return
+        self.part_writer.close()
+        part_path = self.get_part_path()
+        os.replace(f'{part_path}.tmp', part_path)
+        self.part_writer = None
+        self.part_row_groups = 0
+        self.part_counter += 1
+
+    def sync(self):
+        self.flush()
+        self.close_part()
+
+    def close_report(self):
+        self.close_part()
+
+def get_report_path(report_dir_path: str, report_name: str, report_format: ReportFormatEnum) -> str:
+    """Get the path of a report.
+
+    Args:
+        report_dir_path: The path of the directory containing the reports.
+        report_name: The name of the report without extension.
+        report_format: The format of the report.
+
+    Returns:
+        The path of the report.
+    """
+    return os.path.join(report_dir_path, f'{report_name}.{REPORT_FILE_EXTENSIONS[report_format]}')
+
+def open_report_writer(report_path: str, report_format: ReportFormatEnum, resume: bool = False, buffer_size: int = 1000) -> ReportWriter:
+    """Open a report writer.
+
+    Args:
+        report_path: The path of the report.
+        report_format: The format of the report.
+        resume: Append to an existing report instead of overwriting it.
+        buffer_size: The number of rows buffered before flushing.
+
+    Returns:
+        The report writer.
+    """
+    if report_format == ReportFormatEnum.CSV:
+        return CSVReportWriter(report_path, resume, buffer_size)
+    if report_format == ReportFormatEnum.JSON_LINES:
+        return JSONLinesReportWriter(report_path, resume, buffer_size)
+    if report_format == ReportFormatEnum.PARQUET:
+        return ParquetReportWriter(report_path, resume, buffer_size)
@@ -8,6 +8,7 @@ from prettytable import PrettyTable
 
 from .commons import table_path, field_names,classifier_save_path, scoring
 from .pickle_util import save_classifier
+from .feature_matrix import iter_chunk_indices, DEFAULT_CHUNK_SIZE
 from conf import SETTINGS
 
 
@@ -59,4 +60,40 @@ def save_MLP(X_train: numpy.ndarray, y_train: numpy.ndarray, learning_rate: floa
    save_path = os.path.join(classifier_save_path, "MLP.pkl")
    model = MLPClassifier(hidden_layer_sizes=number_of_hidden_units, activation=activation, solver=optimization, learning_rate_init=learning_rate, max_iter=number_of_iterations)
    model.fit(X_train, y_train)
+   save_classifier(model, save_path)
+
+def save_MLP_incremental(X_train: numpy.ndarray, y_train: numpy.ndarray, learning_rate: float, number_of_hidden_units: tuple, number_of_iterations: int, optimization: str, activation: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+   """Save the MLP model trained on the whole training set, fitted chunk by chunk.
+
+   Every iteration is one pass of partial_fit over shuffled chunks. Like fit, training stops early
+   when the loss does not improve by tol for n_iter_no_change iterations.
+
+   Args:
+      X_train: The (memory mapped) training set.
+      y_train: The labels of the training set.
+      learning_rate: The learning rate of the MLP.
+      number_of_hidden_units: The number of hidden units of the MLP.
+      number_of_iterations: The number of iterations of the MLP.
+      optimization: The optimization algorithm of the MLP, sgd or adam.
+      activation: The activation function of the MLP.
+      chunk_size: The number of samples per chunk.
+   """
+   save_path = os.path.join(classifier_save_path, "MLP.pkl")
+   model = MLPClassifier(hidden_layer_sizes=number_of_hidden_units, activation=activation, solver=optimization, learning_rate_init=learning_rate, max_iter=number_of_iterations)
+   classes = numpy.unique(y_train)
+   best_loss = numpy.inf
+   no_improvement_count = 0
+   for _ in range(number_of_iterations):
+      loss = 0
+      for indices in iter_chunk_indices(len(X_train), chunk_size, shuffle=True):
+         model.partial_fit(X_train[indices], y_train[indices], classes=classes)
+         loss += model.loss_ * len(indices)
+      loss /= len(X_train)
+      if loss > best_loss - model.tol:
+         no_improvement_count += 1
+      else:
+         no_improvement_count = 0
+      best_loss = min(best_loss, loss)
+      if no_improvement_count > model.n_iter_no_change:
+         break
    save_classifier(model, save_path)
\ No newline at end of file
@@ -8,6 +8,7 @@ from prettytable import PrettyTable
 
 from .commons import field_names, table_path, scoring, classifier_save_path
 from .pickle_util import save_classifier
+from .feature_matrix import iter_chunk_indices, DEFAULT_CHUNK_SIZE
 from conf import SETTINGS
 
 
@@ -44,4 +45,20 @@ def save_NB(X_train: numpy.ndarray, y_train: numpy.ndarray, smoothing: float):
    save_path = os.path.join(classifier_save_path, "NB.pkl")
    model = GaussianNB(var_smoothing=smoothing)
    model.fit(X_train, y_train)
+   save_classifier(model, save_path)
+
+def save_NB_incremental(X_train: numpy.ndarray, y_train: numpy.ndarray, smoothing: float, chunk_size: int = DEFAULT_CHUNK_SIZE):
+   """Save the NB model trained on the whole training set, fitted chunk by chunk.
+
+   Args:
+      X_train: The (memory mapped) training set.
+      y_train: The labels of the training set.
+      smoothing: The smoothing parameter of the NB.
+      chunk_size: The number of samples per chunk.
+   """
+   save_path = os.path.join(classifier_save_path, "NB.pkl")
+   model = GaussianNB(var_smoothing=smoothing)
+   classes = numpy.unique(y_train)
+   for indices in iter_chunk_indices(len(X_train), chunk_size):
+      model.partial_fit(X_train[indices], y_train[indices], classes=classes)
    save_classifier(model, save_path)
\ No newline at end of file
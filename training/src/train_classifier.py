@@ -1,12 +1,21 @@
+import os
+import contextlib
+import traceback
+import multiprocessing
 from enum import Enum
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
 
-from .read_feature import read_features
-from .train_MLP import train_MLP_validation, save_MLP
-from .train_NB import train_NB_Validate, save_NB
+from .read_feature import read_labeled_features
+from .train_MLP import train_MLP_validation, save_MLP, save_MLP_incremental
+from .train_NB import train_NB_Validate, save_NB, save_NB_incremental
 from .train_RF import train_classifier_RF_Validation, save_RF
 from .train_SVM import train_SVM_validate, save_SVM
+from .update_classifier import update_NB, update_MLP, update_RF
+from .feature_matrix import feature_matrix_dir, build_feature_matrix, fit_scaler, scale_feature_matrix, LABEL_NAMES, DEFAULT_CHUNK_SIZE
 from .pickle_util import save_scaler
 from .commons import rf_scaler_save_path, mlp_scaler_save_path, nb_scaler_save_path, svm_scaler_save_path
 
@@ -28,8 +37,14 @@ class ActionEnum(Enum):
     """Enumeration of actions."""
     TRAINING = 1
     SAVE = 2
+    UPDATE = 3
 
-def train(malcious_features_dir_paths: [], normal_features_dir_paths: [], preprocess_method: PreprocessMethodEnum, model: ModelEnum, action: ActionEnum, hyperparameters={}):
+@contextlib.contextmanager
+def skip_profile(*_):
+    """Profiling hook doing nothing, the default of the profiling hooks of the training."""
+    yield
+
+def train(malcious_features_dir_paths: [], normal_features_dir_paths: [], preprocess_method: PreprocessMethodEnum, model: ModelEnum, action: ActionEnum, hyperparameters={}, out_of_core: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, profile_stage=skip_profile):
     """Train the model.
     
     Args:
@@ -39,31 +54,59 @@ def train(malcious_features_dir_paths: [], normal_features_dir_paths: [], prepro
         model: The model to be trained.
         action: The action to be performed.
         hyperparameters: The hyperparameters of the model.
+        out_of_core: Keep the training set in a compact on-disk matrix and fit NB and MLP chunk by chunk.
+        chunk_size: The number of samples per chunk when out_of_core is set.
+        profile_stage: Context manager timing a stage by its name, stages are not timed by default.
     """
 
-    X_train = []
-    y_train = []
-    for malcious_features_dir_path in malcious_features_dir_paths:
-        [X, y, _] = read_features(malcious_features_dir_path, None)
-        X_train += X
-        y_train += y
-    for normal_features_dir_path in normal_features_dir_paths:
-        [X, y, _] = read_features(None, normal_features_dir_path)
-        X_train += X
-        y_train += y
+    # the on-disk matrices of an out-of-core run are removed when it ends
+    with feature_matrix_dir() if out_of_core else contextlib.nullcontext() as matrix_dir_path:
+        with profile_stage('read_features'):
+            if out_of_core:
+                [X_train, y_train] = build_feature_matrix(malcious_features_dir_paths, normal_features_dir_paths, matrix_dir_path)
+                y_train = LABEL_NAMES[y_train]
+            else:
+                [X_train, y_train] = read_labeled_features(malcious_features_dir_paths, normal_features_dir_paths)
+
+        # update saved model in place, its saved scaler is updated instead of refitted
+        if action == ActionEnum.UPDATE:
+            with profile_stage('update'):
+                update(X_train, y_train, model, hyperparameters)
+            return
 
+        # preprocess
+        scaler_save_path = get_scaler_save_path(model)
+        with profile_stage('preprocess'):
+            if out_of_core:
+                [X_train] = preprocess_feature_matrix(X_train, scaler_save_path, preprocess_method, matrix_dir_path, chunk_size)
+            else:
+                [X_train] = preprocess(X_train, scaler_save_path, preprocess_method)
+        with profile_stage('fit'):
+            fit_model(X_train, y_train, model, action, hyperparameters, out_of_core, chunk_size)
 
-    # preprocess
+def get_scaler_save_path(model: ModelEnum) -> str:
+    """Get the path to save the scaler of a model."""
     if model == ModelEnum.RF:
-        scaler_save_path = rf_scaler_save_path
+        return rf_scaler_save_path
     elif model == ModelEnum.MLP:
-        scaler_save_path = mlp_scaler_save_path
+        return mlp_scaler_save_path
     elif model == ModelEnum.NB:
-        scaler_save_path = nb_scaler_save_path
+        return nb_scaler_save_path
     elif model == ModelEnum.SVM:
-        scaler_save_path = svm_scaler_save_path
-    [X_train] = preprocess(X_train, scaler_save_path, preprocess_method)
+        return svm_scaler_save_path
+
+def fit_model(X_train, y_train, model: ModelEnum, action: ActionEnum, hyperparameters={}, out_of_core: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Validate or save a model on preprocessed data.
 
+    Args:
+        X_train: The preprocessed training data.
+        y_train: The labels of the training data.
+        model: The model to be trained.
+        action: The action to be performed.
+        hyperparameters: The hyperparameters of the model.
+        out_of_core: Fit NB and MLP chunk by chunk.
+        chunk_size: The number of samples per chunk when out_of_core is set.
+    """
     # training and validation
     if action == ActionEnum.TRAINING:
         if model == ModelEnum.RF:
@@ -88,11 +131,18 @@ def train(malcious_features_dir_paths: [], normal_features_dir_paths: [], prepro
                 hyperparameters.get('optimization') is None or \
                 hyperparameters.get('activation') is None:
                 raise Exception('Hyperpameters cannot be empty.')
-            save_MLP(X_train, y_train, learning_rate=hyperparameters.get('learning_rate'), number_of_hidden_units=hyperparameters.get('number_of_hidden_units'), number_of_iterations=hyperparameters.get('number_of_iterations'), optimization=hyperparameters.get('optimization'), activation=hyperparameters.get('activation'))
+            # lbfgs cannot be fitted chunk by chunk and falls back to fitting the memory mapped matrix
+            if out_of_core and hyperparameters.get('optimization') in ('sgd', 'adam'):
+                save_MLP_incremental(X_train, y_train, learning_rate=hyperparameters.get('learning_rate'), number_of_hidden_units=hyperparameters.get('number_of_hidden_units'), number_of_iterations=hyperparameters.get('number_of_iterations'), optimization=hyperparameters.get('optimization'), activation=hyperparameters.get('activation'), chunk_size=chunk_size)
+            else:
+                save_MLP(X_train, y_train, learning_rate=hyperparameters.get('learning_rate'), number_of_hidden_units=hyperparameters.get('number_of_hidden_units'), number_of_iterations=hyperparameters.get('number_of_iterations'), optimization=hyperparameters.get('optimization'), activation=hyperparameters.get('activation'))
         elif model == ModelEnum.NB:
             if hyperparameters.get('smoothing') is None:
                 raise Exception('Hyperpameters cannot be empty.')
-            save_NB(X_train, y_train, smoothing=hyperparameters.get('smoothing'))
+            if out_of_core:
+                save_NB_incremental(X_train, y_train, smoothing=hyperparameters.get('smoothing'), chunk_size=chunk_size)
+            else:
+                save_NB(X_train, y_train, smoothing=hyperparameters.get('smoothing'))
         elif model == ModelEnum.SVM:
             if hyperparameters.get('gamma') is None or \
                 hyperparameters.get('C') is None:
@@ -100,6 +150,29 @@ def train(malcious_features_dir_paths: [], normal_features_dir_paths: [], prepro
             save_SVM(X_train, y_train, gamma=hyperparameters.get('gamma'), C=hyperparameters.get('C'))
 
 
+def update(X_new, y_new, model: ModelEnum, hyperparameters={}):
+    """Update the saved model with newly labeled samples instead of retraining it.
+
+    The updated classifier and scaler are saved as a new version alongside the old ones and become the current artifacts.
+
+    Args:
+        X_new: The new samples.
+        y_new: The labels of the new samples.
+        model: The model to be updated.
+        hyperparameters: The hyperparameters of the update.
+    """
+    version = datetime.now().strftime('%Y%m%d%H%M%S')
+    if model == ModelEnum.NB:
+        update_NB(X_new, y_new, version)
+    elif model == ModelEnum.MLP:
+        update_MLP(X_new, y_new, version)
+    elif model == ModelEnum.RF:
+        if hyperparameters.get('number_of_decision_trees') is None:
+            raise Exception('Hyperpameters cannot be empty.')
+        update_RF(X_new, y_new, hyperparameters.get('number_of_decision_trees'), version)
+    elif model == ModelEnum.SVM:
+        raise Exception('SVM does not support incremental updates, train and save it again.')
+
 def preprocess(X_train, scaler_save_path: str, preprocess_method: PreprocessMethodEnum) -> list:
     """Preprocess the data.
     
@@ -124,4 +197,175 @@ def preprocess(X_train, scaler_save_path: str, preprocess_method: PreprocessMeth
         scaler.fit(X_train)
         X_train_scaled = scaler.transform(X_train)
         save_scaler(scaler, scaler_save_path)
-        return [X_train_scaled]
\ No newline at end of file
+        return [X_train_scaled]
+
+def preprocess_feature_matrix(X_train, scaler_save_path: str, preprocess_method: PreprocessMethodEnum, matrix_dir_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """Preprocess the compact feature matrix chunk by chunk.
+
+    The scaled data is stored as an on-disk float32 matrix, unscaled data stays a uint8 matrix.
+
+    Args:
+        X_train: The compact feature matrix.
+        scaler_save_path: The path to save the scaler.
+        preprocess_method: The method of data preprocessing.
+        matrix_dir_path: The directory of the matrices of the run.
+        chunk_size: The number of samples per chunk.
+
+    Returns:
+        The preprocessed data.
+    """
+    [scaler, X_scaled] = scale_shared_feature_matrix(X_train, preprocess_method, matrix_dir_path, chunk_size)
+    if scaler is not None:
+        save_scaler(scaler, scaler_save_path)
+    return [X_scaled]
+
+def fit_shared_scaler(X_train, preprocess_method: PreprocessMethodEnum, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Fit a scaler on the compact feature matrix chunk by chunk.
+
+    Args:
+        X_train: The compact feature matrix.
+        preprocess_method: The method of data preprocessing.
+        chunk_size: The number of samples per chunk.
+
+    Returns:
+        The scaler, or None without preprocessing.
+    """
+    if preprocess_method == PreprocessMethodEnum.STANDARDLIZE:
+        return fit_scaler(StandardScaler(), X_train, chunk_size)
+    if preprocess_method == PreprocessMethodEnum.MIN_MAX_SCALE:
+        return fit_scaler(MinMaxScaler(), X_train, chunk_size)
+    return None
+
+def scale_shared_feature_matrix(X_train, preprocess_method: PreprocessMethodEnum, matrix_dir_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """Fit a scaler on the compact feature matrix and scale it into scaled-<method>.npy.
+
+    Args:
+        X_train: The compact feature matrix.
+        preprocess_method: The method of data preprocessing.
+        matrix_dir_path: The directory of the matrices of the run.
+        chunk_size: The number of samples per chunk.
+
+    Returns:
+        The scaler, or None without preprocessing, and the memory mapped preprocessed matrix.
+    """
+    if preprocess_method == PreprocessMethodEnum.NONE:
+        return [None, X_train]
+    scaler = fit_shared_scaler(X_train, preprocess_method, chunk_size)
+    scaled_matrix_path = os.path.join(matrix_dir_path, f'scaled-{preprocess_method.name.lower()}.npy')
+    return [scaler, scale_feature_matrix(scaler, X_train, scaled_matrix_path, chunk_size)]
+
+def get_fit_dtype(model: ModelEnum, hyperparameters: dict, out_of_core: bool = False):
+    """Get the dtype the estimator of a model converts the whole training matrix to when it is fitted.
+
+    Args:
+        model: The model to be trained.
+        hyperparameters: The hyperparameters of the model.
+        out_of_core: Fit NB and MLP chunk by chunk.
+
+    Returns:
+        The dtype, or None if the model is fitted chunk by chunk and converts only one chunk at a time.
+    """
+    if out_of_core and (model == ModelEnum.NB or (model == ModelEnum.MLP and hyperparameters.get('optimization') in ('sgd', 'adam'))):
+        return None
+    # the trees of RF are built on float32, the other estimators validate the data to float64
+    return numpy.float32 if model == ModelEnum.RF else numpy.float64
+
+def fit_model_worker(matrix_path: str, labels_path: str, model: ModelEnum, action: ActionEnum, hyperparameters={}, out_of_core: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, scaler=None, profile_stage=skip_profile, profile_process=skip_profile, cpu_profile: list = None):
+    """Validate, save or update a model in a worker process on an on-disk matrix.
+
+    The matrix is opened read-only as a memory map and is already in the dtype the estimator converts its
+    data to, so the estimator uses it without making its own converted copy. The estimator still allocates
+    its working memory, such as the float64 temporaries of NB over the whole matrix.
+    The scaler of the matrix is saved only after the model is fitted, so a failed fit keeps the saved
+    scaler matching the saved classifier.
+
+    Args:
+        matrix_path: The path of the preprocessed matrix.
+        labels_path: The path of the labels.
+        model: The model to be trained.
+        action: The action to be performed.
+        hyperparameters: The hyperparameters of the model.
+        out_of_core: Fit NB and MLP chunk by chunk.
+        chunk_size: The number of samples per chunk when out_of_core is set.
+        scaler: The scaler the matrix was scaled with, or None if it is not scaled.
+        profile_stage: Context manager timing a stage by its name, stages are not timed by default.
+        profile_process: Context manager profiling the worker from cpu_profile and its name.
+        cpu_profile: The profile directory of the run and the profiler mode, the worker is not profiled by default.
+    """
+    with profile_process(cpu_profile, f'train-{model.name}'):
+        X_train = numpy.load(matrix_path, mmap_mode='r')
+        y_train = LABEL_NAMES[numpy.load(labels_path)]
+        if action == ActionEnum.UPDATE:
+            with profile_stage('update'):
+                update(X_train, y_train, model, hyperparameters)
+        else:
+            with profile_stage('fit'):
+                fit_model(X_train, y_train, model, action, hyperparameters, out_of_core, chunk_size)
+            if scaler is not None:
+                save_scaler(scaler, get_scaler_save_path(model))
+
+def train_models(malcious_features_dir_paths: [], normal_features_dir_paths: [], model_configs: list, action: ActionEnum, out_of_core: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = None, profile_stage=skip_profile, profile_process=skip_profile, cpu_profile: list = None) -> dict:
+    """Train several models in parallel from one load of the data.
+
+    The feature files are read once into the compact on-disk matrix, and a scaler is fitted once per
+    preprocessing method. The matrix is then written once per preprocessing method and fit dtype, float32 for
+    RF and float64 for the others, so no worker converts it on its own. Every model is fitted in its own
+    process of a pool. The pool spawns its processes instead of forking them, since a fork would copy the
+    state of threads running in this process, such as the profiler.
+
+    Args:
+        malcious_features_dir_paths: The paths of the directories containing multiple malicious sample feature files.
+        normal_features_dir_paths: The paths of the directories containing multiple benign sample feature files.
+        model_configs: The model, the preprocessing method and the hyperparameters of each model.
+        action: The action to be performed.
+        out_of_core: Fit NB and MLP chunk by chunk.
+        chunk_size: The number of samples per chunk.
+        max_workers: The number of processes, one per model by default.
+        profile_stage: Context manager timing a stage by its name, stages are not timed by default.
+        profile_process: Context manager profiling a worker from cpu_profile and its name.
+            Both hooks are passed to the workers, so they are module-level functions.
+        cpu_profile: The profile directory of the run and the profiler mode, the workers write their profiles there.
+
+    Returns:
+        The error of each model which failed, by model name.
+    """
+    with feature_matrix_dir() as matrix_dir_path:
+        with profile_stage('read_features'):
+            [X_train, _] = build_feature_matrix(malcious_features_dir_paths, normal_features_dir_paths, matrix_dir_path)
+        matrix_path = os.path.join(matrix_dir_path, 'features.npy')
+        labels_path = os.path.join(matrix_dir_path, 'labels.npy')
+
+        # preprocess once per method and dtype, the saved model is updated with its own saved scaler instead
+        scalers = {PreprocessMethodEnum.NONE: None}
+        matrix_paths = {(PreprocessMethodEnum.NONE, None): matrix_path}
+        model_matrix_paths = {}
+        model_scalers = {}
+        for [model, preprocess_method, hyperparameters] in model_configs:
+            if action == ActionEnum.UPDATE:
+                model_matrix_paths[model] = matrix_path
+                model_scalers[model] = None
+                continue
+            dtype = get_fit_dtype(model, hyperparameters, out_of_core)
+            with profile_stage('preprocess'):
+                if preprocess_method not in scalers:
+                    scalers[preprocess_method] = fit_shared_scaler(X_train, preprocess_method, chunk_size)
+                if (preprocess_method, dtype) not in matrix_paths:
+                    dtype_name = numpy.dtype(dtype or numpy.float32).name
+                    scaled_matrix_path = os.path.join(matrix_dir_path, f'{preprocess_method.name.lower()}-{dtype_name}.npy')
+                    scale_feature_matrix(scalers[preprocess_method], X_train, scaled_matrix_path, chunk_size, dtype or numpy.float32)
+                    matrix_paths[(preprocess_method, dtype)] = scaled_matrix_path
+            model_scalers[model] = scalers[preprocess_method]
+            model_matrix_paths[model] = matrix_paths[(preprocess_method, dtype)]
+
+        errors = {}
+        with ProcessPoolExecutor(max_workers=max_workers or len(model_configs), mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                model: executor.submit(fit_model_worker, model_matrix_paths[model], labels_path, model, action, hyperparameters, out_of_core, chunk_size, model_scalers[model], profile_stage, profile_process, cpu_profile)
+                for [model, _, hyperparameters] in model_configs
+            }
+            for model, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[model.name] = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+    return errors
@@ -0,0 +1,158 @@
+import os
+import copy
+import shutil
+from datetime import datetime
+
+import numpy
+from sklearn.preprocessing import StandardScaler
+
+from .commons import MLP_path, nb_path, rf_classifier_path, mlp_scaler_save_path, nb_scaler_save_path, version_save_path
+from .pickle_util import load_classifier, save_classifier, load_scaler, save_scaler
+
+
+def get_version_path(artifact_path: str, version: str) -> str:
+    """Get the path of a version of an artifact, e.g. models/RF.pkl -> models/versions/<version>/RF.pkl.
+
+    Args:
+        artifact_path: The path of the artifact.
+        version: The version of the artifact.
+
+    Returns:
+        The path of the version.
+    """
+    return os.path.join(version_save_path, version, os.path.basename(artifact_path))
+
+def save_artifact_versions(artifacts: list, version: str):
+    """Save a new version of a classifier and its scaler and make them the current artifacts.
+
+    The current artifacts are kept as a version named after the modification time of the classifier before they
+    are replaced, so the classifier and the scaler of a version are always saved together.
+
+    Args:
+        artifacts: The artifact, the path of the current artifact, which is used by prediction, and the function
+            saving the artifact, of the classifier first and then of its scaler if any.
+        version: The version of the new artifacts.
+    """
+    classifier_path = artifacts[0][1]
+    if os.path.exists(classifier_path):
+        previous_version = datetime.fromtimestamp(os.path.getmtime(classifier_path)).strftime('%Y%m%d%H%M%S')
+        os.makedirs(os.path.join(version_save_path, previous_version), exist_ok=True)
+        for _, artifact_path, _ in artifacts:
+            previous_version_path = get_version_path(artifact_path, previous_version)
+            if os.path.exists(artifact_path) and not os.path.exists(previous_version_path):
+                shutil.copy2(artifact_path, previous_version_path)
+    os.makedirs(os.path.join(version_save_path, version), exist_ok=True)
+    for artifact, artifact_path, save in artifacts:
+        save(artifact, get_version_path(artifact_path, version))
+        save(artifact, artifact_path)
+
+def get_affine_transform(scaler) -> list:
+    """Express a scaler as the affine transform x * a + c.
+
+    Args:
+        scaler: The StandardScaler or MinMaxScaler.
+
+    Returns:
+        The factor a and the offset c.
+    """
+    if isinstance(scaler, StandardScaler):
+        return [1 / scaler.scale_, -scaler.mean_ / scaler.scale_]
+    return [scaler.scale_, scaler.min_]
+
+def get_rescaling(old_scaler, new_scaler) -> list:
+    """Get the transform from the new scaled space back to the old one, x_old = x_new * r + d.
+
+    Args:
+        old_scaler: The scaler before its statistics were updated.
+        new_scaler: The scaler after its statistics were updated.
+
+    Returns:
+        The factor r and the offset d.
+    """
+    [old_factor, old_offset] = get_affine_transform(old_scaler)
+    [new_factor, new_offset] = get_affine_transform(new_scaler)
+    factor = old_factor / new_factor
+    return [factor, old_offset - new_offset * factor]
+
+def load_optional_scaler(scaler_save_path: str):
+    """Load a scaler, or None if the model was trained without preprocessing."""
+    try:
+        return load_scaler(scaler_save_path)
+    except FileNotFoundError:
+        return None
+
+def update_scaler(scaler, X_new: numpy.ndarray) -> list:
+    """Update the statistics of a scaler with new samples.
+
+    Args:
+        scaler: The scaler, or None if the model was trained without preprocessing.
+        X_new: The new unscaled samples.
+
+    Returns:
+        The updated scaler, the new samples scaled by it, and the transform from the new scaled space back to the old one.
+    """
+    if scaler is None:
+        return [None, X_new, None]
+    old_scaler = copy.deepcopy(scaler)
+    scaler.partial_fit(X_new)
+    return [scaler, scaler.transform(X_new), get_rescaling(old_scaler, scaler)]
+
+def update_NB(X_new: numpy.ndarray, y_new: numpy.ndarray, version: str):
+    """Update the saved NB model with new samples.
+
+    The class means and variances learned so far are moved to the updated scaled space before the new samples are added.
+
+    Args:
+        X_new: The new samples.
+        y_new: The labels of the new samples.
+        version: The version of the updated artifacts.
+    """
+    model = load_classifier(nb_path)
+    [scaler, X_scaled, rescaling] = update_scaler(load_optional_scaler(nb_scaler_save_path), X_new)
+    if rescaling is not None:
+        [factor, offset] = rescaling
+        model.theta_ = (model.theta_ - offset) / factor
+        model.var_ = (model.var_ - model.epsilon_) / factor ** 2 + model.epsilon_
+    model.partial_fit(X_scaled, y_new)
+    save_artifact_versions([(model, nb_path, save_classifier)] + ([] if scaler is None else [(scaler, nb_scaler_save_path, save_scaler)]), version)
+
+def update_MLP(X_new: numpy.ndarray, y_new: numpy.ndarray, version: str):
+    """Update the saved MLP model with new samples by one pass of partial_fit.
+
+    The input layer is moved to the updated scaled space before the new samples are fitted.
+
+    Args:
+        X_new: The new samples.
+        y_new: The labels of the new samples.
+        version: The version of the updated artifacts.
+    """
+    model = load_classifier(MLP_path)
+    if model.solver not in ('sgd', 'adam'):
+        raise Exception(f'MLP trained with {model.solver} does not support incremental updates, train and save it with sgd or adam.')
+    [scaler, X_scaled, rescaling] = update_scaler(load_optional_scaler(mlp_scaler_save_path), X_new)
+    if rescaling is not None:
+        [factor, offset] = rescaling
+        model.intercepts_[0] = model.intercepts_[0] + offset @ model.coefs_[0]
+        model.coefs_[0] = model.coefs_[0] * factor[:, numpy.newaxis]
+        # the moment estimates of adam and the velocities of sgd belong to the old input layer, partial_fit
+        # creates a new optimizer when there is none
+        del model._optimizer
+    model.partial_fit(X_scaled, y_new)
+    save_artifact_versions([(model, MLP_path, save_classifier)] + ([] if scaler is None else [(scaler, mlp_scaler_save_path, save_scaler)]), version)
+
+def update_RF(X_new: numpy.ndarray, y_new: numpy.ndarray, number_of_decision_trees: int, version: str):
+    """Update the saved RF model by adding decision trees fitted on the new samples.
+
+    Args:
+        X_new: The new samples.
+        y_new: The labels of the new samples.
+        number_of_decision_trees: The number of decision trees to add.
+        version: The version of the updated artifacts.
+    """
+    model = load_classifier(rf_classifier_path)
+    if set(y_new) != set(model.classes_):
+        raise Exception('Updating RF requires both malicious and benign samples.')
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + number_of_decision_trees)
+    model.fit(X_new, y_new)
+    model.set_params(warm_start=False)
+    save_artifact_versions([(model, rf_classifier_path, save_classifier)], version)